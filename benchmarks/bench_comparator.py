@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Porównanie comparator.compare z poprzednią implementacją judge.check_answer na dużych wyjściach.
+
+import os
+import sys
+import tempfile
+import time
+from typing import Tuple
+
+file_dir = os.path.dirname( os.path.abspath(__file__) )
+sys.path.insert(0, f"{file_dir}/../src/judge")
+import comparator
+
+#allowed ratio to the legacy time, measured once per case
+THRESHOLD = float(os.getenv("THRESHOLD") or 1.1)
+
+def legacy_check_answer(answer_path: str, input_path: str) -> Tuple[bool, str]:
+    info = "ok"
+    line_nr = 0
+    with open(answer_path, "r") as answer, open(input_path, "r") as input:
+        for line in answer:
+            line_nr += 1
+            try:
+                output_line = input.readline()
+            except EOFError:
+                info = f"unexpected EOF in line {line_nr}"
+                return (False, info)
+            if line.strip() != output_line.strip():
+                info = f"line {line_nr} is not correct: expected {line.strip()} but got {output_line.strip()}"
+                return (False, info)
+    return (True, info)
+
+def write(path: str, size: int, transform=lambda line: line):
+    """Writes about size bytes of lines, the number of lines does not depend on transform."""
+    lines = [f"{i} {i * 7 % 1000003}\n".encode() for i in range(100000)]
+    block = b"".join(transform(line) for line in lines)
+    with open(path, "wb") as file:
+        for _ in range(size // sum(map(len, lines)) + 1):
+            file.write(block)
+
+def measure(function, *args) -> float:
+    start_time = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start_time
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 100) * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        answer = f"{tmp}/answer.out"
+        write(answer, size)
+        cases = {
+            "identical": lambda line: line,
+            "trailing spaces": lambda line: line.replace(b"\n", b" \n"),
+            "crlf": lambda line: line.replace(b"\n", b"\r\n"),
+            "wrong answer": lambda line: line.replace(b"99999 ", b"99999  x"),
+        }
+        regressions = []
+        print(f"{'case':<16} | {'implementation':<18} | time [s]")
+        print("-" * 50)
+        for case, transform in cases.items():
+            output = f"{tmp}/output.out"
+            write(output, size, transform)
+            legacy = measure(legacy_check_answer, answer, output)
+            print(f"{case:<16} | {'legacy':<18} | {legacy:.2f}")
+            for mode in comparator.MODES:
+                result = comparator.compare(answer, output, mode)
+                elapsed = measure(comparator.compare, answer, output, mode)
+                print(f"{case:<16} | {mode:<18} | {elapsed:.2f} {'' if result[0] else '(WA)'}")
+                #lines and tokens do what the legacy judge did, they may not be slower
+                if mode in ["lines", "tokens"] and elapsed > legacy * THRESHOLD + 0.01:
+                    regressions.append(f"{case} {mode}")
+            os.remove(output)
+    if regressions:
+        print(f"slower than legacy: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Porównanie czasu ściennego etapu exec dla 1, 2, 4 i N workerów.
+# Wymaga danych z src/conf/example_generator_sum.py oraz g++ w systemie.
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+file_dir = os.path.dirname( os.path.abspath(__file__) )
+os.chdir(f"{file_dir}/..")
+
+exec_path = "src/exec-python"
+common_path = "src/common"
+exec_in_path = "src/example/exec-in/in"
+comp_in_path = "src/example/comp-in"
+
+def build_program(bin_dir: str):
+    sources = [f"{comp_in_path}/{f}" for f in os.listdir(comp_in_path) if f.endswith(".cpp")]
+    subprocess.run(["g++", "-O2", "-o", f"{bin_dir}/program", *sources], check=True)
+
+def run_exec(bin_dir: str, out_dir: str, workers: int) -> float:
+    env = dict(os.environ)
+    env.update({
+        "LOGS": "off",
+        "WORKERS": str(workers),
+        "IN": os.path.abspath(exec_in_path),
+        "BIN": bin_dir,
+        "OUT": out_dir,
+        "STD": out_dir,
+        "PYTHONPATH": os.path.abspath(common_path),
+    })
+    start_time = time.time()
+    subprocess.run([sys.executable, "main.py"], cwd=exec_path, env=env, check=True)
+    return time.time() - start_time
+
+def main():
+    if not os.path.isdir(exec_in_path):
+        print("Brak danych testowych, uruchom src/conf/example_generator_sum.py")
+        return 1
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    n = len(os.sched_getaffinity(0))
+    workers = sorted({1, 2, 4, n})
+
+    with tempfile.TemporaryDirectory() as bin_dir:
+        build_program(bin_dir)
+        print("+---------+--------+--------+")
+        print("| workers |  best  |  mean  |")
+        print("+---------+--------+--------+")
+        for w in workers:
+            times = []
+            for _ in range(repeats):
+                with tempfile.TemporaryDirectory() as out_dir:
+                    times.append(run_exec(bin_dir, out_dir, w))
+            print(f"| {w:>7} | {min(times):6.2f} | {sum(times)/len(times):6.2f} |")
+        print("+---------+--------+--------+")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
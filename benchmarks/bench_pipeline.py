@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# Czasy etapów całego potoku (start, kompilacja, exec i judge na test) z percentylami.
+# Domyślnie backend local, działa bez dockera; wymaga g++ w systemie.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from random import Random
+from typing import Dict, List, Optional
+
+file_dir = os.path.dirname( os.path.abspath(__file__) )
+sys.path.insert(0, f"{file_dir}/../src/worker")
+sys.path.insert(0, f"{file_dir}/../src/conf")
+sys.path.insert(0, f"{file_dir}/../src/common")
+from backends import BACKENDS
+from generator import Generator, repeat
+from manifest import MANIFEST_FILE, load_manifest
+
+comp_in_path = f"{file_dir}/../src/example/comp-in"
+
+PERCENTILES = [50, 95, 99]
+#differences smaller than that are noise, whatever the relative change
+MIN_DELTA = 0.005
+
+def make(rng: Random, n: int):
+    return [f"{n}\n", *repeat("1\n", n)], f"{n}\n"
+
+def percentile(samples: List[float], p: float) -> float:
+    """Linear interpolation between the closest ranks."""
+    samples = sorted(samples)
+    rank = (len(samples) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(samples) - 1)
+    return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, dict]:
+    stages = {}
+    for stage, values in samples.items():
+        stages[stage] = {f"p{p}": round(percentile(values, p), 6) for p in PERCENTILES}
+        stages[stage]["mean"] = round(sum(values) / len(values), 6)
+        stages[stage]["n"] = len(values)
+    return stages
+
+def timed(samples: Dict[str, List[float]], stage: str, function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    samples.setdefault(stage, []).append(time.perf_counter() - start_time)
+    if getattr(result, "returncode", 0) != 0:
+        raise RuntimeError(f"{stage} failed: {result.stderr.decode(errors='replace')}")
+    return result
+
+def run_pipeline(backend, tests: str, work_dir: str, samples: Dict[str, List[float]], env: Dict[str, str]):
+    comp_out = f"{work_dir}/comp-out"
+    exec_out = f"{work_dir}/exec-out"
+    for d in [comp_out, exec_out]:
+        os.makedirs(d)
+        os.chmod(d, 0o777)
+    timed(samples, "startup", backend.startup)
+    timed(samples, "compile", backend.compile, comp_in_path, comp_out)
+    timed(samples, "exec", backend.execute, tests, comp_out, exec_out, env)
+    #the fused exec judges the tests itself and does not keep the outputs for the judge stage
+    if env.get("FUSED") != "on":
+        timed(samples, "judge", backend.judge, tests, exec_out, env)
+    records = load_manifest(f"{exec_out}/{MANIFEST_FILE}")
+    for record in records["exec"].values():
+        samples.setdefault("exec_test", []).append(record["wall_time"])
+    for record in records["judge"].values():
+        samples.setdefault("judge_test", []).append(record["time"])
+
+def compare(stages: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Stages slower than the baseline by more than threshold (relative) and MIN_DELTA (seconds)."""
+    regressions = []
+    for stage, result in stages.items():
+        if stage not in baseline:
+            continue
+        for key in ["p50", "p95"]:
+            old, new = baseline[stage][key], result[key]
+            if new - old > MIN_DELTA and new > old * (1 + threshold):
+                regressions.append(f"{stage} {key}: {old:.4f}s -> {new:.4f}s (+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    return regressions
+
+def print_table(stages: Dict[str, dict], baseline: Optional[Dict[str, dict]]):
+    print("+------------+-------+----------+----------+----------+----------+")
+    print("| stage      |     n |   p50 ms |   p95 ms |   p99 ms | base p50 |")
+    print("+------------+-------+----------+----------+----------+----------+")
+    for stage, result in stages.items():
+        base = f"{baseline[stage]['p50'] * 1000:8.2f}" if baseline and stage in baseline else "       -"
+        print(f"| {stage:<10} | {result['n']:>5} | {result['p50'] * 1000:8.2f} | {result['p95'] * 1000:8.2f} | {result['p99'] * 1000:8.2f} | {base} |")
+    print("+------------+-------+----------+----------+----------+----------+")
+
+def main():
+    parser = argparse.ArgumentParser(description="Percentyle czasów etapów potoku.")
+    parser.add_argument("--runs", type=int, default=10, help="liczba uruchomień całego potoku")
+    parser.add_argument("--tests", type=int, default=20, help="liczba testów w zestawie")
+    parser.add_argument("--size", type=int, default=100000, help="liczba linii wejścia największego testu")
+    parser.add_argument("--backend", default="local", choices=sorted(BACKENDS))
+    parser.add_argument("--cache", action="store_true", help="pamięć podręczna kompilatora między uruchomieniami")
+    parser.add_argument("--fused", action="store_true", help="exec w trybie FUSED")
+    parser.add_argument("--io", default="files", choices=["files", "memfd"], help="tryb IO etapu exec")
+    parser.add_argument("--baseline", help="plik JSON z poprzednim wynikiem do porównania")
+    parser.add_argument("--save", help="zapis wyniku jako nowy plik bazowy")
+    parser.add_argument("--threshold", type=float, default=0.2, help="dopuszczalny względny wzrost p50/p95")
+    args = parser.parse_args()
+
+    env = {"IO": args.io, "JSON_FILES": "off"}
+    if args.fused:
+        env["FUSED"] = "on"
+    samples: Dict[str, List[float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tests = f"{tmp}/tests"
+        cache = f"{tmp}/comp-cache" if args.cache else None
+        sizes = [args.size * (i + 1) // args.tests for i in range(args.tests)]
+        Generator(make, [{"n": n} for n in sizes]).generate(tests, f"{tmp}/gen-cache")
+        backend = BACKENDS[args.backend](cache=cache)
+        for run in range(args.runs):
+            work_dir = f"{tmp}/run-{run}"
+            run_pipeline(backend, tests, work_dir, samples, env)
+            shutil.rmtree(work_dir)
+
+    stages = summarize(samples)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            baseline_result = json.load(baseline_file)
+        baseline = baseline_result["stages"]
+        old_meta = baseline_result["meta"]
+        for key, value in [("backend", args.backend), ("tests", args.tests), ("size", args.size), ("env", env)]:
+            if old_meta.get(key) != value:
+                print(f"warning: baseline {key} is {old_meta.get(key)}, now {value}")
+    print_table(stages, baseline)
+
+    if args.save:
+        result = {
+            "meta": {
+                "backend": args.backend,
+                "runs": args.runs,
+                "tests": args.tests,
+                "size": args.size,
+                "env": env,
+                "cpus": len(os.sched_getaffinity(0)),
+                "python": platform.python_version(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "stages": stages,
+        }
+        with open(args.save, "w") as save_file:
+            json.dump(result, save_file, indent=1)
+
+    if baseline is not None:
+        regressions = compare(stages, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+import zlib
+from typing import Dict, Optional, Tuple
+
+#Storage of the stdout and stderr of the tests. With ARTIFACTS=bounded (default)
+#the full {name}.stdout.out and {name}.stderr.out are kept only for failed tests
+#or with DEBUG=on. Every output is also stored as its head and tail, compressed,
+#in artifacts/{sha256}.z, so the same output of many tests (or of a rejudge) is
+#stored once. The records of the manifest refer to them by the hash.
+#stderr is never compared, exec keeps it in RAM and saves it in full only for
+#the runs that failed there, stdout is removed by the judge after comparing it.
+#ARTIFACTS=full keeps every file as it is and stores no artifacts.
+
+ARTIFACTS = os.getenv("ARTIFACTS", "bounded")
+HEAD = int(os.getenv("ARTIFACT_HEAD") or 4096)
+TAIL = int(os.getenv("ARTIFACT_TAIL") or 4096)
+DEBUG = os.getenv("DEBUG") == "on"
+ARTIFACTS_DIR = "artifacts"
+KINDS = ["stdout", "stderr"]
+SKIPPED_MARKER = b"\n[... %d bytes skipped ...]\n"
+
+def bounded(fd: int) -> Tuple[bytes, int]:
+    """Head and tail of the file and the size of the whole file."""
+    size = os.fstat(fd).st_size
+    if size <= HEAD + TAIL:
+        return os.pread(fd, size, 0), size
+    return os.pread(fd, HEAD, 0) + SKIPPED_MARKER % (size - HEAD - TAIL) + os.pread(fd, TAIL, size - TAIL), size
+
+def store(fd: int, out_dir: str) -> Optional[dict]:
+    """Stores the bounded content of fd, returns its reference or None for an empty file."""
+    data, size = bounded(fd)
+    if size == 0:
+        return None
+    sha = hashlib.sha256(data).hexdigest()
+    path = f"{out_dir}/{ARTIFACTS_DIR}/{sha}.z"
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        #parallel tests may store the same output, the rename keeps one whole copy
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as artifact_file:
+            artifact_file.write(zlib.compress(data))
+        os.replace(tmp, path)
+    return {"sha": sha, "bytes": size, "truncated": size > HEAD + TAIL}
+
+def store_all(fds: Dict[str, Optional[int]], out_dir: str) -> Dict[str, dict]:
+    """References of the non-empty outputs by kind (stdout, stderr)."""
+    refs = {}
+    if ARTIFACTS == "full":
+        return refs
+    for kind, fd in fds.items():
+        ref = store(fd, out_dir) if fd is not None else None
+        if ref is not None:
+            refs[kind] = ref
+    return refs
+
+def keep_full(failed: bool) -> bool:
+    return ARTIFACTS == "full" or failed or DEBUG
+
+def prune(name: str, in_dir: str, out_dir: str, failed: bool) -> Tuple[Dict[str, dict], bool]:
+    """After judging: stores the outputs of the test from in_dir in out_dir and removes the full files if it passed.
+
+    Returns the references and whether the full stdout was removed.
+    """
+    refs = {}
+    removed = False
+    if ARTIFACTS == "full":
+        return refs, removed
+    for kind in KINDS:
+        path = f"{in_dir}/{name}.{kind}.out"
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            refs.update(store_all({kind: fd}, out_dir))
+        finally:
+            os.close(fd)
+        if not keep_full(failed):
+            os.remove(path)
+            removed = removed or kind == "stdout"
+    return refs, removed
+
+def read_artifact(out_dir: str, sha: str) -> bytes:
+    with open(f"{out_dir}/{ARTIFACTS_DIR}/{sha}.z", "rb") as artifact_file:
+        return zlib.decompress(artifact_file.read())
@@ -0,0 +1,48 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+#Test groups of the problem config, e.g. subtasks scored all-or-nothing:
+#{"groups": {"1": {"tests": ["0", "1"], "points": 20, "scoring": "all"},
+#            "2": {"tests": ["2", "3", "4"], "points": 80, "scoring": "sum"}}}
+#A test outside of the groups is worth 1 point, as without groups.
+
+SCORINGS = ["all", "sum"]
+SKIPPED = "skipped"
+
+def load_groups(conf_path: Optional[str] = None) -> List[dict]:
+    conf_path = conf_path or os.getenv("CONF") or f"{os.getenv('IN')}/config.json"
+    conf = {}
+    if os.path.isfile(conf_path):
+        with open(conf_path, "r") as conf_file:
+            conf = json.load(conf_file)
+    groups = []
+    for name, group in conf.get("groups", {}).items():
+        scoring = group.get("scoring", "all")
+        if scoring not in SCORINGS:
+            raise ValueError(f"group {name}: unknown scoring {scoring}")
+        tests = [str(test) for test in group["tests"]]
+        groups.append({"name": str(name), "tests": tests, "points": group.get("points", len(tests)), "scoring": scoring})
+    return groups
+
+def test_costs(names: List[str], in_dir: str, costs: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Expected cost of every test: the historical runtime if all tests have one, the input size otherwise."""
+    if costs and all(name in costs for name in names):
+        return {name: costs[name] for name in names}
+    return {name: os.path.getsize(f"{in_dir}/{name}.in") for name in names}
+
+def score(grades: Dict[str, int], groups: List[dict]) -> Tuple[float, List[dict]]:
+    """Points of the graded tests and the result of every group."""
+    grouped = set()
+    results = []
+    for group in groups:
+        grouped.update(group["tests"])
+        passed = sum(grades.get(test, 0) for test in group["tests"])
+        if group["scoring"] == "all":
+            points = group["points"] if passed == len(group["tests"]) else 0
+        else:
+            points = round(group["points"] * passed / len(group["tests"]), 6) if group["tests"] else 0
+        results.append({"name": group["name"], "points": points, "max_points": group["points"], "passed": passed, "tests": len(group["tests"])})
+    points = sum(result["points"] for result in results)
+    points += sum(grade for test, grade in grades.items() if test not in grouped)
+    return points, results
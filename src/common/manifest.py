@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+#results.jsonl written by the exec and judge stages, one json record per line:
+#{"stage": "exec", "test": name, return_code, user_time, memory, verdict, wall_time}
+#{"stage": "judge", "test": name, grade, info, time}
+#{"stage": "exec", "test": name, "verdict": "SKIP", reason} for a test skipped by FAIL_FAST
+#{"stage": "exec_end", "tests": n, "skipped": s, groups} and {"stage": "judge_end", "points": p, "tests": n, groups}
+MANIFEST_FILE = "results.jsonl"
+
+class Manifest:
+    """Line-delimited results of all tests, shared by the exec and judge stages.
+
+    Every record is one json line written with a single write to a file opened
+    with O_APPEND, so the file can be read while the tests are still running.
+    """
+
+    def __init__(self, path: str, truncate: bool = False):
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | (os.O_TRUNC if truncate else 0)
+        self.fd = os.open(path, flags, 0o666)
+        self.lock = threading.Lock()
+
+    def append(self, record: dict):
+        line = (json.dumps(record) + "\n").encode()
+        with self.lock:
+            os.write(self.fd, line)
+
+    def close(self):
+        os.close(self.fd)
+
+def read_manifest(path: str, until: Optional[str] = None, timeout: Optional[float] = None, poll: float = 0.05, stop: Optional[Callable[[], bool]] = None) -> Iterator[dict]:
+    """Yields the records of the manifest as they are appended.
+
+    Without until only the records already written are read, with until the
+    file is followed until a record of that stage (e.g. judge_end) or the
+    timeout. With stop the file is followed until stop() is true (e.g. the
+    stages ended), then read to the end. The file does not have to exist yet,
+    a line without the newline is still being written and is read again later.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    offset = 0
+    rest = b""
+    while True:
+        stopped = stop is not None and stop()
+        if os.path.exists(path):
+            with open(path, "rb") as manifest_file:
+                if os.fstat(manifest_file.fileno()).st_size < offset:
+                    #the exec stage started a new manifest
+                    offset, rest = 0, b""
+                manifest_file.seek(offset)
+                data = manifest_file.read()
+            offset += len(data)
+            *lines, rest = (rest + data).split(b"\n")
+            for line in lines:
+                record = json.loads(line)
+                yield record
+                if until is not None and record.get("stage") == until:
+                    return
+        if (until is None and stop is None) or stopped or (deadline is not None and time.monotonic() > deadline):
+            return
+        time.sleep(poll)
+
+def load_manifest(path: str) -> Dict[str, Dict[str, dict]]:
+    """Records by stage and test name, without the stage and test keys, later records replace earlier ones.
+
+    Records without a test (exec_end, judge_end) are kept by the stage only.
+    """
+    stages: Dict[str, Dict[str, dict]] = {"exec": {}, "judge": {}}
+    for record in read_manifest(path):
+        record = dict(record)
+        stage = record.pop("stage")
+        if "test" in record:
+            stages.setdefault(stage, {})[record.pop("test")] = record
+        else:
+            stages[stage] = record
+    return stages
+
+def test_key(name: str):
+    return (0, int(name), "") if name.isdigit() else (1, 0, name)
+
+def manifest_results(path: str) -> Optional[dict]:
+    """The results.json document built from the judge records, None if there are none."""
+    records = load_manifest(path)
+    judge = records["judge"]
+    if not judge:
+        return None
+    tests = []
+    for name in sorted(judge, key=test_key):
+        tests.append({"name": name, "grade": judge[name]["grade"], "info": judge[name]["info"]})
+        if judge[name].get("skipped"):
+            tests[-1]["skipped"] = True
+    #the group scoring is known from judge_end only
+    end = records.get("judge_end", {})
+    results = {"points": end.get("points", sum(test["grade"] for test in tests)), "tests": tests}
+    if "groups" in end:
+        results["groups"] = end["groups"]
+    return results
@@ -3,16 +3,26 @@ import os
 import shutil
 import subprocess
 import sys
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 
 SRC = os.getenv("SRC")
 OUT = os.getenv("OUT")
 BIN = os.getenv("BIN")
-SRC_TMP = "/tmp/src"
-BIN_TMP = "/tmp/bin"
-OUT_TMP = "/tmp/out"
+CACHE = os.getenv("CACHE")
+SRC_TMP = os.getenv("SRC_TMP", "/tmp/src")
+BIN_TMP = os.getenv("BIN_TMP", "/tmp/bin")
+OUT_TMP = os.getenv("OUT_TMP", "/tmp/out")
 DIAGNOSTIC_FILE = f"{OUT}/comp.txt"
 OUT_FILE = f"{OUT}/comp.json"
 
+COMPILER = "g++"
+FLAGS = ["-Wextra", "-Wall"]
+#the cores given to the stage (--cpuset-cpus, the affinity set by the worker), not all of the machine
+WORKERS = int(os.getenv("WORKERS") or len(os.sched_getaffinity(0)))
+
 def copy_src_files():
     os.makedirs(SRC_TMP, exist_ok=True)
     for file_name in os.listdir(SRC):
@@ -20,13 +30,119 @@ def copy_src_files():
         if os.path.isfile(full_file_name):
             shutil.copy(full_file_name, SRC_TMP)
 
+def digest(*parts: bytes) -> str:
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(len(part).to_bytes(8, "little"))
+        sha.update(part)
+    return sha.hexdigest()
+
+def read_src(name: str) -> bytes:
+    with open(f"{SRC_TMP}/{name}", "rb") as file:
+        return file.read()
+
+def file_digest(names: List[str]) -> str:
+    parts = []
+    for name in names:
+        parts += [name.encode(), read_src(name)]
+    return digest(*parts)
+
+def compiler_digest() -> str:
+    """Compiler version and flags, the version is kept in the cache by the compiler binary stat."""
+    compiler = os.stat(os.path.realpath(shutil.which(COMPILER)))
+    stat_key = digest(f"{compiler.st_ino} {compiler.st_size} {compiler.st_mtime_ns}".encode())
+    if cache_get(f"compiler/{stat_key}"):
+        with open(f"{CACHE}/compiler/{stat_key}", "rb") as version_file:
+            version = version_file.read()
+    else:
+        version = subprocess.run([COMPILER, "--version"], capture_output=True).stdout
+        with tempfile.NamedTemporaryFile("wb") as version_file:
+            version_file.write(version)
+            version_file.flush()
+            cache_put(f"compiler/{stat_key}", version_file.name)
+    return digest(version, " ".join(FLAGS).encode())
+
+def cache_get(path: str) -> bool:
+    return CACHE is not None and os.path.exists(f"{CACHE}/{path}")
+
+def cache_put(path: str, src: str):
+    """Copies the file into the cache, the rename makes it safe for parallel compilations."""
+    if CACHE is None:
+        return
+    os.makedirs(os.path.dirname(f"{CACHE}/{path}"), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(f"{CACHE}/{path}"))
+    os.close(fd)
+    shutil.copy(src, tmp_path)
+    os.replace(tmp_path, f"{CACHE}/{path}")
+
+def compile_object(source: str, key: str, obj_dir: str) -> Tuple[int, str, str]:
+    """Compiles one translation unit or takes it from the cache, returns (return_code, object, diagnostics)."""
+    obj_path = f"{obj_dir}/{source}.o"
+    diag_path = f"{obj_dir}/{source}.txt"
+    if cache_get(f"obj/{key}.o"):
+        shutil.copy(f"{CACHE}/obj/{key}.o", obj_path)
+        shutil.copy(f"{CACHE}/obj/{key}.txt", diag_path)
+    else:
+        with open(diag_path, "w") as diag_file:
+            ret_code = subprocess.run([COMPILER, *FLAGS, "-c", "-o", obj_path, f"{SRC_TMP}/{source}"], stderr=diag_file).returncode
+        if ret_code != 0:
+            return ret_code, obj_path, diag_path
+        cache_put(f"obj/{key}.txt", diag_path)
+        cache_put(f"obj/{key}.o", obj_path)
+    return 0, obj_path, diag_path
+
+def build(sources: List[str], compiler_key: str, headers_key: str) -> int:
+    """Compiles the sources to objects in parallel and links them into BIN_TMP/program."""
+    with tempfile.TemporaryDirectory() as obj_dir, open(DIAGNOSTIC_FILE, "w") as diag_file:
+        #objects depend on every non .cpp file, because any of them can be included
+        keys = [digest(compiler_key.encode(), headers_key.encode(), source.encode(), read_src(source)) for source in sources]
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            objects = list(pool.map(compile_object, sources, keys, [obj_dir] * len(sources)))
+
+        for _, _, diag_path in objects:
+            with open(diag_path, "r") as obj_diag:
+                diag_file.write(obj_diag.read())
+        for ret_code, _, _ in objects:
+            if ret_code != 0:
+                return ret_code
+
+        diag_file.flush()
+        return subprocess.run([COMPILER, *FLAGS, "-o", f"{BIN_TMP}/program", *[obj for _, obj, _ in objects]], stderr=diag_file).returncode
+
 def compile():
-    ret_code: int = os.system(f"g++ -Wextra -Wall -o {BIN_TMP}/program {SRC_TMP}/*.cpp 2> {DIAGNOSTIC_FILE}") #todo: add diagnostic file
+    files = sorted(os.listdir(SRC_TMP))
+    sources = [name for name in files if name.endswith(".cpp")]
+    headers = [name for name in files if not name.endswith(".cpp")]
+    compiler_key = compiler_digest()
+    key = digest(compiler_key.encode(), file_digest(files).encode())
+
     meta = {}
-    meta["return_code"] = ret_code
+    if cache_get(f"bin/{key}/comp.json"):
+        #the same submission was already compiled, g++ is not run at all
+        with open(f"{CACHE}/bin/{key}/comp.json", "r") as cached_meta:
+            meta = json.load(cached_meta)
+        shutil.copy(f"{CACHE}/bin/{key}/comp.txt", DIAGNOSTIC_FILE)
+        if meta["return_code"] == 0:
+            shutil.copy(f"{CACHE}/bin/{key}/program", f"{BIN_TMP}/program")
+        meta["cached"] = True
+    elif not sources:
+        with open(DIAGNOSTIC_FILE, "w") as diag_file:
+            diag_file.write("no source files\n")
+        meta["return_code"] = 1
+    else:
+        meta["return_code"] = build(sources, compiler_key, file_digest(headers))
+        if meta["return_code"] == 0:
+            cache_put(f"bin/{key}/program", f"{BIN_TMP}/program")
+        cache_put(f"bin/{key}/comp.txt", DIAGNOSTIC_FILE)
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as tmp_meta:
+            json.dump(meta, tmp_meta)
+            tmp_meta.flush()
+            #comp.json is stored last, it marks the cache entry as complete
+            cache_put(f"bin/{key}/comp.json", tmp_meta.name)
+
     with open(OUT_FILE, "w") as out_file:
         json.dump(meta, out_file)
-    
+
 def copy_out_files():
     for file_name in os.listdir(OUT_TMP):
         full_file_name = os.path.join(OUT_TMP, file_name)
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import py_compile
+import tempfile
+import zipfile
+
+SRC = os.getenv("SRC")
+OUT = os.getenv("OUT")
+BIN = os.getenv("BIN")
+BIN_TMP = os.getenv("BIN_TMP", "/tmp/bin")
+DIAGNOSTIC_FILE = f"{OUT}/comp.txt"
+OUT_FILE = f"{OUT}/comp.json"
+PROGRAM = "program.pyz"
+
+def compile():
+    """Compiles the sources to bytecode and packs them into a zipapp run by the exec fork server.
+
+    main.py becomes __main__, the sources are kept next to the bytecode for
+    tracebacks and as a fallback for another interpreter version.
+    """
+    meta = {}
+    meta["return_code"] = 0
+    files = sorted(name for name in os.listdir(SRC) if os.path.isfile(f"{SRC}/{name}"))
+    with open(DIAGNOSTIC_FILE, "w") as diag_file, tempfile.TemporaryDirectory() as build_dir:
+        if "main.py" not in files:
+            diag_file.write("main.py not found!\n")
+            meta["return_code"] = 1
+        with zipfile.ZipFile(f"{BIN_TMP}/{PROGRAM}", "w") as archive:
+            for name in files:
+                src_path = f"{SRC}/{name}"
+                if not name.endswith(".py"):
+                    archive.write(src_path, name)
+                    continue
+                module = "__main__" if name == "main.py" else name[:-3]
+                try:
+                    #unchecked hash: the pyc is used without comparing it with the source mtime
+                    py_compile.compile(src_path, cfile=f"{build_dir}/{module}.pyc", dfile=name, doraise=True,
+                                       invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+                except py_compile.PyCompileError as e:
+                    diag_file.write(e.msg + "\n")
+                    meta["return_code"] = 1
+                    continue
+                archive.write(f"{build_dir}/{module}.pyc", f"{module}.pyc")
+                archive.write(src_path, f"{module}.py")
+    if meta["return_code"] != 0:
+        os.remove(f"{BIN_TMP}/{PROGRAM}")
+    with open(OUT_FILE, "w") as out_file:
+        json.dump(meta, out_file)
+
+def copy_out_files():
+    for file_name in os.listdir(BIN_TMP):
+        full_file_name = os.path.join(BIN_TMP, file_name)
+        if os.path.isfile(full_file_name):
+            shutil.copy(full_file_name, BIN)
+
+
+if __name__ == "__main__":
+    os.umask(0)
+    compile()
+    copy_out_files()
@@ -0,0 +1,135 @@
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+#Test data generators: a generator script only describes the tests, this module
+#writes the files in big blocks, runs the tests in parallel and keeps the
+#results in a cache, so unchanged tests are not generated again.
+
+Data = Union[str, bytes, Iterable[Union[str, bytes]]]
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+EXEC_IN = os.getenv("EXEC_IN", f"{ROOT_DIR}/src/example/exec-in")
+COMP_OUT = os.getenv("COMP_OUT", f"{ROOT_DIR}/src/example/comp-out")
+EXEC_OUT = os.getenv("EXEC_OUT", f"{ROOT_DIR}/src/example/exec-out")
+GEN_CACHE = os.getenv("GEN_CACHE", f"{ROOT_DIR}/src/example/gen-cache")
+WORKERS = int(os.getenv("WORKERS") or len(os.sched_getaffinity(0)))
+
+BLOCK_LINES = 1 << 16
+BUFFER_SIZE = 1 << 20
+
+def repeat(line: str, n: int) -> Iterator[bytes]:
+    """n copies of the line, in blocks instead of one write per line."""
+    block = line.encode() * BLOCK_LINES
+    for _ in range(n // BLOCK_LINES):
+        yield block
+    yield line.encode() * (n % BLOCK_LINES)
+
+def lines(values: Iterable) -> Iterator[bytes]:
+    """The values one per line, joined in blocks of BLOCK_LINES lines."""
+    values = iter(values)
+    while batch := list(islice(values, BLOCK_LINES)):
+        yield ("\n".join(map(str, batch)) + "\n").encode()
+
+def write(path: str, data: Data):
+    with open(path, "wb", buffering=BUFFER_SIZE) as file:
+        if isinstance(data, (str, bytes)):
+            data = [data]
+        for chunk in data:
+            file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+class Generator:
+    """Declarative test set.
+
+    make(rng, **params) returns (input, output) of one test for every params
+    dict of tests, test i is named str(i). rng is a random.Random seeded with
+    the seed and the test name, so the data does not depend on the order or on
+    the number of workers.
+    """
+
+    def __init__(self, make: Callable[..., Tuple[Data, Data]], tests: List[dict], seed: int = 0):
+        self.make = make
+        self.tests = tests
+        self.seed = seed
+        #changes in the generator script or in this module make new tests
+        self.source_key = file_digest(inspect.getsourcefile(make)) + file_digest(__file__)
+
+    def key(self, name: str) -> str:
+        params = json.dumps(self.tests[int(name)], sort_keys=True)
+        return hashlib.sha256(f"{self.source_key}/{self.seed}/{name}/{params}".encode()).hexdigest()
+
+    def build(self, name: str, cache_dir: str) -> bool:
+        """Generates the test into the cache, returns False if it was already there."""
+        entry = f"{cache_dir}/{self.key(name)}"
+        if os.path.exists(entry):
+            return False
+        tmp = tempfile.mkdtemp(dir=cache_dir)
+        try:
+            test_in, test_out = self.make(random.Random(f"{self.seed}/{name}"), **self.tests[int(name)])
+            write(f"{tmp}/in", test_in)
+            write(f"{tmp}/out", test_out)
+            #the rename makes the entry complete at once
+            os.rename(tmp, entry)
+        except OSError:
+            if not os.path.exists(entry):
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return True
+
+    def generate(self, exec_in: str = EXEC_IN, cache_dir: str = GEN_CACHE, workers: int = WORKERS) -> Dict[str, bool]:
+        """Puts all tests into exec_in/in and exec_in/out, returns {name: generated}."""
+        os.makedirs(cache_dir, exist_ok=True)
+        names = [str(i) for i in range(len(self.tests))]
+        if workers > 1 and len(names) > 1:
+            #fork, because make usually lives in the __main__ of the generator script
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+                generated = dict(zip(names, pool.map(self.build, names, [cache_dir] * len(names))))
+        else:
+            generated = {name: self.build(name, cache_dir) for name in names}
+
+        for d in ["in", "out"]:
+            os.makedirs(f"{exec_in}/{d}", exist_ok=True)
+            for file_name in os.listdir(f"{exec_in}/{d}"):
+                #tests left from a bigger test set
+                if file_name.endswith(f".{d}") and file_name.split(".")[0] not in generated:
+                    os.remove(f"{exec_in}/{d}/{file_name}")
+        for name in names:
+            for d in ["in", "out"]:
+                link(f"{cache_dir}/{self.key(name)}/{d}", f"{exec_in}/{d}/{name}.{d}")
+        return generated
+
+def link(src: str, dst: str):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    os.chmod(dst, 0o777)
+
+def main(generator: Generator):
+    """Prepares the example directories like demo.py expects them and generates the tests."""
+    for path in [COMP_OUT, EXEC_OUT]:
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        os.chmod(path, 0o777)
+
+    generated = generator.generate()
+    for d in [EXEC_IN, f"{EXEC_IN}/in", f"{EXEC_IN}/out"]:
+        os.chmod(d, 0o777)
+    for name, new in generated.items():
+        print(f"test {name:>3}: {'generated' if new else 'cached'}")
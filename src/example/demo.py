@@ -1,10 +1,31 @@
 #!/usr/bin/env python3
 
+import asyncio
 import subprocess
 import os
+import sys
+import tempfile
 import time
 import json
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+#the modules shared by the stages, copied next to main.py in the images
+COMMON_DIR = f"{SRC_DIR}/common"
+sys.path.insert(0, COMMON_DIR)
+from manifest import MANIFEST_FILE, load_manifest, manifest_results, test_key
+
+COMPILERS = {"cpp": "compilers/cpp-compiler", "python": "compilers/python-compiler"}
+#the same image names as the defaults of the docker backend of the worker
+COMPILER_IMAGES = {"cpp": "comp", "python": "comp-python"}
+
+#Every submission flows compile -> exec -> judge on its own. The judge stage
+#runs along with exec (FOLLOW=on) and judges each test as soon as its output is
+#written, and the next submission is compiled while the current one is running.
+#A stage is a (command, env, cwd) tuple: docker run, or python main.py of the
+#stage directory when local.
+
+Stage = Tuple[List[str], Optional[Dict[str, str]], Optional[str]]
 
 def print_resoults(path: str) -> Tuple[int, str]:
     ret = ""
@@ -13,135 +34,221 @@ def print_resoults(path: str) -> Tuple[int, str]:
     ret += "+----+------+-----+\n"
     points = 0
 
-    tests = []
-    for file in os.listdir("./src/example/exec-out"):
-        if file.endswith('.judge.json'):
-            tests.append(int(file.split('.')[0]))
-    tests.sort()
-    for test in tests:
-        with open(f"{path}/{test}.exec.json", "r") as exec_file, open(f"{path}/{test}.judge.json", "r") as judge_file:
-            exec = json.load(exec_file)
-            judge = json.load(judge_file)
-            color = 131 
-            if judge["grade"]:
-                points += 1
-                color = 65
-            if exec["return_code"]!=0:
-                color = 173
-            ret += f'|\033[48;5;{color}m\033[38;5;232m {test:>2} | {exec["user_time"]:.2f} | {exec["return_code"]:>3} \033[0m| {judge["info"]}\n'
+    records = load_manifest(f"{path}/{MANIFEST_FILE}")
+    for test in sorted(records["judge"], key=test_key):
+        exec = records["exec"][test]
+        judge = records["judge"][test]
+        if exec.get("verdict") == "SKIP":
+            ret += f'| {test:>2} |    - |   - | {judge["info"]}\n'
+            continue
+        color = 131 
+        if judge["grade"]:
+            points += 1
+            color = 65
+        if exec["return_code"]!=0:
+            color = 173
+        ret += f'|\033[48;5;{color}m\033[38;5;232m {test:>2} | {exec["user_time"]:.2f} | {exec["return_code"]:>3} \033[0m| {judge["info"]}\n'
     ret += "+----+------+-----+\n"
     ret += "| "+f"points: {points}".center(15)+" |\n"
     ret += "+----+------+-----+"
     return points, ret
 
-def run_example(build: bool = True, compile: bool=True, logs: bool=True):
-    # build = False
-    # logs = False
-    exmp_path = r"./src/example"
-    comp_path = r"./src/compilers/cpp-compiler"
-    # comp_path = r"./src/compilers/python-compiler"
-    exec_path = r"./src/exec-python"
-    judge_path = r"./src/judge"
-
-    exec_in = exmp_path+"/exec-in"
-    exec_out = exmp_path+"/exec-out"
-    comp_in = exmp_path+"/comp-in"
-    comp_out = exmp_path+"/comp-out" 
-
-    run_comp_command = [
-        "docker", "run", 
+def docker_stage(image: str, env: Dict[str, str], volumes: List[str]) -> Stage:
+    command = [
+        "docker", "run",
         "--rm",
         # "--cpus=1.0",
         "--ulimit", "cpu=30:30",
         "--network", "none",
         "--security-opt", "no-new-privileges",
-        "-e",
-        "BIN=/data/out",
-        "-v", f"{comp_in}:/data/in:ro",
-        "-v", f"{comp_out}:/data/out",
-        "comp"
     ]
-    run_exec_command = [
-        "docker", "run", 
-        "--rm",
-        # "--cpus=0.5",
-        "--ulimit", "cpu=30:30",
-        "--network", "none",
-        "--security-opt", "no-new-privileges",
-        "-e",
-        f"LOGS={'on' if logs else 'off'}",
-        "-v", f"{exec_in}/in:/data/in:ro",
-        "-v", f"{comp_out}:/data/bin:ro",
-        "-v", f"{exec_out}:/data/out",
-        "exec"
-    ]
-    run_judge_command = [  
-        "docker", "run", 
-        "--rm",
-        # "--cpus=0.5",
-        "--ulimit", "cpu=30:30",
-        "--network", "none",
-        "--security-opt", "no-new-privileges",
-        "-e",
-        f"LOGS={'on' if logs else 'off'}",
-        "-v", f"{exec_out}:/data/in:ro",
-        "-v", f"{exec_out}:/data/out",
-        "-v", f"{exec_in}/out:/data/answer:ro",
-        "judge"
-    ]
-
+    for key, value in env.items():
+        command += ["-e", f"{key}={value}"]
+    for volume in volumes:
+        command += ["-v", volume]
+    return command + [image], None, None
 
-    #building
-    
-    if build:
-        subprocess.run(["docker", "build", "--build-arg", f"LOGS={'on' if logs else 'off'}", "-t", "exec", exec_path], check=True)
-        subprocess.run(["docker", "build", "--build-arg", f"LOGS={'on' if logs else 'off'}", "-t", "judge", judge_path], check=True)
-        subprocess.run(["docker", "build", "-t", "comp", comp_path], check=True)
+def local_stage(stage_dir: str, env: Dict[str, str]) -> Stage:
+    return [sys.executable, "-u", "main.py"], {**os.environ, "PYTHONPATH": COMMON_DIR, **env}, f"{SRC_DIR}/{stage_dir}"
 
+def comp_stage(submission: dict, tmp: str, local: bool) -> Stage:
+    if local:
+        return local_stage(COMPILERS[submission.get("language", "cpp")], {
+            "SRC": submission["comp_in"],
+            "OUT": submission["comp_out"],
+            "BIN": submission["comp_out"],
+            "CACHE": submission["cache"],
+            "SRC_TMP": f"{tmp}/src",
+            "BIN_TMP": f"{tmp}/bin",
+            "OUT_TMP": f"{tmp}/out",
+        })
+    return docker_stage(COMPILER_IMAGES[submission.get("language", "cpp")], {"BIN": "/data/out", "CACHE": "/data/cache"}, [
+        f"{submission['comp_in']}:/data/in:ro",
+        f"{submission['comp_out']}:/data/out",
+        f"{submission['cache']}:/data/cache",
+    ])
 
-    #compiling
-    
-    if compile:
-        start_time = time.time()
-        
-        try:
-            subprocess.run(run_comp_command, check=True)
-        except Exception as e:
-            print(e)
-            return 1
+def exec_stage(submission: dict, logs: bool, fused: bool, local: bool) -> Stage:
+    env = {"LOGS": "on" if logs else "off"}
+    if fused:
+        #the exec container judges the output itself
+        env["FUSED"] = "on"
+    if local:
+        return local_stage("exec-python", {
+            **env,
+            "IN": f"{submission['exec_in']}/in",
+            "BIN": submission["comp_out"],
+            "OUT": submission["exec_out"],
+            "STD": submission["exec_out"],
+            "ANS": f"{submission['exec_in']}/out",
+        })
+    volumes = [
+        f"{submission['exec_in']}/in:/data/in:ro",
+        f"{submission['comp_out']}:/data/bin:ro",
+        f"{submission['exec_out']}:/data/out",
+    ]
+    if fused:
+        volumes.append(f"{submission['exec_in']}/out:/data/answer:ro")
+    return docker_stage("exec", env, volumes)
 
-        print(f">Compilation time: {round(time.time() - start_time, 2)}")
+def judge_stage(submission: dict, logs: bool, local: bool) -> Stage:
+    env = {"LOGS": "on" if logs else "off", "FOLLOW": "on"}
+    if local:
+        return local_stage("judge", {
+            **env,
+            "IN": submission["exec_out"],
+            "OUT": submission["exec_out"],
+            "ANS": f"{submission['exec_in']}/out",
+        })
+    #not read-only, the judge removes the full outputs of the passed tests
+    return docker_stage("judge", env, [
+        f"{submission['exec_out']}:/data/in",
+        f"{submission['exec_out']}:/data/out",
+        f"{submission['exec_in']}/out:/data/answer:ro",
+    ])
 
+async def start_stage(stage: Stage) -> asyncio.subprocess.Process:
+    command, env, cwd = stage
+    return await asyncio.create_subprocess_exec(*command, env=env, cwd=cwd)
 
+def failed(info: str) -> dict:
+    """The result of a submission stopped before judging."""
+    return {"points": 0, "tests": [], "info": info}
 
-    #running
-    
+async def compile_submission(submission: dict, local: bool) -> Optional[dict]:
+    """None if the program compiled, otherwise the result of the submission."""
+    for d in [submission["comp_out"], submission["cache"]]:
+        os.makedirs(d, exist_ok=True)
+        os.chmod(d, 0o777)
+    comp_path = f"{submission['comp_out']}/comp.json"
+    if os.path.exists(comp_path):
+        os.remove(comp_path)
     start_time = time.time()
-    
+    with tempfile.TemporaryDirectory() as tmp:
+        for d in ["src", "bin", "out"]:
+            os.makedirs(f"{tmp}/{d}")
+        return_code = await (await start_stage(comp_stage(submission, tmp, local))).wait()
+    print(f">{submission['name']} compilation time: {round(time.time() - start_time, 2)}")
     try:
-        subprocess.run(run_exec_command, check=True)
-    except Exception as e:
-        print(e)
-        return 1
-    
-    print(f">Execution time: {round(time.time() - start_time, 2)}")
+        with open(comp_path, "r") as comp_file:
+            return_code = json.load(comp_file)["return_code"] or return_code
+    except (OSError, ValueError, KeyError):
+        return_code = return_code or -1
+    if return_code != 0:
+        return failed(f"compilation failed with return code {return_code}")
+    return None
 
-
-    #judging
+async def run_submission(submission: dict, logs: bool, fused: bool, local: bool) -> dict:
+    """Exec and judge at the same time, the judge takes the tests from the manifest as they end."""
+    os.makedirs(submission["exec_out"], exist_ok=True)
+    os.chmod(submission["exec_out"], 0o777)
+    #the judge follows the manifest, the one of the last run would be judged again
+    manifest_path = f"{submission['exec_out']}/{MANIFEST_FILE}"
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
 
     start_time = time.time()
+    exec_process = await start_stage(exec_stage(submission, logs, fused, local))
+    judge_process = None if fused else await start_stage(judge_stage(submission, logs, local))
+    return_code = await exec_process.wait()
+    exec_time = time.time()
+    print(f">{submission['name']} execution time: {round(exec_time - start_time, 2)}")
+    if return_code != 0:
+        if judge_process is not None:
+            judge_process.kill()
+            await judge_process.wait()
+        return failed(f"exec stage failed with return code {return_code}")
+
+    if judge_process is not None:
+        return_code = await judge_process.wait()
+        #only the part after the last test, the rest overlaps with exec
+        print(f">{submission['name']} judge time: {round(time.time() - exec_time, 2)}")
+        if return_code != 0:
+            return failed(f"judge stage failed with return code {return_code}")
+    return manifest_results(manifest_path) or failed("no judged tests")
+
+async def run_pipeline(submissions: List[dict], logs: bool = True, fused: bool = False, local: bool = False, compile: bool = True) -> List[dict]:
+    """Results of the submissions in order, each one is compiled while the previous one runs.
+
+    A submission is a dict with name, comp_in, comp_out, cache, exec_in (with
+    in/ and out/), exec_out and optionally language (for local).
+    """
+    compiled: asyncio.Queue = asyncio.Queue()
+
+    async def compiler():
+        for submission in submissions:
+            result = await compile_submission(submission, local) if compile else None
+            await compiled.put((submission, result))
+            #one submission ahead of the running one
+            await compiled.join()
+
+    async def runner() -> List[dict]:
+        results = []
+        for _ in submissions:
+            submission, result = await compiled.get()
+            compiled.task_done()
+            results.append(result or await run_submission(submission, logs, fused, local))
+        return results
+
+    _, results = await asyncio.gather(compiler(), runner())
+    return results
+
+def run_example(build: bool = True, compile: bool=True, logs: bool=True, fused: bool=False, local: bool=False):
+    # build = False
+    # logs = False
+    exmp_path = os.path.abspath("./src/example")
+    exec_path = r"./src/exec-python"
+    judge_path = r"./src/judge"
+
+    submission = {
+        "name": "example",
+        "exec_in": exmp_path+"/exec-in",
+        "exec_out": exmp_path+"/exec-out",
+        "comp_in": exmp_path+"/comp-in",
+        "comp_out": exmp_path+"/comp-out",
+        "cache": exmp_path+"/comp-cache",
+    }
+
+
+    #building
     
-    try:
-        subprocess.run(run_judge_command, check=True)
-    except Exception as e:
-        print(e)
+    if build and not local:
+        subprocess.run(["docker", "build", "--build-arg", f"LOGS={'on' if logs else 'off'}", "-t", "exec", "-f", f"{exec_path}/dockerfile", SRC_DIR], check=True)
+        subprocess.run(["docker", "build", "--build-arg", f"LOGS={'on' if logs else 'off'}", "-t", "judge", "-f", f"{judge_path}/dockerfile", SRC_DIR], check=True)
+        for language, image in COMPILER_IMAGES.items():
+            subprocess.run(["docker", "build", "-t", image, f"{SRC_DIR}/{COMPILERS[language]}"], check=True)
+
+
+    #compiling, running and judging
+
+    result = asyncio.run(run_pipeline([submission], logs, fused, local, compile))[0]
+    if "info" in result:
+        print(result["info"])
         return 1
-    
-    print(f">Judge time: {round(time.time() - start_time, 2)}")
 
     #printing resoults
     
-    points, result = print_resoults(exec_out)
+    points, result = print_resoults(submission["exec_out"])
     print(result)
 
 
@@ -149,4 +256,4 @@ if __name__ == "__main__":
     file_dir = os.path.dirname( os.path.abspath(__file__) )
     os.chdir(f"{file_dir}/../..")
     os.system("ls")
-    run_example()
\ No newline at end of file
+    run_example()
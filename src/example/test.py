@@ -1,24 +1,30 @@
-from demo import run_example, print_resoults
-import json
+import os
+import sys
+import time
+
+file_dir = os.path.dirname( os.path.abspath(__file__) )
+sys.path.insert(0, f"{file_dir}/../worker")
+sys.path.insert(0, f"{file_dir}/../common")
+from demo import run_example
+from manifest import MANIFEST_FILE
+from results_db import ResultsDB
 import matplotlib.pyplot as plt
 
 exec_out_path = "src/example/exec-out"
 
-times = []
+db = ResultsDB("src/example/results.db")
 n = 25
 
 for i in range(n):
     run_example(False, False, False)
-    times.append([])
-    for j in range(20):
-        with open(f"{exec_out_path}/{j}.exec.json", "r") as exec_file:
-            exec = json.load(exec_file)
-            times[i].append(exec["user_time"])
+    db.ingest(f"example-{time.time_ns()}", f"{exec_out_path}/{MANIFEST_FILE}", "example")
 
                
 
 for i in range(15, 20):
-    plt.plot([j[i] for j in times], label=f'cpu user time test {i}')
+    history = db.history("example", str(i), last=n)[::-1]
+    stats = db.test_stats("example", str(i), last=n)
+    plt.plot([run["user_time"] for run in history], label=f'cpu user time test {i} (p95 {stats["p95"]:.3f})')
 
 
 plt.xlabel('n')
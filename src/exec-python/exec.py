@@ -1,37 +1,353 @@
 import sys
+import fcntl
 import subprocess
-import resource
+import signal
+import select
 import json
 import os
+import time
+import threading
+import queue
+from contextlib import nullcontext
+from typing import Callable, List, Optional
+from forkserver import ForkServer
+from manifest import Manifest
+from stream import StreamJudge, write_judge
+from limits import LIMITS, load_limits, test_limits, set_limits
+from groups import SKIPPED
+from artifacts import ARTIFACTS, keep_full, store_all
+from timing import REPEATS, TIMING, WARMUP, borderline, relaxed, summary
 # import psutil
 
-name = sys.argv[1]  
-  
-binary_path = f"{os.getenv('BIN')}/program"
-input_path=f"{os.getenv('IN')}/{name}.in"
-
-output_path=f"{os.getenv('STD')}/{name}.stdout.out"
-# output_path=f"/tmp/out/{name}.stdout.out"
-error_path=f"{os.getenv('STD')}/{name}.stderr.out"
-# error_path=f"/tmp/out/{name}.stderr.out"
-exec_path=f"{os.getenv('OUT')}/{name}.exec.json"
-# exec_path=f"/tmp/out/{name}.exec.json"
-
-return_code = 0
-with open(input_path, "r") as input_file, open(error_path, "w") as error_file, open(exec_path, "w") as exec_file, open(output_path, "w") as output_file:
-    program_process = subprocess.Popen(
+CHUNK_SIZE = 1 << 16
+#{name}.exec.json and {name}.judge.json next to the manifest, for older readers
+JSON_FILES = os.getenv("JSON_FILES", "on") == "on"
+#files: stdin and stdout are files on the volumes, memfd: both are kept in RAM
+IO = os.getenv("IO", "files")
+#with memfd stdout is saved only when it is needed, DEBUG=on saves all of them
+DEBUG = os.getenv("DEBUG") == "on"
+#abort messages of an allocation that failed at the address space limit
+ALLOCATION_FAILURES = [b"std::bad_alloc"]
+
+fork_servers = threading.local()
+fork_server_list: List[ForkServer] = []
+#programs of all the fork servers started, for the logs
+fork_server_starts: List[str] = []
+
+def get_fork_server(program: str) -> ForkServer:
+    """Fork server of the current runner thread, started on the first python test."""
+    server = getattr(fork_servers, "server", None)
+    #servers not on the list were closed by close_fork_servers
+    if server not in fork_server_list or fork_servers.program != program:
+        if server in fork_server_list:
+            #in the batch mode the thread moves on to another submission
+            fork_server_list.remove(server)
+            server.close()
+        fork_servers.server = ForkServer(program)
+        fork_servers.program = program
+        fork_server_starts.append(program)
+        fork_server_list.append(fork_servers.server)
+    return fork_servers.server
+
+def close_fork_servers():
+    while fork_server_list:
+        fork_server_list.pop().close()
+
+def kill(pidfd: int):
+    try:
+        signal.pidfd_send_signal(pidfd, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def reap(pid: int):
+    #wait4 gives the rusage of this child only, so parallel tests do not mix
+    _, status, resources = os.wait4(pid, 0)
+    return status, resources
+
+def wait(pid: int, timeout: Optional[float], stdout: Optional[int] = None, consume: Optional[Callable[[bytes], bool]] = None, reap: Callable = reap):
+    """Waits for the process and kills it as soon as the wall time limit is exceeded.
+
+    If stdout is given, the output is passed to consume while the program is
+    running and the program is killed when consume returns False. reap
+    collects the wait status and rusage of the finished process.
+    """
+    timed_out = False
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pidfd = os.pidfd_open(pid)
+    try:
+        fds = [pidfd] if stdout is None else [pidfd, stdout]
+        while fds:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            ready, _, _ = select.select(fds, [], [], remaining)
+            if not ready:
+                timed_out = True
+                kill(pidfd)
+                break
+            if stdout in ready:
+                data = os.read(stdout, CHUNK_SIZE)
+                if not data:
+                    fds.remove(stdout)
+                elif not consume(data):
+                    kill(pidfd)
+                    break
+            if pidfd in ready:
+                fds.remove(pidfd)
+    finally:
+        os.close(pidfd)
+    status, resources = reap(pid)
+    return os.waitstatus_to_exitcode(status), resources, timed_out
+
+def spawn(binary_path: str, stdin: int, stdout: int, stderr: int, limits: dict, cpu: Optional[int]):
+    """Starts the program, a python one through the fork server of the thread.
+
+    Returns the pid, the function reaping it and the Popen object, if any.
+    """
+    if os.path.exists(f"{binary_path}.pyz"):
+        fork_server = get_fork_server(f"{binary_path}.pyz")
+        return fork_server.spawn(stdin, stdout, stderr, limits, cpu), fork_server.reap, None
+    process = subprocess.Popen(
         [binary_path],
-        stdin=input_file,    
-        stderr=error_file,
-        stdout=output_file,
+        stdin=stdin,
+        stderr=stderr,
+        stdout=stdout,
+        preexec_fn=lambda: set_limits(limits, cpu),
     )
+    return process.pid, reap, process
+
+def measure(binary_path: str, input_path: str, limits: dict, cpu: Optional[int], cpus: Optional["queue.Queue[int]"] = None) -> List[float]:
+    """user_time of REPEATS runs after WARMUP runs, on one of cpus (the isolated cores) if given."""
+    measure_cpu = cpus.get() if cpus is not None else cpu
+    times = []
+    try:
+        with open(os.devnull, "wb") as devnull:
+            for i in range(WARMUP + REPEATS):
+                with open(input_path, "rb") as input_file:
+                    pid, process_reap, process = spawn(binary_path, input_file.fileno(), devnull.fileno(), devnull.fileno(), limits, measure_cpu)
+                    return_code, resources, _ = wait(pid, limits["wall_time_limit"], reap=process_reap)
+                if process is not None:
+                    process.returncode = return_code
+                if i >= WARMUP:
+                    times.append(resources.ru_utime)
+    finally:
+        if cpus is not None:
+            cpus.put(measure_cpu)
+    return times
+
+def copy_fd(src: int, dst: int):
+    """Copies the whole src into dst in the kernel, without reading it into python."""
+    size = os.fstat(src).st_size
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst, src, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+
+def memfd_input(input_file) -> int:
+    """The input read once in bulk into a sealed memfd, the program reads it from RAM."""
+    fd = os.memfd_create(os.path.basename(input_file.name), os.MFD_CLOEXEC | os.MFD_ALLOW_SEALING)
+    try:
+        copy_fd(input_file.fileno(), fd)
+        fcntl.fcntl(fd, fcntl.F_ADD_SEALS, fcntl.F_SEAL_SHRINK | fcntl.F_SEAL_GROW | fcntl.F_SEAL_WRITE | fcntl.F_SEAL_SEAL)
+        os.lseek(fd, 0, os.SEEK_SET)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+def write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def allocation_failed(return_code: int, resources, stderr: int) -> bool:
+    """The program ended because an allocation hit the address space limit (RLIMIT_AS).
+
+    Such an allocation fails at once with a small rss, so ru_maxrss does not
+    show it. A python MemoryError is reported by the fork server, a C++
+    std::bad_alloc by its abort message at the end of stderr. Other failures
+    (e.g. a null pointer from malloc) stay runtime errors.
+    """
+    if return_code == 0:
+        return False
+    if getattr(resources, "memory_error", False):
+        return True
+    if return_code != -signal.SIGABRT:
+        return False
+    size = os.fstat(stderr).st_size
+    tail = os.pread(stderr, 4096, max(0, size - 4096))
+    return any(message in tail for message in ALLOCATION_FAILURES)
+
+def get_verdict(return_code: int, user_time: float, memory: int, timed_out: bool, limits: dict, allocation_failed: bool = False) -> str:
+    if timed_out:
+        return "TLE"
+    if return_code == -signal.SIGXCPU or (limits["time_limit"] is not None and user_time > limits["time_limit"]):
+        return "TLE"
+    if return_code == -signal.SIGXFSZ:
+        return "OLE"
+    if limits["memory_limit"] is not None and (memory > limits["memory_limit"] or allocation_failed):
+        return "MLE"
+    if return_code != 0:
+        return "RE"
+    return "OK"
+
+def run(name: str, limits: Optional[dict] = None, cpu: Optional[int] = None, fused: bool = False, manifest: Optional[Manifest] = None, submitted: Optional[float] = None, bin_dir: Optional[str] = None, out_dir: Optional[str] = None, timing_cpus: Optional["queue.Queue[int]"] = None) -> dict:
+    """Runs a single test, appends its exec record to the manifest and writes {name}.exec.json.
+
+    In the fused mode the output is compared with the answer (ANS) while the
+    program is running, stdout is not saved and the judge record is written
+    instead of waiting for the judge stage. With IO=memfd stdin and stdout are
+    memfds and stdout is written to STD only if the judge needs it.
+
+    bin_dir and out_dir replace BIN and OUT (and STD) for one submission of a batch.
+    With TIMING=precise a borderline run is repeated (on one of timing_cpus, if
+    given) and the median user_time decides the verdict.
+    """
+    limits = test_limits(limits or {}, name)
+    precise = TIMING == "precise"
+    #the verdict is decided by the real limits, the precise run is killed a bit later
+    run_limits = relaxed(limits) if precise else limits
+    binary_path = f"{bin_dir or os.getenv('BIN')}/program"
+    input_path=f"{os.getenv('IN')}/{name}.in"
+
+    std_dir = out_dir or os.getenv('STD')
+    out_dir = out_dir or os.getenv('OUT')
+    output_path=f"{std_dir}/{name}.stdout.out"
+    error_path=f"{std_dir}/{name}.stderr.out"
+    exec_path=f"{out_dir}/{name}.exec.json"
+    answer_path=f"{os.getenv('ANS')}/{name}.out"
+    judge_path=f"{out_dir}/{name}.judge.json"
+
+    stream_judge = None
+    if fused:
+        output_limit = None if limits["output_limit"] is None else limits["output_limit"] * 1024
+        stream_judge = StreamJudge(answer_path, output_limit)
+
+    started = time.time()
+    memfd = IO == "memfd"
+    #stderr is never compared, it waits in RAM and only its bounded copy is saved unless the test failed
+    error_capture = os.memfd_create(f"{name}.stderr", os.MFD_CLOEXEC) if ARTIFACTS != "full" else None
+    artifacts = {}
+    with open(input_path, "rb") as input_file, open(error_path, "w+") if error_capture is None else nullcontext() as error_file:
+        stderr = error_file.fileno() if error_capture is None else error_capture
+        stdin = memfd_input(input_file) if memfd else input_file.fileno()
+        #with memfd stdout is captured in RAM and written to the volume later, if at all
+        capture = os.memfd_create(f"{name}.stdout", os.MFD_CLOEXEC) if memfd else None
+        try:
+            if fused:
+                stdout_read, stdout = os.pipe()
+            elif capture is not None:
+                stdout = capture
+            else:
+                stdout = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o666)
+            program_process = None
+            start_time = time.monotonic()
+            try:
+                pid, process_reap, program_process = spawn(binary_path, stdin, stdout, stderr, run_limits, cpu)
+            finally:
+                if stdout != capture:
+                    #only the program can write to the pipe, so EOF comes when it exits
+                    os.close(stdout)
+            spawn_time = time.monotonic() - start_time
+            if fused:
+                consume = stream_judge.feed
+                if capture is not None:
+                    consume = lambda data: write_all(capture, data) or stream_judge.feed(data)
+                try:
+                    return_code, resources, timed_out = wait(pid, run_limits["wall_time_limit"], stdout_read, consume, process_reap)
+                finally:
+                    os.close(stdout_read)
+            else:
+                return_code, resources, timed_out = wait(pid, run_limits["wall_time_limit"], reap=process_reap)
+            wall_time = time.monotonic() - start_time
+            if program_process is not None:
+                program_process.returncode = return_code
+
+            meta = {}
+            meta["return_code"] = return_code
+            meta["user_time"] =  round(resources.ru_utime, 10)
+            meta["memory"] =  round(resources.ru_maxrss, 10)
+            #spans and counters for the metrics exported by the worker
+            meta["wall_time"] = round(wall_time, 6)
+            meta["start"] = round(started, 6)
+            if submitted is not None:
+                meta["queue_time"] = round(started - submitted, 6)
+            meta["spawn_time"] = round(spawn_time, 6)
+            if cpu is not None:
+                meta["cpu"] = cpu
+            meta["input_bytes"] = os.fstat(input_file.fileno()).st_size
+            if fused:
+                meta["output_bytes"] = stream_judge.output_size
+            elif capture is not None:
+                meta["output_bytes"] = os.fstat(capture).st_size
+            else:
+                meta["output_bytes"] = os.path.getsize(output_path)
+            out_of_memory = limits["memory_limit"] is not None and allocation_failed(return_code, resources, stderr)
+            meta["verdict"] = get_verdict(return_code, meta["user_time"], meta["memory"], timed_out, limits, out_of_memory)
+            if fused and stream_judge.output_limit_exceeded():
+                meta["verdict"] = "OLE"
+            elif fused and not stream_judge.correct:
+                #killed by the judge, not a runtime error
+                meta["verdict"] = "WA"
+            if precise and meta["verdict"] in ["OK", "TLE"] and return_code == 0 and not timed_out and borderline(meta["user_time"], limits):
+                #the output is already checked, the repeats measure the time only
+                times = measure(binary_path, input_path, run_limits, cpu, timing_cpus)
+                meta["timing"] = summary(times, meta["user_time"])
+                meta["user_time"] = meta["timing"]["median"]
+                meta["verdict"] = get_verdict(return_code, meta["user_time"], meta["memory"], timed_out, limits, out_of_memory)
+
+            output = None
+            if fused:
+                output = write_judge(judge_path if JSON_FILES else None, meta, stream_judge)
+                stream_judge.close()
+            if capture is not None:
+                #the judge stage needs the output of the accepted runs only, the fused mode for nothing but debugging
+                needed = output["grade"] == 0 if fused else meta["verdict"] == "OK"
+                if needed or DEBUG:
+                    with open(output_path, "wb") as output_file:
+                        copy_fd(capture, output_file.fileno())
+            if error_capture is not None:
+                #without the judge stage a wrong answer is known here, otherwise only the failed runs
+                if keep_full(output["grade"] == 0 if fused else meta["verdict"] != "OK"):
+                    with open(error_path, "wb") as error_output:
+                        copy_fd(error_capture, error_output.fileno())
+                #the judge stores stdout after comparing it, the fused mode has no judge stage
+                artifacts = store_all({"stdout": capture if fused else None, "stderr": error_capture}, std_dir)
+                if artifacts and not fused:
+                    #passed on to the judge record by the judge stage
+                    meta["artifacts"] = artifacts
+        finally:
+            if memfd:
+                os.close(stdin)
+                os.close(capture)
+            if error_capture is not None:
+                os.close(error_capture)
+
+    if manifest is not None:
+        manifest.append({"stage": "exec", "test": name, **meta})
+        if output is not None:
+            manifest.append({"stage": "judge", "test": name, **output, **({"artifacts": artifacts} if artifacts else {})})
+    if JSON_FILES:
+        with open(exec_path, "w") as exec_file:
+            json.dump(meta, exec_file)
+    return meta
 
-    resource.prlimit(program_process.pid, resource.RLIMIT_CPU, (2, 2)) #todo change
-    program_process.wait()
+def skip(name: str, reason: str, fused: bool = False, manifest: Optional[Manifest] = None, out_dir: Optional[str] = None) -> dict:
+    """Records a test that is not run because of the fail-fast policy."""
+    out_dir = out_dir or os.getenv('OUT')
+    meta = {"verdict": "SKIP", "reason": reason}
+    output = {"grade": 0, "info": SKIPPED, "skipped": True} if fused else None
+    if manifest is not None:
+        manifest.append({"stage": "exec", "test": name, **meta})
+        if output is not None:
+            manifest.append({"stage": "judge", "test": name, **output})
+    if JSON_FILES:
+        with open(f"{out_dir}/{name}.exec.json", "w") as exec_file:
+            json.dump(meta, exec_file)
+        if output is not None:
+            with open(f"{out_dir}/{name}.judge.json", "w") as judge_file:
+                json.dump(output, judge_file)
+    return meta
 
-    meta = {}
-    resources = resource.getrusage(resource.RUSAGE_CHILDREN)
-    meta["return_code"] = program_process.returncode
-    meta["user_time"] =  round(resources.ru_utime, 10)
-    meta["memory"] =  round(resources.ru_maxrss, 10)
-    json.dump(meta, exec_file)
+if __name__ == "__main__":
+    run(sys.argv[1], load_limits(), fused=os.getenv("FUSED")=="on")
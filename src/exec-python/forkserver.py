@@ -0,0 +1,46 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+from types import SimpleNamespace
+from typing import Optional, Tuple
+from pyserver import MESSAGE_SIZE
+
+#Python submissions are compiled to a zipapp (program.pyz). Instead of starting
+#an interpreter for every test, a fork server with a ready interpreter forks
+#a child per test, so the startup is not paid and not counted in user_time.
+#The server itself is pyserver.py.
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pyserver.py")
+
+class ForkServer:
+    """Client side: starts the fork server process and asks it for children.
+
+    Every request is spawn() and then reap() after the child has exited, one
+    request at a time, so every runner thread needs its own fork server.
+    """
+
+    def __init__(self, program: str):
+        self.socket, server_socket = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", "-u", SERVER, program, str(server_socket.fileno())],
+            pass_fds=[server_socket.fileno()],
+            stdin=subprocess.DEVNULL,
+        )
+        server_socket.close()
+
+    def spawn(self, stdin: int, stdout: int, stderr: int, limits: dict, cpu: Optional[int] = None) -> int:
+        request = {"limits": limits, "cpu": cpu}
+        socket.send_fds(self.socket, [json.dumps(request).encode()], [stdin, stdout, stderr])
+        return json.loads(self.socket.recv(MESSAGE_SIZE))["pid"]
+
+    def reap(self, pid: int) -> Tuple[int, SimpleNamespace]:
+        """Wait status and rusage of the child, the server waits for it only now, so the pid is not reused before."""
+        self.socket.send(json.dumps({"wait": pid}).encode())
+        result = json.loads(self.socket.recv(MESSAGE_SIZE))
+        return result["status"], SimpleNamespace(ru_utime=result["user_time"], ru_maxrss=result["memory"], memory_error=result["memory_error"])
+
+    def close(self):
+        self.socket.close()
+        self.process.wait()
@@ -0,0 +1,48 @@
+import os
+import json
+import math
+import resource
+from typing import Optional
+
+#default limits, overridden by the problem config (CONF)
+LIMITS = {
+    "time_limit": 2,        #cpu time [s]
+    "wall_time_limit": 5,   #real time [s]
+    "memory_limit": 262144, #peak rss [kB]
+    "output_limit": 65536,  #stdout and stderr size [kB]
+}
+
+def load_limits(conf_path: Optional[str] = None) -> dict:
+    conf_path = conf_path or os.getenv("CONF") or f"{os.getenv('IN')}/config.json"
+    conf = {}
+    if os.path.isfile(conf_path):
+        with open(conf_path, "r") as conf_file:
+            conf = json.load(conf_file)
+    limits = {key: conf.get(key, value) for key, value in LIMITS.items()}
+    #per-test overrides: {"tests": {"19": {"time_limit": 5}}}
+    limits["tests"] = conf.get("tests", {})
+    return limits
+
+def test_limits(limits: dict, name: str) -> dict:
+    ret = {key: limits.get(key, value) for key, value in LIMITS.items()}
+    ret.update(limits.get("tests", {}).get(name, {}))
+    return ret
+
+def set_limits(limits: dict, cpu: Optional[int] = None):
+    """Applies the limits to the current process, a limit set to null is skipped.
+
+    Runs in the forked child (preexec_fn), so the limits are in place before
+    the first instruction of the program.
+    """
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    if limits["time_limit"] is not None:
+        cpu_time = math.ceil(limits["time_limit"])
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time + 1))
+    if limits["memory_limit"] is not None:
+        #address space is always larger than rss, the exact check is done on ru_maxrss
+        memory = limits["memory_limit"] * 1024 * 2
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    if limits["output_limit"] is not None:
+        output = limits["output_limit"] * 1024
+        resource.setrlimit(resource.RLIMIT_FSIZE, (output, output))
@@ -1,37 +1,209 @@
-import subprocess
 import sys
 import os
+import json
 import logging
+import threading
 import time
+import exec
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from manifest import MANIFEST_FILE, Manifest
+from groups import load_groups, score, test_costs
+from timing import TIMING, calibrate, isolated_cpus, scale_limits
 
 logger = logging.getLogger("EXEC")
 
-def run_program(name: str):
+CPUS = sorted(os.sched_getaffinity(0))
+WORKERS = int(os.getenv("WORKERS") or len(CPUS))
+PIN = os.getenv("PIN", "on") == "on"
+FUSED = os.getenv("FUSED") == "on"
+#the judge mode, the fused mode compares lines only
+COMPARE = os.getenv("COMPARE", "lines")
+MANIFEST = os.getenv("MANIFEST") or f"{os.getenv('OUT')}/{MANIFEST_FILE}"
+#json with many submissions run against the same tests in one container
+BATCH = os.getenv("BATCH")
+#off, group (the rest of a failed all-or-nothing group is skipped) or all (everything after the first failure)
+FAIL_FAST = os.getenv("FAIL_FAST", "off")
+#cost (cheapest first) or name
+ORDER = os.getenv("ORDER", "cost")
+#historical runtime of the tests {name: seconds}, the input size is used without it
+COSTS = os.getenv("COSTS") or f"{os.getenv('IN')}/costs.json"
+
+free_cpus: "queue.Queue[int]" = queue.Queue()
+
+class Submission:
+    """One program with its own results, the only one or one of the batch."""
+
+    def __init__(self, submission_id: Optional[str], bin_dir: Optional[str], out_dir: Optional[str], manifest_path: str, tests: int, groups: Optional[List[dict]] = None, calibration: Optional[dict] = None):
+        self.id = submission_id
+        self.bin_dir = bin_dir
+        self.out_dir = out_dir
+        self.tests = tests
+        self.remaining = tests
+        self.groups = groups or []
+        self.calibration = calibration
+        #one failed test makes the rest of an all-or-nothing group worthless
+        self.strict_groups: Dict[str, List[str]] = {}
+        for group in self.groups:
+            if group["scoring"] == "all":
+                for test in group["tests"]:
+                    self.strict_groups.setdefault(test, []).append(group["name"])
+        self.failed_groups = set()
+        self.first_failure: Optional[str] = None
+        self.grades: Dict[str, int] = {}
+        self.skipped = 0
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        #a new run starts a new manifest, the judge appends to it later
+        self.manifest = Manifest(manifest_path, truncate=True)
+        if tests == 0:
+            self.finish()
+
+    def skip_reason(self, name: str) -> Optional[str]:
+        with self.lock:
+            if FAIL_FAST == "all" and self.first_failure is not None:
+                return f"test {self.first_failure} failed"
+            if FAIL_FAST == "group":
+                for group in self.strict_groups.get(name, []):
+                    if group in self.failed_groups:
+                        return f"group {group} failed"
+        return None
+
+    def test_result(self, name: str, verdict: str):
+        with self.lock:
+            #final in the fused mode only, otherwise the judge can still find a wrong answer
+            self.grades[name] = 1 if verdict == "OK" else 0
+            if verdict == "SKIP":
+                self.skipped += 1
+            elif verdict != "OK":
+                self.first_failure = self.first_failure or name
+                self.failed_groups.update(self.strict_groups.get(name, []))
+
+    def test_done(self):
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining > 0:
+                return
+        self.finish()
+
+    def finish(self):
+        end = {"stage": "exec_end", "tests": self.tests, "skipped": self.skipped, "start": round(self.start_time, 6), "time": round(time.time() - self.start_time, 6)}
+        if self.groups:
+            #the judge stage has no config, it scores the groups from here
+            end["groups"] = self.groups
+        if self.calibration is not None:
+            end["calibration"] = self.calibration
+        self.manifest.append(end)
+        if FUSED:
+            #there is no judge stage in the fused mode
+            points, groups = score(self.grades, self.groups)
+            judge_end = {"stage": "judge_end", "points": points, "tests": self.tests}
+            if self.groups:
+                judge_end["groups"] = groups
+            self.manifest.append(judge_end)
+        self.manifest.close()
+
+def load_batch(path: str) -> List[dict]:
+    """Submissions of the batch file, bin and out default to BIN/{id} and OUT/{id}."""
+    with open(path, "r") as batch_file:
+        submissions = json.load(batch_file)["submissions"]
+    for submission in submissions:
+        submission.setdefault("bin", f"{os.getenv('BIN')}/{submission['id']}")
+        submission.setdefault("out", f"{os.getenv('OUT')}/{submission['id']}")
+        os.makedirs(submission["out"], exist_ok=True)
+    return submissions
+
+def run_program(name: str, limits: dict, submission: Submission, submitted: Optional[float] = None, timing_cpus: Optional["queue.Queue[int]"] = None):
     start_time2 = time.time()
-    program_process = subprocess.Popen(["python", "exec.py", name])
-    program_process.wait()
-    logger.info(f"test {name:>3} real time:  {round(time.time() - start_time2, 2):.2f}")
+    cpu = free_cpus.get() if PIN else None
+    try:
+        #checked as late as possible, the tests that ran meanwhile may have failed
+        reason = submission.skip_reason(name)
+        if reason is not None:
+            meta = exec.skip(name, reason, FUSED, submission.manifest, submission.out_dir)
+        else:
+            meta = exec.run(name, limits, cpu, FUSED, submission.manifest, submitted, submission.bin_dir, submission.out_dir, timing_cpus)
+        submission.test_result(name, meta["verdict"])
+    finally:
+        if cpu is not None:
+            free_cpus.put(cpu)
+        submission.test_done()
+    logger.info(f"test {name:>3} real time:  {round(time.time() - start_time2, 2):.2f} cpu: {cpu}" + (f" submission: {submission.id}" if submission.id else ""))
 
 def main():
     os.umask(0)
     start_time = time.time()
-    
+
     #logging
     logging.basicConfig(
         level=logging.DEBUG if os.environ.get("LOGS")=="on" else logging.ERROR,
         format="[%(name)s] %(levelname)s %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)] 
+        handlers=[logging.StreamHandler(sys.stdout)]
     )
-    
+
+    if FUSED and COMPARE != "lines":
+        #a verdict different from the judge stage is worse than no verdict
+        sys.exit(f"FUSED compares lines only, COMPARE={COMPARE} needs the judge stage")
+
     #running
-    
-    for file in os.listdir(os.getenv('IN')):
-        if file.endswith('.in'):
-            run_program(file.split('.')[0])
-    
+
+    limits = exec.load_limits()
+    calibration = None
+    cpus = CPUS
+    #isolated cores for the repeated runs of TIMING=precise
+    timing_cpus = None
+    if TIMING == "precise":
+        isolated = isolated_cpus(CPUS) if PIN else []
+        if isolated and len(isolated) < len(CPUS):
+            #the regular tests never run on the cores of the measurements
+            cpus = [cpu for cpu in CPUS if cpu not in isolated]
+            timing_cpus = queue.Queue()
+            for cpu in isolated:
+                timing_cpus.put(cpu)
+        calibration = calibrate(isolated[0] if isolated else cpus[0])
+        limits = scale_limits(limits, calibration["scale"])
+        logger.info(f"precise timing, calibration: {calibration}, isolated cpus: {isolated}")
+    for cpu in cpus:
+        free_cpus.put(cpu)
+
+    groups = load_groups()
+
+    names = [file.split('.')[0] for file in os.listdir(os.getenv('IN')) if file.endswith('.in')]
+    if ORDER == "cost":
+        costs = None
+        if os.path.isfile(COSTS):
+            with open(COSTS, "r") as costs_file:
+                costs = json.load(costs_file)
+        costs = test_costs(names, os.getenv('IN'), costs)
+        #the cheapest first, most wrong submissions fail on small tests before the big ones run
+        names.sort(key=lambda name: (costs[name], len(name), name))
+    else:
+        names.sort(key=lambda name: (len(name), name))
+    #the tests are staged once for the whole batch, the submissions share the runners
+    if BATCH:
+        submissions = [Submission(entry["id"], entry["bin"], entry["out"], f"{entry['out']}/{MANIFEST_FILE}", len(names), groups, calibration) for entry in load_batch(BATCH)]
+    else:
+        submissions = [Submission(None, None, None, MANIFEST, len(names), groups, calibration)]
+
+    failed = False
+    with ThreadPoolExecutor(max_workers=max(1, WORKERS)) as pool:
+        #one submission after another, a runner thread starts a new python fork server only when it moves on to the next one
+        futures = [pool.submit(run_program, name, limits, submission, time.time(), timing_cpus) for submission in submissions for name in names]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                #one broken submission does not stop the rest of the batch
+                logger.exception("test failed")
+                failed = True
+    exec.close_fork_servers()
+
     # subprocess.run(f"cp /tmp/out/* {os.getenv('OUT')}", shell=True)
-    
-    logger.info(f"exec.py execution time: {round(time.time() - start_time, 2)}")
+
+    logger.info(f"exec.py execution time: {round(time.time() - start_time, 2)} workers: {WORKERS} submissions: {len(submissions)} fork servers: {len(exec.fork_server_starts)}")
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
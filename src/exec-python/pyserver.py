@@ -0,0 +1,118 @@
+import sys
+
+#modules of a fresh interpreter, everything imported later is dropped in the children
+BASELINE = set(sys.modules)
+
+import importlib
+import json
+import mmap
+import os
+import runpy
+import socket
+import traceback
+import zipimport
+from types import CodeType
+
+#started with python -I, the directory of the exec stage is on sys.path only for this import
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from limits import set_limits
+del sys.path[0]
+
+#The fork server process of forkserver.ForkServer, one per runner thread and
+#program. It is started isolated (python -I) and forks a child per test. The
+#child drops every module the server imported, so the modules of the
+#submission (e.g. its own limits.py or json.py) are imported from program.pyz
+#as in a fresh interpreter.
+
+MESSAGE_SIZE = 1 << 16
+
+def relocate(code: CodeType, filename: str) -> CodeType:
+    consts = tuple(relocate(const, filename) if isinstance(const, CodeType) else const for const in code.co_consts)
+    return code.replace(co_filename=filename, co_consts=consts)
+
+class ZipApp(zipimport.zipimporter):
+    """Imports from program.pyz with __file__ and the tracebacks pointing at the sources in it.
+
+    The compiler stores the bytecode with the bare file name (main.py), which
+    a traceback would otherwise resolve against the working directory.
+    """
+
+    def get_filename(self, fullname: str) -> str:
+        path = super().get_filename(fullname)
+        return path[:-1] if path.endswith(".pyc") else path
+
+    def get_code(self, fullname: str) -> CodeType:
+        return relocate(super().get_code(fullname), self.get_filename(fullname))
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        exec(self.get_code(module.__spec__.name), module.__dict__)
+
+def isolate(importer: ZipApp):
+    for name in list(sys.modules):
+        if name not in BASELINE:
+            del sys.modules[name]
+    sys.path_importer_cache.clear()
+    importlib.invalidate_caches()
+    sys.path_importer_cache[importer.archive] = importer
+
+def run_child(importer: ZipApp, fds: list, request: dict, memory_error: mmap.mmap):
+    code = 1
+    try:
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        for fd in fds:
+            if fd > 2:
+                os.close(fd)
+        set_limits(request["limits"], request["cpu"])
+        isolate(importer)
+        sys.argv = [importer.archive]
+        runpy.run_path(importer.archive, run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+    except BaseException as e:
+        #an allocation over the address space limit (RLIMIT_AS), the verdict is MLE and not RE
+        memory_error[0] = isinstance(e, MemoryError)
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+        except Exception:
+            code = code or 1
+        try:
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+def serve(program: str, server_socket: socket.socket):
+    #the directory of the archive is read once, the children reuse it
+    importer = ZipApp(program)
+    #shared with the children, set by a child that ended with a MemoryError
+    memory_error = mmap.mmap(-1, 1)
+    while True:
+        message, fds, _, _ = socket.recv_fds(server_socket, MESSAGE_SIZE, 3)
+        if not message:
+            break
+        request = json.loads(message)
+        memory_error[0] = 0
+        pid = os.fork()
+        if pid == 0:
+            server_socket.close()
+            run_child(importer, fds, request, memory_error)
+        for fd in fds:
+            os.close(fd)
+        server_socket.send(json.dumps({"pid": pid}).encode())
+
+        if not server_socket.recv(MESSAGE_SIZE):
+            break
+        _, status, resources = os.wait4(pid, 0)
+        server_socket.send(json.dumps({"status": status, "user_time": resources.ru_utime, "memory": resources.ru_maxrss, "memory_error": memory_error[0] == 1}).encode())
+
+if __name__ == "__main__":
+    serve(os.path.abspath(sys.argv[1]), socket.socket(fileno=int(sys.argv[2])))
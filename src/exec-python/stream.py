@@ -0,0 +1,130 @@
+import json
+import time
+from typing import Optional, Tuple
+
+#same messages as check_exec in the judge image, the fused mode has to produce the same judge.json
+EXEC_INFO = {
+    "TLE": "time limit exceeded: {user_time}s",
+    "MLE": "memory limit exceeded: {memory}kb",
+    "OLE": "output limit exceeded",
+    "RE": "program exited with return code {return_code}",
+}
+
+MAX_INFO = 64
+
+def shorten(item: Optional[bytes]) -> str:
+    if item is None:
+        return "EOF"
+    text = item.decode(errors="replace")
+    return text if len(text) <= MAX_INFO else text[:MAX_INFO] + "..."
+
+class StreamJudge:
+    """Compares the program output with the answer while the program is running.
+
+    feed() gets the stdout chunks straight from the pipe and returns False on
+    the first wrong line or when the output limit is exceeded, so the caller
+    can kill the program right away.
+    """
+
+    def __init__(self, answer_path: str, output_limit: Optional[int] = None):
+        self.answer = open(answer_path, "rb")
+        self.output_limit = output_limit
+        self.output_size = 0
+        self.buffer = bytearray()
+        self.line_nr = 0
+        self.correct = True
+        self.info = "ok"
+        #first line of the output after the end of the answer
+        self.extra: Optional[Tuple[int, bytes]] = None
+        #time spent comparing, the time of the judge record
+        self.time = 0.0
+
+    def close(self):
+        self.answer.close()
+
+    def output_limit_exceeded(self) -> bool:
+        return self.output_limit is not None and self.output_size > self.output_limit
+
+    def mismatch(self, line_nr: int, expected: Optional[bytes], got: Optional[bytes]):
+        #same message as comparator.describe in the judge image
+        column = 1
+        if expected is not None and got is not None:
+            column += next((i for i, (x, y) in enumerate(zip(expected, got)) if x != y), min(len(expected), len(got)))
+        self.correct = False
+        self.info = f"line {line_nr} column {column} is not correct: expected {shorten(expected)} but got {shorten(got)}"
+
+    def compare_line(self, output_line: bytes) -> bool:
+        self.line_nr += 1
+        got = output_line.strip()
+        answer_line = self.answer.readline()
+        if not answer_line:
+            #empty lines after the answer are allowed only at the end of the output
+            if self.extra is None:
+                self.extra = (self.line_nr, got)
+            if got:
+                self.mismatch(self.extra[0], None, self.extra[1])
+            return self.correct
+        expected = answer_line.strip()
+        if expected != got:
+            self.mismatch(self.line_nr, expected, got)
+        return self.correct
+
+    def feed(self, data: bytes) -> bool:
+        start_time = time.perf_counter()
+        try:
+            return self.feed_lines(data)
+        finally:
+            self.time += time.perf_counter() - start_time
+
+    def feed_lines(self, data: bytes) -> bool:
+        self.output_size += len(data)
+        if self.output_limit_exceeded():
+            return False
+        self.buffer += data
+        end = self.buffer.rfind(b"\n")
+        if end < 0:
+            return True
+        lines = self.buffer[:end].split(b"\n")
+        del self.buffer[:end + 1]
+        for output_line in lines:
+            if not self.compare_line(bytes(output_line)):
+                return False
+        return True
+
+    def finish(self) -> Tuple[bool, str]:
+        start_time = time.perf_counter()
+        try:
+            return self.finish_lines()
+        finally:
+            self.time += time.perf_counter() - start_time
+
+    def finish_lines(self) -> Tuple[bool, str]:
+        if self.correct and self.buffer:
+            self.compare_line(bytes(self.buffer))
+        if self.correct and self.extra is None:
+            #the rest of the answer has to be empty
+            first = None
+            line_nr = self.line_nr
+            for answer_line in self.answer:
+                line_nr += 1
+                if first is None:
+                    first = (line_nr, answer_line.strip())
+                if answer_line.strip():
+                    self.mismatch(first[0], first[1], None)
+                    break
+        return self.correct, self.info
+
+def write_judge(judge_path: Optional[str], meta: dict, stream_judge: StreamJudge) -> dict:
+    if meta["verdict"] in EXEC_INFO:
+        is_correct, info = False, EXEC_INFO[meta["verdict"]].format(**meta)
+    else:
+        is_correct, info = stream_judge.finish()
+
+    output = {}
+    output["grade"] = 1 if is_correct else 0
+    output["info"] = info
+    if judge_path is not None:
+        with open(judge_path, "w") as judge_file:
+            json.dump(output, judge_file)
+    #in the manifest only, like the span of the judge stage
+    return {**output, "time": round(stream_judge.time, 6), "output_bytes": stream_judge.output_size}
@@ -0,0 +1,94 @@
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Optional
+
+#Low-noise timing for borderline tests. With TIMING=precise a test whose first
+#run ends within BORDERLINE of the time limit is run again REPEATS times after
+#WARMUP runs, and the median user_time decides the verdict. The time limits are
+#scaled by the speed of this machine against a reference workload, measured at
+#the start of the stage.
+
+TIMING = os.getenv("TIMING", "normal")
+REPEATS = int(os.getenv("REPEATS") or 5)
+WARMUP = int(os.getenv("WARMUP") or 1)
+#relative distance to the time limit
+BORDERLINE = float(os.getenv("BORDERLINE") or 0.2)
+#user_time of the reference workload on the machine the limits were set on
+CALIBRATION_BASE = float(os.getenv("CALIBRATION_BASE")) if os.getenv("CALIBRATION_BASE") else None
+#set instead of calibrating, e.g. measured once for the whole worker
+TIME_SCALE = float(os.getenv("TIME_SCALE")) if os.getenv("TIME_SCALE") else None
+#cores kept free of regular tests for the repeated runs, by default the isolcpus of the kernel
+ISOLATED_PATH = "/sys/devices/system/cpu/isolated"
+
+REFERENCE = "x = 0\nfor i in range(1000000):\n    x = (x * 31 + i) % 1000003\n"
+
+def parse_cpus(text: str) -> List[int]:
+    """A cpu list like 2,4-6."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        low, _, high = part.partition("-")
+        cpus += range(int(low), int(high or low) + 1)
+    return cpus
+
+def isolated_cpus(cpus: List[int]) -> List[int]:
+    if os.getenv("TIMING_CPUS"):
+        isolated = parse_cpus(os.getenv("TIMING_CPUS"))
+    else:
+        try:
+            with open(ISOLATED_PATH, "r") as isolated_file:
+                isolated = parse_cpus(isolated_file.read())
+        except OSError:
+            isolated = []
+    return [cpu for cpu in cpus if cpu in isolated]
+
+def reference_time(cpu: Optional[int] = None, runs: int = 3) -> float:
+    """Median user_time of the reference workload, after one warm-up run."""
+    times = []
+    for i in range(runs + 1):
+        process = subprocess.Popen([sys.executable, "-S", "-c", REFERENCE], preexec_fn=(lambda: os.sched_setaffinity(0, {cpu})) if cpu is not None else None)
+        _, _, resources = os.wait4(process.pid, 0)
+        process.returncode = 0
+        if i > 0:
+            times.append(resources.ru_utime)
+    return statistics.median(times)
+
+def calibrate(cpu: Optional[int] = None) -> dict:
+    """Scale of the time limits on this machine, 1 without CALIBRATION_BASE."""
+    if TIME_SCALE is not None:
+        return {"scale": TIME_SCALE}
+    reference = reference_time(cpu)
+    scale = reference / CALIBRATION_BASE if CALIBRATION_BASE else 1.0
+    return {"reference_time": round(reference, 6), "scale": round(scale, 6)}
+
+def scale_limits(limits: dict, scale: float) -> dict:
+    """Time limits of the config and of the per-test overrides multiplied by scale."""
+    def scaled(values: dict) -> dict:
+        return {key: value * scale if key in ["time_limit", "wall_time_limit"] and value is not None else value for key, value in values.items()}
+    ret = scaled({key: value for key, value in limits.items() if key != "tests"})
+    ret["tests"] = {name: scaled(values) for name, values in limits.get("tests", {}).items()}
+    return ret
+
+def relaxed(limits: dict) -> dict:
+    """Limits of a precise run, a borderline program is not killed before it is measured."""
+    ret = dict(limits)
+    for key in ["time_limit", "wall_time_limit"]:
+        if ret[key] is not None:
+            ret[key] = ret[key] * (1 + BORDERLINE)
+    return ret
+
+def borderline(user_time: float, limits: dict) -> bool:
+    return limits["time_limit"] is not None and abs(user_time - limits["time_limit"]) <= limits["time_limit"] * BORDERLINE
+
+def summary(times: List[float], first: float) -> dict:
+    return {
+        "first": first,
+        "runs": [round(t, 6) for t in times],
+        "warmup": WARMUP,
+        "median": round(statistics.median(times), 6),
+        "spread": round(max(times) - min(times), 6),
+        "stdev": round(statistics.stdev(times), 6) if len(times) > 1 else 0.0,
+    }
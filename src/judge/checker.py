@@ -0,0 +1,97 @@
+import os
+import select
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+#Checker of the problem (answers with many correct forms), compiled once by the
+#worker and started once per judge process. It reads requests from stdin, three
+#lines each (the paths may contain spaces), and answers each with one line on stdout:
+#  request:  {input path}\n{answer path}\n{output path}\n
+#  response: OK [info] or WA [info]
+#The checker ends at the end of stdin.
+
+CHECKER = os.getenv("CHECKER")
+TIMEOUT = float(os.getenv("CHECKER_TIMEOUT") or 10)
+MAX_RESPONSE = 1 << 16
+
+class CheckerError(Exception):
+    pass
+
+def checker_command(checker_dir: str) -> List[str]:
+    """program.pyz from the python compiler or program from the cpp compiler."""
+    if os.path.exists(f"{checker_dir}/program.pyz"):
+        return [sys.executable, f"{checker_dir}/program.pyz"]
+    return [f"{checker_dir}/program"]
+
+class Checker:
+    """One long-lived checker process, restarted once if it dies."""
+
+    def __init__(self, checker_dir: str, timeout: float = TIMEOUT):
+        self.command = checker_command(checker_dir)
+        self.timeout = timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.rest = b""
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self.rest = b""
+
+    def request(self, line: bytes) -> str:
+        self.process.stdin.write(line)
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self.rest:
+            ready, _, _ = select.select([fd], [], [], self.timeout)
+            if not ready:
+                raise CheckerError(f"no response in {self.timeout}s")
+            data = os.read(fd, 4096)
+            if not data or len(self.rest) > MAX_RESPONSE:
+                raise CheckerError("checker exited" if not data else "response too long")
+            self.rest += data
+        response, self.rest = self.rest.split(b"\n", 1)
+        return response.decode(errors="replace").strip()
+
+    def check(self, input_path: str, answer_path: str, output_path: str) -> Tuple[bool, str]:
+        line = f"{input_path}\n{answer_path}\n{output_path}\n".encode()
+        for attempt in range(2):
+            if self.process is None or self.process.poll() is not None:
+                self.start()
+            try:
+                response = self.request(line)
+                break
+            except (OSError, CheckerError) as e:
+                self.close()
+                if attempt == 1:
+                    raise CheckerError(f"checker failed: {e}")
+        verdict, _, info = response.partition(" ")
+        if verdict == "OK":
+            return True, info or "ok"
+        if verdict == "WA":
+            return False, info or "wrong answer"
+        raise CheckerError(f"unknown checker response: {response[:64]}")
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+#one checker process in every judge process
+checker: Optional[Checker] = None
+
+def get_checker() -> Checker:
+    global checker
+    if checker is None:
+        checker = Checker(CHECKER)
+    return checker
+
+def close_checker():
+    global checker
+    if checker is not None:
+        checker.close()
+        checker = None
@@ -0,0 +1,278 @@
+import itertools
+import mmap
+import re
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 1 << 22
+FIRST_CHUNK_SIZE = 1 << 16
+MAX_INFO = 64
+MODES = ("exact", "lines", "tokens", "float")
+
+#whitespace stripped from the lines as by bytes.strip, apart from the newline
+BLANKS = b" \t\r\v\f"
+#maps the blanks to spaces, only to find them next to a newline
+BLANKS_TO_SPACES = bytes.maketrans(BLANKS, b" " * len(BLANKS))
+#maps all whitespace to spaces, the separator of the tokens
+WHITESPACE_TO_SPACES = bytes.maketrans(BLANKS + b"\n", b" " * (len(BLANKS) + 1))
+
+@contextmanager
+def open_buffer(path: str):
+    """Maps the file into memory, an empty file gives an empty buffer (mmap does not allow it)."""
+    with open(path, "rb") as file:
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+
+def shorten(item: bytes) -> str:
+    text = item.decode(errors="replace")
+    return text if len(text) <= MAX_INFO else text[:MAX_INFO] + "..."
+
+def equal_bytes(answer, output) -> bool:
+    if len(answer) != len(output):
+        return False
+    for start in range(0, len(answer), CHUNK_SIZE):
+        if answer[start:start + CHUNK_SIZE] != output[start:start + CHUNK_SIZE]:
+            return False
+    return True
+
+def first_difference(answer, output, chunk_size: int = CHUNK_SIZE) -> int:
+    for start in range(0, max(len(answer), len(output)), chunk_size):
+        a = answer[start:start + chunk_size]
+        b = output[start:start + chunk_size]
+        if a != b:
+            if chunk_size > 4096:
+                return start + first_difference(a, b, 4096)
+            return start + next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+    return -1
+
+def position(buffer, offset: int) -> Tuple[int, int]:
+    """Line and column (counted from 1) of the byte offset."""
+    lines = 0
+    for start in range(0, offset, CHUNK_SIZE):
+        lines += buffer[start:min(start + CHUNK_SIZE, offset)].count(b"\n")
+    line_start = buffer.rfind(b"\n", 0, offset) + 1
+    return lines + 1, offset - line_start + 1
+
+def normalized(buffer, normalize: Callable[[bytes], bytes], cut: Callable[[bytes], int], separator: bytes) -> Iterator[bytes]:
+    """Normalizes the buffer chunk by chunk, cut gives the last separator of a chunk.
+
+    Every normalized chunk is whole items, each followed by the separator, so
+    two outputs with the same items give the same bytes.
+    """
+    rest = b""
+    start = 0
+    #small chunks first, a wrong answer is usually found early
+    size = min(FIRST_CHUNK_SIZE, CHUNK_SIZE)
+    while start < len(buffer):
+        chunk = rest + buffer[start:start + size]
+        start += size
+        size = min(size * 2, CHUNK_SIZE)
+        end = cut(chunk)
+        if end < 0:
+            rest = chunk
+            continue
+        rest = chunk[end + 1:]
+        yield normalize(chunk[:end + 1])
+    if rest:
+        yield normalize(rest + separator)
+
+def strip_lines(chunk: bytes) -> bytes:
+    """Strips the lines of the chunk, most outputs need a replace (a trailing space, CRLF) or nothing."""
+    if b"\r" in chunk:
+        chunk = chunk.replace(b"\r\n", b"\n")
+    stripped = chunk.replace(b" \n", b"\n")
+    if any(blank in stripped for blank in BLANKS[1:]):
+        blanks = stripped.translate(BLANKS_TO_SPACES)
+        dirty = blanks[:1] == b" " or b" \n" in blanks or b"\n " in blanks
+    else:
+        #spaces only, no translated copy is needed
+        dirty = stripped[:1] == b" " or b"\n " in stripped or (len(stripped) < len(chunk) and b" \n" in stripped)
+    if dirty:
+        return b"\n".join(map(bytes.strip, stripped.split(b"\n")))
+    return stripped
+
+def lines(buffer) -> Iterator[bytes]:
+    return normalized(buffer, strip_lines, lambda chunk: chunk.rfind(b"\n"), b"\n")
+
+def last_whitespace(chunk: bytes) -> int:
+    return max(chunk.rfind(c) for c in (b" ", b"\n", b"\t", b"\r", b"\v", b"\f"))
+
+def join_tokens(chunk: bytes) -> bytes:
+    """The tokens of the chunk, each followed by one space."""
+    chunk = chunk.translate(WHITESPACE_TO_SPACES)
+    while b"  " in chunk:
+        chunk = chunk.replace(b"  ", b" ")
+    return chunk.lstrip(b" ")
+
+def tokens(buffer) -> Iterator[bytes]:
+    return normalized(buffer, join_tokens, last_whitespace, b" ")
+
+def equal_floats(eps: float) -> Callable[[bytes, bytes], bool]:
+    def equal(answer: bytes, output: bytes) -> bool:
+        try:
+            a, b = float(answer), float(output)
+        except ValueError:
+            return False
+        return abs(a - b) <= eps * max(1.0, abs(a))
+    return equal
+
+def first_extra(rest: Iterator[bytes]) -> Optional[bytes]:
+    """The first item of rest, None if rest is empty items only (empty lines at the end of the file are not checked).
+
+    Only as many items as needed are read, the rest of a huge output is not kept in memory.
+    """
+    first = next(rest, None)
+    if first is None or not (first or any(rest)):
+        return None
+    return first
+
+def compare_items(answer: Iterator[List[bytes]], output: Iterator[List[bytes]], equal: Optional[Callable[[bytes, bytes], bool]] = None) -> Optional[Tuple[int, Optional[bytes], Optional[bytes]]]:
+    """Returns (index, expected, got) of the first differing item, None is used for a missing item."""
+    a: List[bytes] = []
+    b: List[bytes] = []
+    base = 0
+    while True:
+        if len(a) <= len(b):
+            batch = next(answer, None)
+            if batch is None:
+                answer_ended = True
+                break
+            a.extend(batch)
+        else:
+            batch = next(output, None)
+            if batch is None:
+                answer_ended = False
+                break
+            b.extend(batch)
+        n = min(len(a), len(b))
+        if a[:n] != b[:n]:
+            for i in range(n):
+                if a[i] != b[i] and (equal is None or not equal(a[i], b[i])):
+                    return base + i, a[i], b[i]
+        del a[:n], b[:n]
+        base += n
+    #the ended side has nothing left, the other one has the rest of its list and of its iterator
+    if answer_ended:
+        got = first_extra(itertools.chain(b, (item for batch in output for item in batch)))
+        return None if got is None else (base, None, got)
+    expected = first_extra(itertools.chain(a, (item for batch in answer for item in batch)))
+    return None if expected is None else (base, expected, None)
+
+def split_items(pending: bytes, chunks: Iterator[bytes], separator: bytes) -> Iterator[List[bytes]]:
+    yield pending.split(separator)[:-1]
+    for chunk in chunks:
+        yield chunk.split(separator)[:-1]
+
+def extra_item(pending: bytes, chunks: Iterator[bytes], separator: bytes) -> Optional[bytes]:
+    """The first item left on the longer side, None if there are empty items only, as first_extra."""
+    while not pending:
+        pending = next(chunks, None)
+        if pending is None:
+            return None
+    first = pending[:pending.index(separator)]
+    if first or pending.strip(separator) or any(chunk.strip(separator) for chunk in chunks):
+        return first
+    return None
+
+def compare_normalized(answer: Iterator[bytes], output: Iterator[bytes], separator: bytes, equal: Optional[Callable[[bytes, bytes], bool]] = None) -> Optional[Tuple[int, Optional[bytes], Optional[bytes]]]:
+    """compare_items for the normalized chunks, which are compared as they are.
+
+    The items are only looked for around the first difference. With equal the
+    different items may still be equal, the rest is compared item by item.
+    """
+    a = b = b""
+    base = 0
+    while True:
+        if len(a) <= len(b):
+            chunk = next(answer, None)
+            if chunk is None:
+                got = extra_item(b, output, separator)
+                return None if got is None else (base, None, got)
+            a += chunk
+        else:
+            chunk = next(output, None)
+            if chunk is None:
+                expected = extra_item(a, answer, separator)
+                return None if expected is None else (base, expected, None)
+            b += chunk
+        n = min(len(a), len(b))
+        #one of them is n bytes long, its slice is not a copy
+        if a[:n] != b[:n]:
+            offset = first_difference(a[:n], b[:n])
+            start = a.rfind(separator, 0, offset) + 1
+            index = base + a.count(separator, 0, start)
+            expected, got = a[start:a.index(separator, offset)], b[start:b.index(separator, offset)]
+            if equal is None or not equal(expected, got):
+                return index, expected, got
+            #equal numbers written differently, the items do not line up as bytes any more
+            difference = compare_items(split_items(a[start:], answer, separator), split_items(b[start:], output, separator), equal)
+            return None if difference is None else (index + difference[0], difference[1], difference[2])
+        #the shorter side ends with a separator, both are left at the start of an item
+        base += a.count(separator, 0, n)
+        a, b = a[n:], b[n:]
+
+def token_position(buffer, index: int) -> Tuple[int, int]:
+    """Line and column of the token, the chunks before it are only counted."""
+    start = 0
+    while start < len(buffer):
+        end = min(start + CHUNK_SIZE, len(buffer))
+        if end < len(buffer):
+            cut = last_whitespace(buffer[start:end])
+            end = start + cut + 1 if cut >= 0 else len(buffer)
+        chunk = buffer[start:end]
+        #the tokens before it are skipped in one match
+        skipped = re.match(rb"\s*+(?:\S++\s++){%d}" % index, chunk)
+        if skipped is not None and skipped.end() < len(chunk):
+            return position(buffer, start + skipped.end())
+        index -= join_tokens(chunk + b" ").count(b" ")
+        start = end
+    return position(buffer, len(buffer))
+
+def describe(line: int, column: int, expected: Optional[bytes], got: Optional[bytes]) -> str:
+    expected_info = "EOF" if expected is None else shorten(expected)
+    got_info = "EOF" if got is None else shorten(got)
+    return f"line {line} column {column} is not correct: expected {expected_info} but got {got_info}"
+
+def compare(answer_path: str, output_path: str, mode: str = "lines", eps: float = 1e-6) -> Tuple[bool, str]:
+    """Compares the output with the answer.
+
+    exact - byte for byte, lines - line by line ignoring leading and trailing
+    whitespace, tokens - whitespace insensitive, float - as tokens but numbers
+    are equal within eps (absolute or relative).
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown compare mode: {mode}")
+    with open_buffer(answer_path) as answer, open_buffer(output_path) as output:
+        #fast path, most of the correct outputs are identical
+        if equal_bytes(answer, output):
+            return True, "ok"
+
+        if mode == "exact":
+            offset = first_difference(answer, output)
+            line, column = position(output, offset)
+            expected = answer[offset:offset + 1] if offset < len(answer) else None
+            got = output[offset:offset + 1] if offset < len(output) else None
+            return False, describe(line, column, expected, got)
+
+        if mode == "lines":
+            difference = compare_normalized(lines(answer), lines(output), b"\n")
+            if difference is None:
+                return True, "ok"
+            index, expected, got = difference
+            column = first_difference(expected or b"", got or b"") + 1
+            return False, describe(index + 1, max(column, 1), expected, got)
+
+        equal = equal_floats(eps) if mode == "float" else None
+        difference = compare_normalized(tokens(answer), tokens(output), b" ", equal)
+        if difference is None:
+            return True, "ok"
+        index, expected, got = difference
+        line, column = token_position(output, index)
+        return False, describe(line, column, expected, got)
@@ -1,33 +1,39 @@
 import json
 import os
-from typing import Tuple
+from typing import Optional, Tuple
+import comparator
+import checker
+from groups import SKIPPED
 
-def check_answer(answer_path: str, input_path: str) -> Tuple[bool, str]:
-    info = "ok"
-    line_nr = 0
-    with open(answer_path, "r") as answer, open(input_path, "r") as input:
-        for line in answer:
-            line_nr += 1
-            try:
-                output_line = input.readline()
-            except EOFError:
-                info = f"unexpected EOF in line {line_nr}"
-                return (False, info)
-            if line.strip() != output_line.strip():
-                info = f"line {line_nr} is not correct: expected {line.strip()} but got {output_line.strip()}"
-                return (False, info)
-        #probably the output can be longer than the answer but its only example 
-    return (True, info)
+MODE = os.getenv("COMPARE", "lines")
+EPS = float(os.getenv("EPS", "1e-6"))
+JSON_FILES = os.getenv("JSON_FILES", "on") == "on"
 
-def check_exec(exec_path: str) -> Tuple[bool, str]:
-    with open(exec_path, "r") as exec_file:
-        exec = json.load(exec_file)
-        if exec["return_code"] != 0:
-            return False, f"program exited with return code {exec['return_code']}"
-        # if exec["user_time"] > 2:
-        #     return False, f"program took too long: {exec['user_time']}s"
-        # if exec["memory"] > 1000000:
-        #     return False, f"program used too much memory: {exec['memory']}kb" 
+def check_answer(answer_path: str, input_path: str, test_path: Optional[str] = None) -> Tuple[bool, str]:
+    """input_path is the output of the program, test_path the input of the test (for the checker)."""
+    if checker.CHECKER:
+        try:
+            return checker.get_checker().check(test_path, answer_path, input_path)
+        except checker.CheckerError as e:
+            return False, f"checker error: {e}"
+    return comparator.compare(answer_path, input_path, MODE, EPS)
+
+def check_exec(exec_path: str, exec: Optional[dict] = None) -> Tuple[bool, str]:
+    """Checks the exec record from the manifest, or {name}.exec.json if there is none."""
+    if exec is None:
+        with open(exec_path, "r") as exec_file:
+            exec = json.load(exec_file)
+    verdict = exec.get("verdict") or ("OK" if exec["return_code"] == 0 else "RE")
+    if verdict == "SKIP":
+        return False, SKIPPED
+    if verdict == "TLE":
+        return False, f"time limit exceeded: {exec['user_time']}s"
+    if verdict == "MLE":
+        return False, f"memory limit exceeded: {exec['memory']}kb"
+    if verdict == "OLE":
+        return False, "output limit exceeded"
+    if verdict != "OK":
+        return False, f"program exited with return code {exec['return_code']}"
     return True, "ok"
 
 def check_comp(comp_path: str) -> Tuple[bool, str]:
@@ -40,21 +46,26 @@ def check_comp(comp_path: str) -> Tuple[bool, str]:
         pass
     return True, "ok"
 
-def check(name: str):          
+def check(name: str, exec: Optional[dict] = None) -> dict:
     answer_path = os.getenv('ANS')+f"/{name}.out"
     input_path = os.getenv('IN')+f"/{name}.stdout.out"
     comp_path = os.getenv('OUT')+f"/comp.json"
     exec_path = os.getenv('OUT')+f"/{name}.exec.json"
+    test_path = f"{os.getenv('TESTS')}/{name}.in"
 
     output = {}
     is_correct, info = check_comp(comp_path)
     if is_correct:
-        is_correct, info = check_exec(exec_path)
+        is_correct, info = check_exec(exec_path, exec)
     if is_correct:
-        is_correct, info = check_answer(answer_path, input_path)
+        is_correct, info = check_answer(answer_path, input_path, test_path)
     
     output["grade"] = 1 if is_correct else 0
     output["info"] = info
-    with open(f"{os.getenv('OUT')}/{name}.judge.json", "w") as judge_file:
-        json.dump(output, judge_file)
+    if info == SKIPPED:
+        output["skipped"] = True
+    if JSON_FILES:
+        with open(f"{os.getenv('OUT')}/{name}.judge.json", "w") as judge_file:
+            json.dump(output, judge_file)
+    return output
         
\ No newline at end of file
@@ -1,11 +1,100 @@
 import sys
 import os
+import functools
+import json
 import logging
 import time
+from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import util
 import judge
+from checker import close_checker
+from manifest import MANIFEST_FILE, Manifest, load_manifest, read_manifest, test_key
+from groups import score
+from artifacts import prune
 
 logger = logging.getLogger("JUDGE")
 
+#the cores given to the stage (--cpuset-cpus, the affinity set by the worker), not all of the machine
+WORKERS = int(os.getenv("WORKERS") or len(os.sched_getaffinity(0)))
+RESULTS_FILE = "results.json"
+MANIFEST = os.getenv("MANIFEST") or f"{os.getenv('OUT')}/{MANIFEST_FILE}"
+#judging along with a running exec stage, each test as soon as its exec record is appended
+FOLLOW = os.getenv("FOLLOW", "off") == "on"
+FOLLOW_TIMEOUT = float(os.getenv("FOLLOW_TIMEOUT") or 600)
+
+def init_worker():
+    """Closes the checker of a pool worker when the worker exits."""
+    #the workers leave with os._exit, atexit is not run there but the finalizers of multiprocessing are
+    util.Finalize(None, close_checker, exitpriority=10)
+
+def output_size(name: str) -> int:
+    try:
+        return os.path.getsize(f"{os.getenv('IN')}/{name}.stdout.out")
+    except OSError:
+        return 0
+
+def timed_check(name: str, exec: Optional[dict] = None) -> Tuple[dict, dict]:
+    """The judge result and its span for the manifest: start, compare time and compared bytes."""
+    started = time.time()
+    start_time = time.monotonic()
+    output = judge.check(name, exec)
+    span = {"start": round(started, 6), "time": round(time.monotonic() - start_time, 6), "output_bytes": output_size(name), "worker": os.getpid()}
+    #the full outputs of the passed tests are not kept, the stderr of exec is stored already
+    artifacts, pruned = prune(name, os.getenv("IN"), os.getenv("OUT"), output["grade"] == 0)
+    artifacts = {**(exec or {}).get("artifacts", {}), **artifacts}
+    if artifacts:
+        span["artifacts"] = artifacts
+    if pruned:
+        #a later run of the judge keeps this result, the output is gone
+        span["pruned"] = True
+    return output, span
+
+def write_results(results: dict, points: float, groups: Optional[list] = None):
+    tests = []
+    for name in sorted(results, key=test_key):
+        tests.append({"name": name, **results[name]})
+    output = {}
+    output["points"] = points
+    output["tests"] = tests
+    if groups:
+        output["groups"] = groups
+    with open(f"{os.getenv('OUT')}/{RESULTS_FILE}", "w") as results_file:
+        json.dump(output, results_file)
+
+def finish(manifest: Manifest, results: dict, groups: list, start_time: float):
+    """results.json and the judge_end record."""
+    points, group_results = score({name: result["grade"] for name, result in results.items()}, groups)
+    write_results(results, points, group_results)
+    end = {"stage": "judge_end", "points": points, "tests": len(results), "start": round(start_time, 6), "time": round(time.time() - start_time, 6)}
+    if group_results:
+        end["groups"] = group_results
+    manifest.append(end)
+
+def follow(manifest: Manifest, results: dict) -> Optional[list]:
+    """Judges the tests while exec runs, until exec_end. Returns the groups of exec_end, None without it."""
+    groups = None
+    futures = []
+
+    def collect(name: str, future):
+        #in the thread of the pool, the judge record is appended as soon as the test is judged
+        if future.exception() is None:
+            results[name], span = future.result()
+            manifest.append({"stage": "judge", "test": name, **results[name], **span})
+
+    with ProcessPoolExecutor(max_workers=WORKERS, initializer=init_worker) as pool:
+        for record in read_manifest(MANIFEST, until="exec_end", timeout=FOLLOW_TIMEOUT, poll=0.02):
+            if record["stage"] == "exec_end":
+                groups = record.get("groups", [])
+            elif record["stage"] == "exec":
+                exec = {key: value for key, value in record.items() if key not in ["stage", "test"]}
+                futures.append(pool.submit(timed_check, record["test"], exec))
+                futures[-1].add_done_callback(functools.partial(collect, record["test"]))
+    #the errors of the checks
+    for future in futures:
+        future.result()
+    return groups
+
 def main():
     os.umask(0)
     #logging
@@ -17,14 +106,60 @@ def main():
     
     #copying and running
     start_time = time.time()
-    
-    for file in os.listdir(os.getenv('IN')):
-        if file.endswith('.out'):
-            judge.check(file.split('.')[0])
-    
+
+    results = {}
+    manifest = Manifest(MANIFEST)
+    if FOLLOW:
+        try:
+            groups = follow(manifest, results)
+            if groups is None:
+                #the tests without an exec record yet are not judged, the partial results are not the final ones
+                logger.error(f"no exec_end in {MANIFEST} within {FOLLOW_TIMEOUT}s, {len(results)} tests judged")
+                sys.exit(1)
+            finish(manifest, results, groups, start_time)
+        finally:
+            manifest.close()
+        logger.info(f"judge.py execution time: {round(time.time() - start_time, 2)} workers: {WORKERS} follow")
+        return
+
+    #exec records of the manifest, tests without one fall back to {name}.exec.json
+    records = load_manifest(MANIFEST)
+    exec_records = records["exec"]
+    #test groups of the problem config, passed on by exec
+    groups = records.get("exec_end", {}).get("groups", [])
+
+    names = [file.split('.')[0] for file in os.listdir(os.getenv('IN')) if file.endswith('.stdout.out')]
+    #with IO=memfd exec does not save the output of failed runs, they are known from the manifest only
+    names = sorted(set(names) | set(exec_records))
+    #the passed tests of an earlier run keep their result, that run removed their full output
+    pruned = [name for name, record in records["judge"].items() if record.get("pruned") and not os.path.exists(f"{os.getenv('IN')}/{name}.stdout.out")]
+    for name in pruned:
+        results[name] = {key: value for key, value in records["judge"][name].items() if key in ["grade", "info"]}
+    names = [name for name in names if name not in pruned]
+    #the biggest outputs first, so the longest checks do not end up last in the pool
+    names.sort(key=output_size, reverse=True)
+
+    try:
+        if WORKERS > 1 and len(names) > 1:
+            with ProcessPoolExecutor(max_workers=WORKERS, initializer=init_worker) as pool:
+                futures = {pool.submit(timed_check, name, exec_records.get(name)): name for name in names}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    results[name], span = future.result()
+                    manifest.append({"stage": "judge", "test": name, **results[name], **span})
+        else:
+            for name in names:
+                results[name], span = timed_check(name, exec_records.get(name))
+                manifest.append({"stage": "judge", "test": name, **results[name], **span})
+        finish(manifest, results, groups, start_time)
+    finally:
+        #the checker of the serial judging, the pool workers close their own
+        close_checker()
+        manifest.close()
+
     # subprocess.run(f"cp /tmp/out/* {os.getenv('OUT')}", shell=True)
     
-    logger.info(f"judge.py execution time: {round(time.time() - start_time, 2)}")
+    logger.info(f"judge.py execution time: {round(time.time() - start_time, 2)} workers: {WORKERS}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
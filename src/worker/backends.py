@@ -0,0 +1,259 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional, Tuple
+import sandbox
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+#the modules shared by the stages, copied next to main.py in the images
+COMMON_DIR = f"{SRC_DIR}/common"
+
+COMPILERS = {
+    "cpp": "compilers/cpp-compiler",
+    "python": "compilers/python-compiler",
+}
+
+def compiler_dir(language: str) -> str:
+    """The compiler stage directory of the language, the same languages for every backend."""
+    if language not in COMPILERS:
+        raise ValueError(f"unknown language: {language}")
+    return COMPILERS[language]
+
+class DockerBackend:
+    """Runs every stage with docker run, the same way as demo.py."""
+
+    name = "docker"
+
+    def __init__(self, logs: bool = False, cache: Optional[str] = None, images: Optional[Dict[str, str]] = None):
+        self.logs = logs
+        self.cache = cache
+        #comp is the C++ compiler, comp-python is built from compilers/python-compiler (pythonCompiler in CI)
+        self.images = {"comp": "comp", "comp-python": "comp-python", "exec": "exec", "judge": "judge"}
+        self.images.update(images or {})
+        self.images.setdefault("comp-cpp", self.images["comp"])
+
+    def docker_command(self, image: str, env: Dict[str, str], volumes: list, cpus: Optional[List[int]] = None) -> list:
+        command = [
+            "docker", "run",
+            "--rm",
+            "--ulimit", "cpu=30:30",
+            "--network", "none",
+            "--security-opt", "no-new-privileges",
+        ]
+        if cpus:
+            #the stage sees only these cores, exec pins its tests to them
+            command += ["--cpuset-cpus", ",".join(map(str, cpus))]
+        for key, value in env.items():
+            command += ["-e", f"{key}={value}"]
+        for volume in volumes:
+            command += ["-v", volume]
+        return command + [image]
+
+    def startup(self, stage: str = "exec") -> subprocess.CompletedProcess:
+        """Starts the stage image without doing any work, the fixed cost of every stage."""
+        command = self.docker_command(self.images[stage], {}, [])
+        return subprocess.run(command[:-1] + ["--entrypoint", "python3", command[-1], "-c", "import main"], capture_output=True)
+
+    def compile(self, comp_in: str, comp_out: str, language: str = "cpp", cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        compiler_dir(language)
+        image = self.images[f"comp-{language}"]
+        env = {"BIN": "/data/out"}
+        volumes = [
+            f"{comp_in}:/data/in:ro",
+            f"{comp_out}:/data/out",
+        ]
+        if self.cache:
+            env["CACHE"] = "/data/cache"
+            volumes.append(f"{self.cache}:/data/cache")
+        command = self.docker_command(image, env, volumes, cpus)
+        return subprocess.run(command, capture_output=True)
+
+    def execute(self, tests: str, comp_out: str, exec_out: str, env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        volumes = [
+            f"{tests}/in:/data/in:ro",
+            f"{comp_out}:/data/bin:ro",
+            f"{exec_out}:/data/out",
+        ]
+        if (env or {}).get("FUSED") == "on":
+            volumes.append(f"{tests}/out:/data/answer:ro")
+        command = self.docker_command(self.images["exec"], {"LOGS": "on" if self.logs else "off", **(env or {})}, volumes, cpus)
+        return subprocess.run(command, capture_output=True)
+
+    def execute_batch(self, tests: str, submissions: List[Tuple[str, str, str]], env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        """Runs many (id, comp_out, exec_out) submissions against the tests in one container."""
+        volumes = [f"{tests}/in:/data/in:ro"]
+        for submission_id, comp_out, exec_out in submissions:
+            volumes += [f"{comp_out}:/data/bin/{submission_id}:ro", f"{exec_out}:/data/out/{submission_id}"]
+        if (env or {}).get("FUSED") == "on":
+            volumes.append(f"{tests}/out:/data/answer:ro")
+        with tempfile.TemporaryDirectory() as batch_dir:
+            with open(f"{batch_dir}/batch.json", "w") as batch_file:
+                json.dump({"submissions": [{"id": submission_id} for submission_id, _, _ in submissions]}, batch_file)
+            os.chmod(batch_dir, 0o755)
+            volumes.append(f"{batch_dir}:/data/batch:ro")
+            command = self.docker_command(self.images["exec"], {"LOGS": "on" if self.logs else "off", "BATCH": "/data/batch/batch.json", **(env or {})}, volumes, cpus)
+            return subprocess.run(command, capture_output=True)
+
+    def judge(self, tests: str, exec_out: str, env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None, checker: Optional[str] = None) -> subprocess.CompletedProcess:
+        """checker is the compiled checker of the problem (comp-out of its sources), if any."""
+        #not read-only, the judge removes the full outputs of the passed tests
+        volumes = [
+            f"{exec_out}:/data/in",
+            f"{exec_out}:/data/out",
+            f"{tests}/out:/data/answer:ro",
+            f"{tests}/in:/data/tests:ro",
+        ]
+        stage_env = {"LOGS": "on" if self.logs else "off", **(env or {})}
+        if checker:
+            volumes.append(f"{checker}:/data/checker:ro")
+            stage_env["CHECKER"] = "/data/checker"
+        command = self.docker_command(self.images["judge"], stage_env, volumes, cpus)
+        return subprocess.run(command, capture_output=True)
+
+class LocalBackend:
+    """Runs every stage as a local process with the same directory contract, without docker.
+
+    There is no isolation apart from the limits set by the exec stage, use it
+    for development and tests.
+    """
+
+    name = "local"
+
+    def __init__(self, logs: bool = False, cache: Optional[str] = None):
+        self.logs = logs
+        self.cache = cache
+
+    def run_stage(self, stage_dir: str, env: Dict[str, str], cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        stage_env = dict(os.environ, PYTHONPATH=COMMON_DIR)
+        stage_env.update(env)
+        stage_env["LOGS"] = env.get("LOGS", "on" if self.logs else "off")
+        #the affinity is inherited by the programs, exec pins its tests to these cores
+        preexec_fn = (lambda: os.sched_setaffinity(0, cpus)) if cpus else None
+        return subprocess.run([sys.executable, "-u", "main.py"], cwd=f"{SRC_DIR}/{stage_dir}", env=stage_env, capture_output=True, preexec_fn=preexec_fn)
+
+    def startup(self, stage: str = "exec") -> subprocess.CompletedProcess:
+        stage_dir = {"exec": "exec-python", "judge": "judge", "comp": COMPILERS["cpp"]}[stage]
+        return subprocess.run([sys.executable, "-c", "import main"], cwd=f"{SRC_DIR}/{stage_dir}", env=dict(os.environ, PYTHONPATH=COMMON_DIR), capture_output=True)
+
+    def compile(self, comp_in: str, comp_out: str, language: str = "cpp", cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        with tempfile.TemporaryDirectory() as tmp:
+            for d in ["src", "bin", "out"]:
+                os.makedirs(f"{tmp}/{d}")
+            env = {
+                "SRC": comp_in,
+                "OUT": comp_out,
+                "BIN": comp_out,
+                "SRC_TMP": f"{tmp}/src",
+                "BIN_TMP": f"{tmp}/bin",
+                "OUT_TMP": f"{tmp}/out",
+            }
+            if self.cache:
+                env["CACHE"] = self.cache
+            return self.run_stage(compiler_dir(language), env, cpus)
+
+    def execute(self, tests: str, comp_out: str, exec_out: str, env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        return self.run_stage("exec-python", {
+            "IN": f"{tests}/in",
+            "BIN": comp_out,
+            "OUT": exec_out,
+            "STD": exec_out,
+            "ANS": f"{tests}/out",
+            **(env or {}),
+        }, cpus)
+
+    def execute_batch(self, tests: str, submissions: List[Tuple[str, str, str]], env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        with tempfile.TemporaryDirectory() as batch_dir:
+            with open(f"{batch_dir}/batch.json", "w") as batch_file:
+                json.dump({"submissions": [{"id": submission_id, "bin": comp_out, "out": exec_out} for submission_id, comp_out, exec_out in submissions]}, batch_file)
+            return self.run_stage("exec-python", {
+                "IN": f"{tests}/in",
+                "ANS": f"{tests}/out",
+                "BATCH": f"{batch_dir}/batch.json",
+                **(env or {}),
+            }, cpus)
+
+    def judge(self, tests: str, exec_out: str, env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None, checker: Optional[str] = None) -> subprocess.CompletedProcess:
+        stage_env = {
+            "IN": exec_out,
+            "OUT": exec_out,
+            "ANS": f"{tests}/out",
+            "TESTS": f"{tests}/in",
+            **(env or {}),
+        }
+        if checker:
+            stage_env["CHECKER"] = checker
+        return self.run_stage("judge", stage_env, cpus)
+
+class SandboxBackend:
+    """Runs every stage as a local process in namespaces with seccomp, without docker.
+
+    The stage sees the same paths as in its image (/app, /data/in, /data/out,
+    ...), the system directories read-only and no network.
+    """
+
+    name = "sandbox"
+
+    #the ENV of the dockerfiles
+    STAGE_ENV = {
+        "comp": {"SRC": "/data/in", "OUT": "/data/out", "BIN": "/data/out"},
+        "exec": {"IN": "/data/in", "BIN": "/data/bin", "OUT": "/data/out", "STD": "/data/out", "ANS": "/data/answer"},
+        "judge": {"IN": "/data/in", "ANS": "/data/answer", "TESTS": "/data/tests", "OUT": "/data/out", "COMPARE": "lines"},
+    }
+
+    def __init__(self, logs: bool = False, cache: Optional[str] = None):
+        self.logs = logs
+        self.cache = cache
+
+    def run_stage(self, stage: str, stage_dir: str, volumes: List[Tuple[str, str, bool]], env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None, command: Optional[List[str]] = None) -> subprocess.CompletedProcess:
+        stage_env = {"PATH": "/usr/local/bin:/usr/bin:/bin", "HOME": "/tmp", "LANG": "C.UTF-8", "PYTHONPATH": "/common", "LOGS": "on" if self.logs else "off"}
+        stage_env.update(self.STAGE_ENV[stage])
+        stage_env.update(env or {})
+        mounts = [(f"{SRC_DIR}/{stage_dir}", "/app", True), (COMMON_DIR, "/common", True)] + volumes
+        return sandbox.run(command or [sys.executable, "-u", "main.py"], mounts, stage_env, "/app", cpus, capture_output=True)
+
+    def startup(self, stage: str = "exec") -> subprocess.CompletedProcess:
+        stage_dir = {"exec": "exec-python", "judge": "judge", "comp": COMPILERS["cpp"]}[stage]
+        return self.run_stage(stage, stage_dir, [], command=[sys.executable, "-c", "import main"])
+
+    def compile(self, comp_in: str, comp_out: str, language: str = "cpp", cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        volumes = [(comp_in, "/data/in", True), (comp_out, "/data/out", False)]
+        env = {}
+        if self.cache:
+            env["CACHE"] = "/data/cache"
+            volumes.append((self.cache, "/data/cache", False))
+        return self.run_stage("comp", compiler_dir(language), volumes, env, cpus)
+
+    def execute(self, tests: str, comp_out: str, exec_out: str, env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        volumes = [(f"{tests}/in", "/data/in", True), (comp_out, "/data/bin", True), (exec_out, "/data/out", False)]
+        if (env or {}).get("FUSED") == "on":
+            volumes.append((f"{tests}/out", "/data/answer", True))
+        return self.run_stage("exec", "exec-python", volumes, env, cpus)
+
+    def execute_batch(self, tests: str, submissions: List[Tuple[str, str, str]], env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None) -> subprocess.CompletedProcess:
+        volumes = [(f"{tests}/in", "/data/in", True)]
+        for submission_id, comp_out, exec_out in submissions:
+            volumes += [(comp_out, f"/data/bin/{submission_id}", True), (exec_out, f"/data/out/{submission_id}", False)]
+        if (env or {}).get("FUSED") == "on":
+            volumes.append((f"{tests}/out", "/data/answer", True))
+        with tempfile.TemporaryDirectory() as batch_dir:
+            with open(f"{batch_dir}/batch.json", "w") as batch_file:
+                json.dump({"submissions": [{"id": submission_id} for submission_id, _, _ in submissions]}, batch_file)
+            volumes.append((batch_dir, "/data/batch", True))
+            return self.run_stage("exec", "exec-python", volumes, {"BATCH": "/data/batch/batch.json", **(env or {})}, cpus)
+
+    def judge(self, tests: str, exec_out: str, env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None, checker: Optional[str] = None) -> subprocess.CompletedProcess:
+        #not read-only, the judge removes the full outputs of the passed tests
+        volumes = [(exec_out, "/data/in", False), (exec_out, "/data/out", False), (f"{tests}/out", "/data/answer", True), (f"{tests}/in", "/data/tests", True)]
+        stage_env = dict(env or {})
+        if checker:
+            volumes.append((checker, "/data/checker", True))
+            stage_env["CHECKER"] = "/data/checker"
+        return self.run_stage("judge", "judge", volumes, stage_env, cpus)
+
+BACKENDS = {
+    "docker": DockerBackend,
+    "local": LocalBackend,
+    "sandbox": SandboxBackend,
+}
@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from backends import BACKENDS
+from manifest import MANIFEST_FILE, manifest_results, read_manifest, test_key
+from groups import load_groups, score
+from store import STORE, DataStore, digest
+from results_db import RESULTS_DB, ResultsDB
+from worker import BACKEND, CACHE, Worker, read_json
+
+#Runs the submissions on many machines. The coordinator compiles a submission
+#once, splits its tests into tasks and queues them on the nodes, every node
+#takes the tasks of its own queue and steals from the end of the longest queue
+#of another node when its own is empty. Test files and binaries are sent by
+#content hash and cached by the nodes. The records of the tests stream back as
+#the stages write them and are merged into the results.jsonl of the submission.
+#
+#TCP with json lines, a file is sent as a {"size": n} line and n raw bytes. The
+#first line of every connection carries the shared CLUSTER_TOKEN:
+#  client -> coordinator  {"op": "submit", "token": token, ...job}, the events of the job come back
+#  node -> coordinator    {"op": "hello", "token": token, "node": name}, then any of
+#                         {"op": "next"} -> {"task": task or null}
+#                         {"op": "get", "sha": sha} -> the file, only of the task of the connection
+#                         {"op": "records", "task": id, "records": [...]}
+#                         {"op": "done", "task": id, "error": null or info}
+
+logger = logging.getLogger("CLUSTER")
+
+LISTEN = os.getenv("LISTEN", "127.0.0.1:7700")
+COORDINATOR = os.getenv("COORDINATOR", "127.0.0.1:7700")
+#required, the nodes get the answers of the tests and the clients run programs on the coordinator
+CLUSTER_TOKEN = os.getenv("CLUSTER_TOKEN")
+#tests in one task
+TASK_TESTS = int(os.getenv("TASK_TESTS") or 4)
+#tasks run at the same time by a node, each on its share of the cores
+NODE_SLOTS = int(os.getenv("NODE_SLOTS") or 1)
+NODE_CACHE = os.getenv("NODE_CACHE") or f"{tempfile.gettempdir()}/stos-node"
+NODE_NAME = os.getenv("NODE_NAME") or socket.gethostname()
+#binaries of the submissions for the nodes, by sha
+COORDINATOR_OBJECTS = os.getenv("COORDINATOR_OBJECTS") or f"{tempfile.gettempdir()}/stos-coordinator"
+#a task of a node that left is run again at most this many times
+ATTEMPTS = 3
+#seconds the coordinator waits for the nodes to finish the tasks of a submission
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT") or 3600)
+POLL = 1.0
+CHUNK_SIZE = 1 << 20
+
+def address(text: str) -> Tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return host, int(port)
+
+def send_line(wfile, message: dict):
+    wfile.write((json.dumps(message) + "\n").encode())
+    wfile.flush()
+
+class TaskQueue:
+    """A queue of tasks for every node, an idle node steals from the others."""
+
+    def __init__(self):
+        self.queues: Dict[str, Deque[dict]] = {}
+        self.connections: Dict[str, int] = {}
+        #tasks queued before any node joined or left by a node
+        self.shared: Deque[dict] = deque()
+        self.stolen = 0
+        self.condition = threading.Condition()
+
+    def join(self, node: str):
+        with self.condition:
+            self.queues.setdefault(node, deque())
+            self.connections[node] = self.connections.get(node, 0) + 1
+
+    def leave(self, node: str):
+        """The last connection of the node is closed, its queued tasks go to the others."""
+        with self.condition:
+            self.connections[node] -= 1
+            if self.connections[node] == 0:
+                del self.connections[node]
+                self.shared.extend(self.queues.pop(node))
+                self.condition.notify_all()
+
+    def put(self, tasks: List[dict]):
+        """Every task goes to the shortest queue, in order, so the first tasks start first."""
+        with self.condition:
+            for task in tasks:
+                if self.queues:
+                    min(self.queues.values(), key=len).append(task)
+                else:
+                    self.shared.append(task)
+            self.condition.notify_all()
+
+    def requeue(self, task: dict):
+        with self.condition:
+            self.shared.appendleft(task)
+            self.condition.notify_all()
+
+    def drop(self, job_id: str):
+        """The queued tasks of the job are not run anymore."""
+        with self.condition:
+            for queue in [self.shared, *self.queues.values()]:
+                kept = [task for task in queue if task["job"] != job_id]
+                queue.clear()
+                queue.extend(kept)
+
+    def take(self, node: str) -> Optional[dict]:
+        own = self.queues.get(node)
+        if own:
+            return own.popleft()
+        if self.shared:
+            return self.shared.popleft()
+        victim = max(self.queues.values(), key=len, default=None)
+        if victim:
+            #from the end, the owner keeps the tasks it is about to run
+            self.stolen += 1
+            return victim.pop()
+        return None
+
+    def next(self, node: str, timeout: float = POLL) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while (task := self.take(node)) is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            return task
+
+class JobState:
+    """The merged manifest of a submission and its tasks still running."""
+
+    def __init__(self, job_id: str, manifest_path: str, emit: Callable[[dict], None], tasks: List[dict]):
+        self.job_id = job_id
+        self.manifest_path = manifest_path
+        self.emit = emit
+        self.pending = {task["id"] for task in tasks}
+        self.errors: List[str] = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if not self.pending:
+            self.done.set()
+
+    def append(self, records: List[dict], emit: bool = True):
+        with self.lock:
+            with open(self.manifest_path, "a") as manifest_file:
+                manifest_file.write("".join(json.dumps(record) + "\n" for record in records))
+        for record in records if emit else []:
+            self.emit({"id": self.job_id, "stage": "test", "record": record})
+
+    def finish(self, task_id: str, error: Optional[str] = None):
+        with self.lock:
+            if task_id not in self.pending:
+                return
+            self.pending.discard(task_id)
+            if error:
+                self.errors.append(f"task {task_id}: {error}")
+            if not self.pending:
+                self.done.set()
+
+class Coordinator:
+    """Compiles the submissions, splits them into tasks and merges the results of the nodes."""
+
+    def __init__(self, backend, store: Optional[DataStore] = None, task_tests: int = TASK_TESTS, results_db: Optional[ResultsDB] = None, objects_dir: str = COORDINATOR_OBJECTS, job_timeout: float = JOB_TIMEOUT):
+        self.backend = backend
+        self.job_timeout = job_timeout
+        self.objects_dir = objects_dir
+        self.store = store
+        self.task_tests = task_tests
+        self.results_db = results_db
+        self.tasks = TaskQueue()
+        #files the nodes may fetch, by sha, while a job needs them
+        self.objects: Dict[str, str] = {}
+        self.refs: Dict[str, int] = {}
+        self.jobs: Dict[str, JobState] = {}
+        self.lock = threading.Lock()
+        self.sent_bytes = 0
+
+    def add_object(self, sha: str, path: str, copy: bool = False):
+        """A file the nodes may fetch until release, with copy it is kept in objects_dir (root may be removed by another job)."""
+        with self.lock:
+            self.refs[sha] = self.refs.get(sha, 0) + 1
+            if self.refs[sha] > 1:
+                return
+            if copy:
+                os.makedirs(self.objects_dir, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=self.objects_dir)
+                os.close(fd)
+                shutil.copy(path, tmp)
+                path = f"{self.objects_dir}/{sha}"
+                os.replace(tmp, path)
+            self.objects[sha] = path
+
+    def add_objects(self, root: str, names: List[str], copy: bool = False) -> Dict[str, str]:
+        files = {name: digest(f"{root}/{name}") for name in names}
+        #every object once, the job releases each of them once
+        for sha, path in {sha: f"{root}/{name}" for name, sha in files.items()}.items():
+            self.add_object(sha, path, copy)
+        return files
+
+    def release(self, shas: List[str]):
+        """The job is over, the objects no other job needs are forgotten and their copies removed."""
+        with self.lock:
+            for sha in shas:
+                self.refs[sha] -= 1
+                if self.refs[sha] > 0:
+                    continue
+                del self.refs[sha]
+                path = self.objects.pop(sha)
+                if os.path.dirname(path) == self.objects_dir:
+                    os.remove(path)
+
+    def test_files(self, job: dict) -> Dict[str, str]:
+        """The files of the tests (in/, out/, checker/) by their path in the test set."""
+        if "problem" in job:
+            files = self.store.manifest(job["problem"])
+            #the staged set of the job, kept until the job releases it
+            for sha, name in {sha: name for name, sha in files.items()}.items():
+                self.add_object(sha, f"{job['tests']}/{name}")
+            return files
+        names = []
+        for d in ["in", "out", "checker"]:
+            if os.path.isdir(f"{job['tests']}/{d}"):
+                names += [f"{d}/{name}" for name in sorted(os.listdir(f"{job['tests']}/{d}")) if os.path.isfile(f"{job['tests']}/{d}/{name}")]
+        return self.add_objects(job["tests"], names)
+
+    def split(self, job_id: str, files: Dict[str, str], binary: Dict[str, str], env: Dict[str, str]) -> List[dict]:
+        """Tasks of task_tests tests, the biggest inputs first."""
+        names = [name[3:-3] for name in files if name.startswith("in/") and name.endswith(".in")]
+        names.sort(key=test_key)
+        names.sort(key=lambda name: os.path.getsize(self.objects[files[f"in/{name}.in"]]), reverse=True)
+        test_paths = {f"in/{name}.in" for name in names} | {f"out/{name}.out" for name in names}
+        shared = {path: sha for path, sha in files.items() if path not in test_paths}
+        tasks = []
+        for i in range(0, len(names), self.task_tests):
+            chunk = names[i:i + self.task_tests]
+            task_files = dict(shared)
+            for name in chunk:
+                task_files[f"in/{name}.in"] = files[f"in/{name}.in"]
+                if f"out/{name}.out" in files:
+                    task_files[f"out/{name}.out"] = files[f"out/{name}.out"]
+            tasks.append({"id": f"{job_id}/{len(tasks)}", "job": job_id, "tests": chunk, "files": task_files, "bin": binary, "env": env, "attempts": 0})
+        return tasks
+
+    def run(self, job: dict, emit: Callable[[dict], None]):
+        job_id = job.setdefault("id", uuid.uuid4().hex)
+        submitted = time.time()
+        keep = "work_dir" in job
+        work_dir = job.get("work_dir") or tempfile.mkdtemp(prefix="stos-")
+        comp_out = f"{work_dir}/comp-out"
+        exec_out = f"{work_dir}/exec-out"
+        for d in [comp_out, exec_out]:
+            os.makedirs(d, exist_ok=True)
+            os.chmod(d, 0o777)
+        manifest_path = f"{exec_out}/{MANIFEST_FILE}"
+        open(manifest_path, "w").close()
+        emit({"id": job_id, "stage": "start", "queue_time": 0})
+        result = "error"
+        shas: List[str] = []
+        staged = None
+        try:
+
+            #compiling, once for all nodes
+
+            start_time = time.time()
+            self.backend.compile(job["comp_in"], comp_out, job.get("language", "cpp"))
+            comp = read_json(f"{comp_out}/comp.json", {"return_code": -1})
+            emit({"id": job_id, "stage": "comp", "time": round(time.time() - start_time, 4), "result": comp})
+            if comp["return_code"] != 0:
+                result = "compile_error"
+                emit({"id": job_id, "stage": "done", "points": 0, "info": f"compilation failed with return code {comp['return_code']}"})
+                return
+
+            #running and judging on the nodes
+
+            start_time = time.time()
+            if "problem" in job:
+                job["tests"] = staged = self.store.stage(job["problem"])
+            files = self.test_files(job)
+            shas += set(files.values())
+            binary = self.add_objects(comp_out, [name for name in os.listdir(comp_out) if name.startswith("program")], copy=True)
+            shas += set(binary.values())
+            tasks = self.split(job_id, files, binary, job.get("env") or {})
+            state = JobState(job_id, manifest_path, emit, tasks)
+            with self.lock:
+                self.jobs[job_id] = state
+            try:
+                self.tasks.put(tasks)
+                if not state.done.wait(self.job_timeout):
+                    #no node joined or the nodes are stuck, the records of late tasks are ignored
+                    self.tasks.drop(job_id)
+                    with state.lock:
+                        state.errors.append(f"the nodes did not finish the tasks in {self.job_timeout:g}s")
+            finally:
+                with self.lock:
+                    del self.jobs[job_id]
+            if state.errors:
+                emit({"id": job_id, "stage": "error", "info": "; ".join(state.errors)})
+                return
+
+            #the points of the whole submission, the tasks know only their tests
+
+            config = files.get("in/config.json")
+            groups = load_groups(self.objects[config]) if config else []
+            judged = {record["test"]: record for record in read_manifest(manifest_path) if record["stage"] == "judge"}
+            points, group_results = score({name: record["grade"] for name, record in judged.items()}, groups)
+            end = {"stage": "judge_end", "points": points, "tests": len(judged), "time": round(time.time() - start_time, 6)}
+            if group_results:
+                end["groups"] = group_results
+            state.append([end], emit=False)
+            results = manifest_results(manifest_path)
+            emit({"id": job_id, "stage": "judge", "time": round(time.time() - start_time, 4), "result": results})
+            emit({"id": job_id, "stage": "done", "points": results["points"]})
+            result = "ok"
+        finally:
+            self.release(shas)
+            if staged:
+                self.store.release(staged)
+            if self.results_db is not None:
+                self.results_db.ingest(job_id, manifest_path, job.get("problem") or job.get("tests"), job.get("owner"), job.get("language", "cpp"), result, submitted)
+            if not keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    def records(self, node: str, task: dict, records: List[dict]):
+        state = self.jobs.get(task["job"])
+        if state is None:
+            return
+        #the ends of the stages of a task are not the end of the submission
+        records = [{**record, "node": node} for record in records if "test" in record and record["test"] in task["tests"]]
+        if records:
+            state.append(records)
+
+    def task_done(self, task: dict, error: Optional[str] = None):
+        state = self.jobs.get(task["job"])
+        if state is not None:
+            state.finish(task["id"], error)
+
+    def task_lost(self, task: dict):
+        """The node left in the middle of the task."""
+        task["attempts"] += 1
+        if task["attempts"] < ATTEMPTS:
+            self.tasks.requeue(task)
+        else:
+            self.task_done(task, "no node finished the task")
+
+    def send_object(self, wfile, sha: Optional[str]):
+        path = self.objects.get(sha)
+        if path is None or not os.path.exists(path):
+            send_line(wfile, {"size": -1})
+            return
+        with open(path, "rb") as object_file:
+            size = os.fstat(object_file.fileno()).st_size
+            send_line(wfile, {"size": size})
+            while chunk := object_file.read(CHUNK_SIZE):
+                wfile.write(chunk)
+        wfile.flush()
+        with self.lock:
+            self.sent_bytes += size
+
+class Handler(socketserver.StreamRequestHandler):
+    """A client with one job or a node, told apart by the first line."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        if not self.server.authorized(request.pop("token", None)):
+            logger.error(f"connection from {self.client_address[0]} without a valid token")
+            return
+        if request.get("op") == "hello":
+            self.serve_node(request["node"])
+            return
+        request.pop("op", None)
+        self.server.coordinator.run(request, lambda event: send_line(self.wfile, event))
+
+    def serve_node(self, node: str):
+        coordinator = self.server.coordinator
+        coordinator.tasks.join(node)
+        task = None
+        try:
+            while line := self.rfile.readline():
+                request = json.loads(line)
+                if request["op"] == "next":
+                    task = coordinator.tasks.next(node)
+                    send_line(self.wfile, {"task": task})
+                elif request["op"] == "get":
+                    #a node sees the answers of the tests it runs only
+                    allowed = task is not None and (request["sha"] in task["files"].values() or request["sha"] in task["bin"].values())
+                    coordinator.send_object(self.wfile, request["sha"] if allowed else None)
+                elif request["op"] == "records" and task is not None:
+                    coordinator.records(node, task, request["records"])
+                elif request["op"] == "done" and task is not None:
+                    coordinator.task_done(task, request.get("error"))
+                    task = None
+        except OSError:
+            logger.exception(f"node {node} disconnected")
+        finally:
+            coordinator.tasks.leave(node)
+            if task is not None:
+                coordinator.task_lost(task)
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, listen: Tuple[str, int], coordinator: Coordinator, token: Optional[str] = CLUSTER_TOKEN):
+        if not token:
+            raise ValueError("CLUSTER_TOKEN is not set")
+        super().__init__(listen, Handler)
+        self.coordinator = coordinator
+        self.token = token
+
+    def authorized(self, token) -> bool:
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+
+class Connection:
+    """The connection of one slot of a node to the coordinator."""
+
+    def __init__(self, coordinator: Tuple[str, int], node: str, token: Optional[str]):
+        self.socket = socket.create_connection(coordinator)
+        self.rfile = self.socket.makefile("rb")
+        self.send({"op": "hello", "token": token, "node": node})
+
+    def send(self, message: dict):
+        self.socket.sendall((json.dumps(message) + "\n").encode())
+
+    def request(self, message: dict) -> dict:
+        self.send(message)
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("the coordinator closed the connection")
+        return json.loads(line)
+
+    def fetch(self, sha: str, path: str):
+        """Downloads the object into path, checking its hash."""
+        response = self.request({"op": "get", "sha": sha})
+        if response["size"] < 0:
+            raise FileNotFoundError(f"object {sha} is not on the coordinator")
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            hasher = hashlib.sha256()
+            with os.fdopen(fd, "wb") as object_file:
+                remaining = response["size"]
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, CHUNK_SIZE))
+                    if not chunk:
+                        raise ConnectionError("the coordinator closed the connection")
+                    hasher.update(chunk)
+                    object_file.write(chunk)
+                    remaining -= len(chunk)
+            if hasher.hexdigest() != sha:
+                raise ValueError(f"object {sha} is damaged")
+            #binaries and checkers are run straight from the cache
+            os.chmod(tmp, 0o555)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def close(self):
+        self.rfile.close()
+        self.socket.close()
+
+class Node:
+    """Runs the tasks of the coordinator on the local backend, slots tasks at a time."""
+
+    def __init__(self, backend, coordinator: Tuple[str, int], name: str = NODE_NAME, slots: int = NODE_SLOTS, cache: str = NODE_CACHE, token: Optional[str] = CLUSTER_TOKEN):
+        self.coordinator = coordinator
+        self.token = token
+        self.name = name
+        self.cache = cache
+        #the backend and the checkers of the worker, without its scheduler threads
+        self.worker = Worker(backend, workers=1, checkers_dir=f"{cache}/checkers")
+        cpus = sorted(os.sched_getaffinity(0))
+        self.slots = [cpus[i::slots] or cpus for i in range(slots)]
+        self.fetched = 0
+
+    def object(self, connection: Connection, sha: str) -> str:
+        """Path of the object in the cache, fetched on the first use."""
+        path = f"{self.cache}/objects/{sha[:2]}/{sha}"
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection.fetch(sha, path)
+            self.fetched += 1
+        return path
+
+    def link(self, connection: Connection, files: Dict[str, str], root: str):
+        for name, sha in files.items():
+            os.makedirs(os.path.dirname(f"{root}/{name}"), exist_ok=True)
+            try:
+                os.link(self.object(connection, sha), f"{root}/{name}")
+            except OSError:
+                #the cache is on another filesystem
+                shutil.copy(self.object(connection, sha), f"{root}/{name}")
+
+    def run_task(self, connection: Connection, task: dict, cpus: List[int]) -> Optional[str]:
+        """Runs exec and judge on the tests of the task, the records are sent as they are written."""
+        work_dir = tempfile.mkdtemp(prefix="stos-task-")
+        tests, comp_out, exec_out = f"{work_dir}/tests", f"{work_dir}/comp-out", f"{work_dir}/exec-out"
+        try:
+            for d in [f"{tests}/in", f"{tests}/out", comp_out, exec_out]:
+                os.makedirs(d)
+                os.chmod(d, 0o777)
+            self.link(connection, task["files"], tests)
+            self.link(connection, task["bin"], comp_out)
+            checker, env = self.worker.prepare_checker({"tests": tests, "env": task["env"]})
+            finished = threading.Event()
+            stopped = threading.Event()
+            errors = []
+
+            def stages():
+                try:
+                    process = self.worker.backend.execute(tests, comp_out, exec_out, env, cpus)
+                    if stopped.is_set():
+                        return
+                    if process.returncode == 0 and env.get("FUSED") != "on":
+                        process = self.worker.backend.judge(tests, exec_out, env, cpus, checker)
+                    if process.returncode != 0:
+                        errors.append(f"stage failed with return code {process.returncode}")
+                except Exception as e:
+                    errors.append(str(e))
+                finally:
+                    finished.set()
+
+            thread = threading.Thread(target=stages, daemon=True)
+            thread.start()
+            try:
+                for record in read_manifest(f"{exec_out}/{MANIFEST_FILE}", stop=finished.is_set):
+                    connection.send({"op": "records", "task": task["id"], "records": [record]})
+            finally:
+                #with the connection lost the judge is not started, exec is bounded by the limits
+                stopped.set()
+                thread.join()
+            return errors[0] if errors else None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def loop(self, cpus: List[int]):
+        while True:
+            try:
+                connection = Connection(self.coordinator, self.name, self.token)
+            except OSError:
+                time.sleep(POLL)
+                continue
+            try:
+                while True:
+                    task = connection.request({"op": "next"})["task"]
+                    if task is None:
+                        continue
+                    try:
+                        error = self.run_task(connection, task, cpus)
+                    except ConnectionError:
+                        raise
+                    except (OSError, ValueError) as e:
+                        error = str(e)
+                    connection.send({"op": "done", "task": task["id"], "error": error})
+            except OSError:
+                logger.exception("connection to the coordinator lost")
+            finally:
+                connection.close()
+
+    def serve(self):
+        threads = [threading.Thread(target=self.loop, args=(cpus,), daemon=True) for cpus in self.slots]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+def submit(job: dict, coordinator: str = COORDINATOR, token: Optional[str] = CLUSTER_TOKEN) -> Iterator[dict]:
+    """Sends the job to the coordinator and yields the events as they come."""
+    with socket.create_connection(address(coordinator)) as client:
+        client.sendall((json.dumps({"op": "submit", "token": token, **job}) + "\n").encode())
+        with client.makefile("r") as events:
+            for line in events:
+                yield json.loads(line)
+
+def main():
+    logging.basicConfig(
+        level=logging.DEBUG if os.environ.get("LOGS")=="on" else logging.ERROR,
+        format="[%(name)s] %(levelname)s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    if sys.argv[1:] not in [["coordinator"], ["node"]]:
+        print("usage: cluster.py coordinator | node", file=sys.stderr)
+        sys.exit(1)
+    backend = BACKENDS[BACKEND](logs=os.environ.get("LOGS")=="on", cache=CACHE)
+    if sys.argv[1] == "coordinator":
+        coordinator = Coordinator(backend, DataStore(STORE) if STORE else None, results_db=ResultsDB(RESULTS_DB) if RESULTS_DB else None)
+        with Server(address(LISTEN), coordinator) as server:
+            logger.info(f"listening on {LISTEN}, backend: {BACKEND}")
+            server.serve_forever()
+    else:
+        node = Node(backend, address(COORDINATOR))
+        logger.info(f"node {node.name} of {COORDINATOR}, slots: {len(node.slots)}")
+        node.serve()
+
+if __name__ == "__main__":
+    main()
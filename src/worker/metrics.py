@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+#Metrics of all submissions in the Prometheus text format (e.g. for the textfile
+#collector of node_exporter) and a trace of every submission in the Chrome
+#trace event format (chrome://tracing, Perfetto).
+
+TIME_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+MEMORY_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576]
+
+METRICS = {
+    "stos_submissions_total": ("counter", "Finished submissions by result.", None),
+    "stos_queue_wait_seconds": ("histogram", "Time from submit to the start of the submission.", TIME_BUCKETS),
+    "stos_stage_seconds": ("histogram", "Wall time of the compile, exec and judge stages, with the stage startup.", TIME_BUCKETS),
+    "stos_tests_total": ("counter", "Executed tests by verdict.", None),
+    "stos_test_queue_seconds": ("histogram", "Time a test waited for a free runner inside the exec stage.", TIME_BUCKETS),
+    "stos_test_spawn_seconds": ("histogram", "Time from the start of a test to a running program.", TIME_BUCKETS),
+    "stos_test_wall_seconds": ("histogram", "Wall time of a program run.", TIME_BUCKETS),
+    "stos_test_cpu_seconds": ("histogram", "User CPU time of a program run.", TIME_BUCKETS),
+    "stos_test_rss_kilobytes": ("histogram", "Peak RSS of a program run.", MEMORY_BUCKETS),
+    "stos_test_input_bytes_total": ("counter", "Bytes of test input given to the programs.", None),
+    "stos_test_output_bytes_total": ("counter", "Bytes of output written by the programs.", None),
+    "stos_judge_compare_seconds": ("histogram", "Time of checking one test in the judge stage.", TIME_BUCKETS),
+    "stos_judge_bytes_total": ("counter", "Bytes of program output compared by the judge stage.", None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+class Metrics:
+    """Counters and histograms, shared by the worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, list]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        buckets = METRICS[name][2]
+        with self.lock:
+            #bucket counts, sum, count
+            series = self.histograms.setdefault(name, {}).setdefault(key, [[0] * len(buckets), 0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, buckets) in METRICS.items():
+                if name not in self.counters and name not in self.histograms:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self.counters.get(name, {}).items()):
+                    lines.append(f"{name}{format_labels(labels)} {value:g}")
+                for labels, (counts, total, count) in sorted(self.histograms.get(name, {}).items()):
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f"{name}_bucket{format_labels(labels, ('le', f'{bound:g}'))} {bucket_count}")
+                    lines.append(f"{name}_bucket{format_labels(labels, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {total:g}")
+                    lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Replaces the file at once, so a scraper never reads half of it."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "w") as metrics_file:
+            metrics_file.write(self.render())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+
+class Trace:
+    """Spans of one submission as Chrome trace events, times are epoch seconds."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.events: List[dict] = []
+
+    def span(self, name: str, start: float, duration: float, lane: str = "worker", **args):
+        self.events.append({
+            "name": name,
+            "cat": lane,
+            "ph": "X",
+            "ts": round(start * 1e6),
+            "dur": round(duration * 1e6),
+            "pid": self.job_id,
+            "tid": lane,
+            "args": args,
+        })
+
+    def write(self, path: str):
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, trace_file)
+
+def record_tests(metrics: Metrics, trace: Trace, records: Dict[str, Dict[str, dict]]):
+    """Test metrics and spans from the manifest records of the exec and judge stages."""
+    for stage in ["exec", "judge"]:
+        end = records.get(f"{stage}_end")
+        if end is not None and "start" in end:
+            #the stage process itself, the rest of the stage span is the container or process startup
+            trace.span(f"{stage} main", end["start"], end["time"], stage, tests=end["tests"])
+    for name, record in records["exec"].items():
+        metrics.inc("stos_tests_total", verdict=record["verdict"])
+        if record["verdict"] == "SKIP":
+            continue
+        metrics.observe("stos_test_cpu_seconds", record["user_time"])
+        metrics.observe("stos_test_rss_kilobytes", record["memory"])
+        if "wall_time" not in record:
+            continue
+        metrics.observe("stos_test_wall_seconds", record["wall_time"])
+        metrics.observe("stos_test_spawn_seconds", record["spawn_time"])
+        if "queue_time" in record:
+            metrics.observe("stos_test_queue_seconds", record["queue_time"])
+        metrics.inc("stos_test_input_bytes_total", record["input_bytes"])
+        metrics.inc("stos_test_output_bytes_total", record["output_bytes"])
+        #parallel tests on separate lanes, so the spans do not overlap
+        trace.span(f"exec {name}", record["start"], record["wall_time"], f"exec cpu {record.get('cpu', '-')}",
+            verdict=record["verdict"], user_time=record["user_time"], memory=record["memory"], spawn_time=record["spawn_time"],
+            queue_time=record.get("queue_time"), input_bytes=record["input_bytes"], output_bytes=record["output_bytes"])
+    for name, record in records["judge"].items():
+        if "time" not in record:
+            continue
+        metrics.observe("stos_judge_compare_seconds", record["time"])
+        metrics.inc("stos_judge_bytes_total", record["output_bytes"])
+        if "start" in record:
+            #the fused exec compares during the run, its tests have the exec span only
+            trace.span(f"judge {name}", record["start"], record["time"], f"judge {record.get('worker', '-')}", grade=record["grade"], info=record["info"])
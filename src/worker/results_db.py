@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from manifest import load_manifest, manifest_results, test_key
+
+#History of the results of all submissions in SQLite. The worker ingests the
+#manifest (results.jsonl) of every finished submission in one transaction, the
+#queries below read the indexed tables only:
+#  submissions  one row per submission: problem, owner, language, points, result
+#  tests        one row per test of a submission: the exec and judge records
+
+RESULTS_DB = os.getenv("RESULTS_DB")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    problem TEXT,
+    owner TEXT,
+    language TEXT,
+    result TEXT NOT NULL,
+    points REAL NOT NULL,
+    tests INTEGER NOT NULL,
+    time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tests (
+    submission TEXT NOT NULL REFERENCES submissions(id) ON DELETE CASCADE,
+    problem TEXT,
+    test TEXT NOT NULL,
+    verdict TEXT,
+    return_code INTEGER,
+    user_time REAL,
+    memory INTEGER,
+    wall_time REAL,
+    grade INTEGER,
+    info TEXT,
+    time REAL NOT NULL,
+    PRIMARY KEY (submission, test)
+);
+CREATE INDEX IF NOT EXISTS tests_problem_test_time ON tests (problem, test, time);
+CREATE INDEX IF NOT EXISTS tests_problem_verdict ON tests (problem, verdict);
+CREATE INDEX IF NOT EXISTS tests_verdict_time ON tests (verdict, time);
+CREATE INDEX IF NOT EXISTS submissions_problem_points ON submissions (problem, points DESC, time);
+CREATE INDEX IF NOT EXISTS submissions_time ON submissions (time);
+"""
+
+FIELDS = ["user_time", "memory", "wall_time"]
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, q in [0, 1]."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(q * len(values) + 0.5) - 1))]
+
+class ResultsDB:
+    """Results of the submissions, shared by the worker threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        #readers (e.g. a leaderboard) do not block the ingest
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def ingest(self, submission: str, manifest_path: Optional[str], problem: Optional[str] = None, owner: Optional[str] = None, language: Optional[str] = None, result: str = "ok", submitted: Optional[float] = None):
+        """Adds the submission with all its tests from the manifest, a rejudge replaces the old rows."""
+        submitted = submitted if submitted is not None else time.time()
+        records = load_manifest(manifest_path) if manifest_path and os.path.exists(manifest_path) else {"exec": {}, "judge": {}}
+        results = manifest_results(manifest_path) if records["judge"] else None
+        rows = []
+        for name in sorted(set(records["exec"]) | set(records["judge"]), key=test_key):
+            exec = records["exec"].get(name, {})
+            judge = records["judge"].get(name, {})
+            rows.append((
+                submission, problem, name, exec.get("verdict"), exec.get("return_code"), exec.get("user_time"),
+                exec.get("memory"), exec.get("wall_time"), judge.get("grade"), judge.get("info"), exec.get("start", submitted),
+            ))
+        points = results["points"] if results else 0
+        with self.lock:
+            connection = self.connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("DELETE FROM submissions WHERE id = ?", (submission,))
+                connection.execute(
+                    "INSERT INTO submissions (id, problem, owner, language, result, points, tests, time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (submission, problem, owner, language, result, points, len(rows), submitted),
+                )
+                connection.executemany("INSERT INTO tests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def submission(self, submission: str) -> Optional[dict]:
+        rows = self.query("SELECT * FROM submissions WHERE id = ?", (submission,))
+        if not rows:
+            return None
+        ret = dict(rows[0])
+        tests = self.query("SELECT * FROM tests WHERE submission = ?", (submission,))
+        ret["tests"] = sorted((dict(row) for row in tests), key=lambda row: test_key(row["test"]))
+        return ret
+
+    def history(self, problem: str, test: str, last: int = 1000) -> List[dict]:
+        """The runs of the test in the last submissions of the problem, the newest first."""
+        rows = self.query("SELECT * FROM tests WHERE problem = ? AND test = ? ORDER BY time DESC LIMIT ?", (problem, test, last))
+        return [dict(row) for row in rows]
+
+    def test_stats(self, problem: str, test: str, last: int = 1000, field: str = "user_time", percentiles: List[float] = [0.5, 0.95, 0.99]) -> dict:
+        """E.g. the p95 runtime of the test across the last submissions, runs without a measurement are left out."""
+        if field not in FIELDS:
+            raise ValueError(f"unknown field {field}")
+        rows = self.query(f"SELECT {field} FROM tests WHERE problem = ? AND test = ? AND {field} IS NOT NULL ORDER BY time DESC LIMIT ?", (problem, test, last))
+        values = [row[0] for row in rows]
+        ret = {"runs": len(values), "max": max(values, default=None)}
+        for q in percentiles:
+            ret[f"p{round(q * 100)}"] = percentile(values, q)
+        return ret
+
+    def verdicts(self, problem: str, test: Optional[str] = None, since: Optional[float] = None) -> Dict[str, int]:
+        """Number of runs by verdict, of one test or of the whole problem."""
+        sql = "SELECT verdict, COUNT(*) FROM tests WHERE problem = ?"
+        params: list = [problem]
+        if test is not None:
+            sql += " AND test = ?"
+            params.append(test)
+        if since is not None:
+            sql += " AND time >= ?"
+            params.append(since)
+        return {row[0]: row[1] for row in self.query(sql + " GROUP BY verdict", tuple(params))}
+
+    def leaderboard(self, problem: str, limit: int = 10) -> List[dict]:
+        """The best submission of every owner, ties are broken by the earlier submission."""
+        rows = self.query("""
+            SELECT owner, id, points, time FROM (
+                SELECT owner, id, points, time, ROW_NUMBER() OVER (PARTITION BY owner ORDER BY points DESC, time) AS rank
+                FROM submissions WHERE problem = ? AND owner IS NOT NULL
+            ) WHERE rank = 1 ORDER BY points DESC, time LIMIT ?
+        """, (problem, limit))
+        return [dict(row) for row in rows]
+
+def main():
+    commands = {"submission": 1, "history": 2, "stats": 2, "verdicts": 1, "leaderboard": 1}
+    if RESULTS_DB is None or sys.argv[1:2] == [] or commands.get(sys.argv[1]) != len(sys.argv) - 2:
+        print("usage: RESULTS_DB=file results_db.py submission ID | history PROBLEM TEST | stats PROBLEM TEST | verdicts PROBLEM | leaderboard PROBLEM", file=sys.stderr)
+        sys.exit(1)
+    db = ResultsDB(RESULTS_DB)
+    method = {"stats": db.test_stats}.get(sys.argv[1]) or getattr(db, sys.argv[1])
+    print(json.dumps(method(*sys.argv[2:]), indent=1))
+
+if __name__ == "__main__":
+    main()
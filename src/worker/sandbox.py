@@ -0,0 +1,248 @@
+import ctypes
+import errno
+import json
+import os
+import platform
+import resource
+import struct
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+from syscalls import AARCH64, X86_64
+
+#Isolation of a stage process without docker: unprivileged user, mount, network,
+#ipc and uts namespaces, a new root on tmpfs with read-only binds of the system
+#and of the /data directories, rlimits and the seccomp profile of src/conf.
+#Everything is set up in the forked child before exec, in a few milliseconds.
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SECCOMP_PROFILE = os.getenv("SECCOMP") or f"{SRC_DIR}/conf/seccomp.json"
+TMP_SIZE = os.getenv("SANDBOX_TMP_SIZE", "512m")
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+
+PR_SET_NO_NEW_PRIVS = 38
+PR_SET_SECCOMP = 22
+SECCOMP_MODE_FILTER = 2
+
+#system directories of the new root, read-only
+SYSTEM_DIRS = ["/usr", "/bin", "/sbin", "/lib", "/lib32", "/lib64", "/etc"]
+DEVICES = ["/dev/null", "/dev/zero", "/dev/random", "/dev/urandom"]
+#the same scratch directories as in the images
+TMP_DIRS = ["/tmp/src", "/tmp/bin", "/tmp/out", "/tmp/in"]
+
+#audit arch and the syscall numbers
+ARCHS = {
+    "x86_64": (0xc000003e, X86_64),
+    "aarch64": (0xc00000b7, AARCH64),
+}
+
+ACTIONS = {
+    "SCMP_ACT_KILL": 0x00000000,
+    "SCMP_ACT_KILL_THREAD": 0x00000000,
+    "SCMP_ACT_KILL_PROCESS": 0x80000000,
+    "SCMP_ACT_TRAP": 0x00030000,
+    "SCMP_ACT_ERRNO": 0x00050000,
+    "SCMP_ACT_LOG": 0x7ffc0000,
+    "SCMP_ACT_ALLOW": 0x7fff0000,
+}
+
+BPF_LD_W_ABS = 0x20
+BPF_AND_K = 0x54
+BPF_JA = 0x05
+BPF_JEQ_K = 0x15
+BPF_JGE_K = 0x35
+BPF_RET_K = 0x06
+X32_SYSCALL_BIT = 0x40000000
+#offset of args[0] in struct seccomp_data
+ARGS_OFFSET = 16
+ARG_OPS = ["SCMP_CMP_EQ", "SCMP_CMP_MASKED_EQ"]
+#syscall numbers compared linearly at the leaves of the search
+LEAF_SIZE = 4
+
+libc = ctypes.CDLL(None, use_errno=True)
+
+class SockFprog(ctypes.Structure):
+    _fields_ = [("len", ctypes.c_ushort), ("filter", ctypes.c_char_p)]
+
+def check(result: int, what: str):
+    if result != 0:
+        code = ctypes.get_errno()
+        raise OSError(code, f"{what}: {os.strerror(code)}")
+
+def action(rule: dict) -> int:
+    name = rule["action"]
+    if name not in ACTIONS:
+        raise ValueError(f"unsupported seccomp action {name}")
+    if name == "SCMP_ACT_ERRNO":
+        return ACTIONS[name] | rule.get("errnoRet", errno.EPERM)
+    return ACTIONS[name]
+
+def rule_code(rule: dict) -> List[Tuple[int, int, int, int]]:
+    """The return of the action of the rule, after the checks of its args.
+
+    A failed check jumps to the instruction after this code, i.e. the next
+    rule of the same syscall.
+    """
+    code = []
+    for arg in rule.get("args") or []:
+        if arg.get("op") not in ARG_OPS:
+            raise ValueError(f"unsupported seccomp arg op {arg.get('op')}")
+        #as in docker, value is the mask and valueTwo the masked value
+        mask, value = (arg["value"], arg.get("valueTwo", 0)) if arg["op"] == "SCMP_CMP_MASKED_EQ" else ((1 << 64) - 1, arg["value"])
+        #the low and the high half of the 64-bit argument, little endian
+        for half in [0, 1]:
+            code += [
+                (BPF_LD_W_ABS, 0, 0, ARGS_OFFSET + 8 * arg["index"] + 4 * half),
+                (BPF_AND_K, 0, 0, (mask >> (32 * half)) & 0xffffffff),
+                (BPF_JEQ_K, 0, -1, (value >> (32 * half)) & 0xffffffff),
+            ]
+    code.append((BPF_RET_K, 0, 0, action(rule)))
+    return [(op, jt, len(code) - i - 1 if jf == -1 else jf, k) for i, (op, jt, jf, k) in enumerate(code)]
+
+def search(numbers: List[int], blocks: Dict[int, list], default: int) -> List[Tuple[int, int, int, int]]:
+    """Binary search of the syscall number in the accumulator, the block of the number or the default action."""
+    if len(numbers) <= LEAF_SIZE:
+        code = []
+        for number in numbers:
+            code += [(BPF_JEQ_K, 0, len(blocks[number]), number)] + blocks[number]
+        return code + [(BPF_RET_K, 0, 0, default)]
+    middle = len(numbers) // 2
+    left = search(numbers[:middle], blocks, default)
+    right = search(numbers[middle:], blocks, default)
+    #the jumps are forward only and jt and jf have 8 bits, the right half is reached by a long jump
+    return [(BPF_JGE_K, 0, 1, numbers[middle]), (BPF_JA, 0, 0, len(left))] + left + right
+
+def seccomp_filter(profile_path: str = SECCOMP_PROFILE) -> bytes:
+    """Classic BPF program of a docker-style profile (names, actions and args compared with SCMP_CMP_EQ or SCMP_CMP_MASKED_EQ).
+
+    The first matching rule of a syscall decides, the syscall number is found
+    by a binary search, so an allow-list of hundreds of syscalls costs a few
+    comparisons per call.
+    """
+    machine = platform.machine()
+    if machine not in ARCHS:
+        raise ValueError(f"no syscall table for {machine}")
+    arch, numbers = ARCHS[machine]
+    with open(profile_path, "r") as profile_file:
+        profile = json.load(profile_file)
+    default = action({"action": profile.get("defaultAction", "SCMP_ACT_ALLOW")})
+    #the code of every named syscall, its rules in order, then the default action if they all have args
+    blocks: Dict[int, list] = {}
+    decided = set()
+    for rule in profile.get("syscalls", []):
+        code = rule_code(rule)
+        for name in rule["names"]:
+            if name not in numbers:
+                if not any(name in table for _, table in ARCHS.values()):
+                    raise ValueError(f"unknown syscall {name}")
+                #e.g. arch_prctl, there is no such syscall on this arch
+                continue
+            if numbers[name] in decided:
+                continue
+            blocks.setdefault(numbers[name], []).extend(code)
+            if not rule.get("args"):
+                decided.add(numbers[name])
+    for number, block in blocks.items():
+        if number not in decided:
+            block.append((BPF_RET_K, 0, 0, default))
+    instructions = [
+        (BPF_LD_W_ABS, 0, 0, 4),
+        (BPF_JEQ_K, 1, 0, arch),
+        (BPF_RET_K, 0, 0, ACTIONS["SCMP_ACT_KILL_PROCESS"]),
+        (BPF_LD_W_ABS, 0, 0, 0),
+    ]
+    if machine == "x86_64":
+        #x32 syscalls would bypass the numbers below
+        instructions += [(BPF_JGE_K, 0, 1, X32_SYSCALL_BIT), (BPF_RET_K, 0, 0, ACTIONS["SCMP_ACT_ERRNO"] | errno.EPERM)]
+    instructions += search(sorted(blocks), blocks, default)
+    return b"".join(struct.pack("HBBI", *instruction) for instruction in instructions)
+
+def mount(source: Optional[str], target: str, fstype: Optional[str], flags: int, data: Optional[str] = None):
+    check(libc.mount(source and source.encode(), target.encode(), fstype and fstype.encode(), flags, data and data.encode()), f"mount {target}")
+
+def bind(root: str, source: str, target: str, read_only: bool):
+    path = f"{root}{target}"
+    if os.path.isdir(source):
+        os.makedirs(path, exist_ok=True)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "a").close()
+    mount(source, path, None, MS_BIND | MS_REC)
+    if read_only:
+        #the flags locked by the outer namespace have to be kept on remount
+        st = os.statvfs(source)
+        locked = (MS_NOSUID if st.f_flag & os.ST_NOSUID else 0) | (MS_NODEV if st.f_flag & os.ST_NODEV else 0) | (MS_NOEXEC if st.f_flag & os.ST_NOEXEC else 0)
+        mount(None, path, None, MS_BIND | MS_REMOUNT | MS_RDONLY | locked)
+
+def system_mounts() -> List[Tuple[str, str, bool]]:
+    mounts = [(d, d, True) for d in SYSTEM_DIRS if os.path.exists(d)]
+    #the interpreter may live outside of /usr, e.g. in a virtualenv
+    for prefix in {sys.prefix, sys.base_prefix, sys.exec_prefix}:
+        if not any(prefix == d or prefix.startswith(f"{d}/") for d in SYSTEM_DIRS):
+            mounts.append((prefix, prefix, True))
+    return mounts + [(device, device, False) for device in DEVICES if os.path.exists(device)]
+
+def enter(root: str, mounts: List[Tuple[str, str, bool]], workdir: str, seccomp: bytes, cpus: Optional[List[int]] = None):
+    """Runs in the child before exec: namespaces, the new root, limits and seccomp."""
+    uid, gid = os.getuid(), os.getgid()
+    check(libc.unshare(CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS), "unshare")
+    with open("/proc/self/setgroups", "w") as setgroups:
+        setgroups.write("deny")
+    with open("/proc/self/uid_map", "w") as uid_map:
+        uid_map.write(f"0 {uid} 1")
+    with open("/proc/self/gid_map", "w") as gid_map:
+        gid_map.write(f"0 {gid} 1")
+    #nothing mounted here is seen outside
+    mount(None, "/", None, MS_REC | MS_PRIVATE)
+    mount("tmpfs", root, "tmpfs", MS_NOSUID | MS_NODEV, "mode=755")
+    for source, target, read_only in system_mounts() + mounts:
+        bind(root, source, target, read_only)
+    for d in ["/tmp", "/dev/shm"]:
+        os.makedirs(f"{root}{d}", exist_ok=True)
+        mount("tmpfs", f"{root}{d}", "tmpfs", MS_NOSUID | MS_NODEV, f"mode=1777,size={TMP_SIZE}")
+    for d in TMP_DIRS:
+        os.makedirs(f"{root}{d}", mode=0o777, exist_ok=True)
+    os.chdir(root)
+    check(libc.chroot(b"."), "chroot")
+    os.chdir(workdir)
+    mount(None, "/", None, MS_REMOUNT | MS_BIND | MS_RDONLY | MS_NOSUID | MS_NODEV)
+    resource.setrlimit(resource.RLIMIT_CPU, (30, 30))
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "no_new_privs")
+    program = ctypes.create_string_buffer(seccomp, len(seccomp))
+    fprog = SockFprog(len(seccomp) // 8, ctypes.cast(program, ctypes.c_char_p))
+    check(libc.prctl(PR_SET_SECCOMP, SECCOMP_MODE_FILTER, ctypes.byref(fprog), 0, 0), "seccomp")
+
+def run(command: List[str], mounts: List[Tuple[str, str, bool]], env: Dict[str, str], workdir: str = "/", cpus: Optional[List[int]] = None, **kwargs) -> subprocess.CompletedProcess:
+    """Runs the command in a new sandbox, mounts are (host path, sandbox path, read only)."""
+    seccomp = seccomp_filter()
+    #only a mount point, the tmpfs root is mounted on it inside the namespace
+    root = os.path.realpath(f"/tmp/stos-sandbox-{os.getpid()}-{os.urandom(4).hex()}")
+    os.mkdir(root, 0o700)
+    try:
+        return subprocess.run(command, env=env, preexec_fn=lambda: enter(root, mounts, workdir, seccomp, cpus), **kwargs)
+    finally:
+        os.rmdir(root)
+
+def supported() -> bool:
+    """Whether unprivileged namespaces and seccomp work here."""
+    try:
+        result = run([sys.executable, "-c", "pass"], [], {"PATH": "/usr/bin:/bin"}, capture_output=True)
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return False
+    return result.returncode == 0
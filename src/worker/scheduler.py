@@ -0,0 +1,119 @@
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+#Decides which submission runs next and on which cores. Every running job gets
+#its own cores, so tests of different jobs never share a core and user_time is
+#not skewed by neighbours, and the sum of the declared memory of the running
+#jobs never exceeds the memory of the machine.
+
+CPUS = sorted(int(cpu) for cpu in os.getenv("CPUS").split(",")) if os.getenv("CPUS") else sorted(os.sched_getaffinity(0))
+#kB, like memory_limit of the tests
+MEMORY = int(os.getenv("MEMORY") or os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 1024)
+JOB_CORES = int(os.getenv("JOB_CORES") or 1)
+#after that many seconds the first job in the order is not overtaken by smaller jobs
+BACKFILL_WAIT = float(os.getenv("BACKFILL_WAIT") or 30)
+DEFAULT_MEMORY_LIMIT = 262144
+
+#lower runs first, e.g. rejudges wait for the live contest submissions
+PRIORITIES = {"live": 0, "normal": 1, "rejudge": 2}
+
+class Rejected(Exception):
+    pass
+
+class Scheduler:
+    """Priority queue with fair share and admission by cores and declared memory.
+
+    Jobs are taken by priority class first, then by the owner (job["owner"])
+    that used the fewest core-seconds so far, then in the order of submission.
+    A job that does not fit into the free cores and memory can be overtaken by
+    a smaller one, until it waited BACKFILL_WAIT seconds.
+    """
+
+    def __init__(self, cpus: Optional[List[int]] = None, memory: Optional[int] = None, job_cores: int = JOB_CORES, backfill_wait: float = BACKFILL_WAIT):
+        self.cpus = sorted(cpus or CPUS)
+        self.free_cpus = list(self.cpus)
+        self.memory = memory or MEMORY
+        self.free_memory = self.memory
+        self.job_cores = job_cores
+        self.backfill_wait = backfill_wait
+        self.pending: List[dict] = []
+        self.usage: Dict[str, float] = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+
+    def demand(self, job: dict) -> Tuple[int, int]:
+        """Cores and memory (kB) of the job: one test per core, each up to its memory limit."""
+        cores = int(job.get("cores") or self.job_cores)
+        memory_limit = job.get("memory_limit")
+        if memory_limit is None and job.get("tests"):
+            try:
+                with open(f"{job['tests']}/in/config.json", "r") as config_file:
+                    memory_limit = json.load(config_file).get("memory_limit")
+            except (OSError, ValueError):
+                pass
+        return cores, cores * int(memory_limit or DEFAULT_MEMORY_LIMIT)
+
+    def submit(self, job: dict, payload: Any = None):
+        cores, memory = self.demand(job)
+        if job.get("priority", "normal") not in PRIORITIES:
+            raise Rejected(f"unknown priority {job['priority']}")
+        if cores > len(self.cpus) or memory > self.memory:
+            raise Rejected(f"job needs {cores} cores and {memory}kB, the machine has {len(self.cpus)} cores and {self.memory}kB")
+        with self.condition:
+            self.pending.append({
+                "job": job,
+                "payload": payload,
+                "cores": cores,
+                "memory": memory,
+                "sequence": next(self.sequence),
+                "submit_time": time.monotonic(),
+            })
+            self.condition.notify_all()
+
+    def key(self, entry: dict):
+        job = entry["job"]
+        return (PRIORITIES[job.get("priority", "normal")], self.usage.get(job.get("owner", ""), 0.0), entry["sequence"])
+
+    def pick(self) -> Optional[dict]:
+        for entry in sorted(self.pending, key=self.key):
+            if entry["cores"] <= len(self.free_cpus) and entry["memory"] <= self.free_memory:
+                return entry
+            if time.monotonic() - entry["submit_time"] > self.backfill_wait:
+                #the cores are kept for this job, nothing overtakes it any more
+                return None
+        return None
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[Tuple[dict, Any, List[int]]]:
+        """Waits for a job that fits, returns (job, payload, cpus) or None after the timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while (entry := self.pick()) is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                #wakes up also to stop the backfilling for a job waiting too long
+                self.condition.wait(min(remaining or self.backfill_wait, self.backfill_wait))
+            self.pending.remove(entry)
+            cpus = self.free_cpus[:entry["cores"]]
+            del self.free_cpus[:entry["cores"]]
+            self.free_memory -= entry["memory"]
+            job = entry["job"]
+            job["scheduled"] = {"cpus": cpus, "memory": entry["memory"], "start": time.monotonic()}
+            return job, entry["payload"], cpus
+
+    def release(self, job: dict):
+        scheduled = job.pop("scheduled")
+        with self.condition:
+            self.free_cpus = sorted(self.free_cpus + scheduled["cpus"])
+            self.free_memory += scheduled["memory"]
+            owner = job.get("owner", "")
+            self.usage[owner] = self.usage.get(owner, 0.0) + len(scheduled["cpus"]) * (time.monotonic() - scheduled["start"])
+            self.condition.notify_all()
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {"pending": len(self.pending), "free_cpus": len(self.free_cpus), "free_memory": self.free_memory}
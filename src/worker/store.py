@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import zlib
+from typing import Dict, Optional
+
+#Test data of the problems, deduplicated by content hash and compressed at rest:
+#  objects/{sha[:2]}/{sha}.{codec}  file contents
+#  problems/{problem}.json          {"in/0.in": sha, "out/0.out": sha, ...}
+#Before a run the tests are decompressed once into a RAM-backed staging
+#directory, which is reused by all later runs of the same test set. The staged
+#sets not used by a running job are evicted, least recently used first, when
+#the staging directory grows over STAGE_SIZE.
+
+STORE = os.getenv("STORE")
+STAGE = os.getenv("STAGE") or ("/dev/shm/stos-tests" if os.path.isdir("/dev/shm") else f"{tempfile.gettempdir()}/stos-tests")
+CODEC = os.getenv("STORE_CODEC", "zlib")
+STAGE_SIZE = int(os.getenv("STAGE_SIZE") or 2048) << 20
+
+CHUNK_SIZE = 1 << 20
+
+CODECS = {
+    "zlib": lambda: zlib.compressobj(6),
+    "lzma": lambda: lzma.LZMACompressor(),
+}
+DECODERS = {
+    "zlib": zlib.decompressobj,
+    "lzma": lzma.LZMADecompressor,
+}
+
+def digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def atomic_dir(path: str, fill) -> str:
+    """Fills a temporary directory and renames it to path, a parallel fill of the same path is dropped."""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        fill(tmp)
+        os.chmod(tmp, 0o755)
+        os.rename(tmp, path)
+    except OSError:
+        if not os.path.exists(path):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+class DataStore:
+    """Compressed, content-addressed test store with a staging directory in RAM."""
+
+    def __init__(self, root: str, stage: str = STAGE, codec: str = CODEC, stage_size: int = STAGE_SIZE):
+        self.root = root
+        self.stage_root = stage
+        self.codec = codec
+        self.stage_size = stage_size
+        #staged sets of the running jobs, by path, they are not evicted
+        self.users: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def object_path(self, sha: str) -> Optional[str]:
+        for codec in CODECS:
+            path = f"{self.root}/objects/{sha[:2]}/{sha}.{codec}"
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put_object(self, path: str) -> str:
+        sha = digest(path)
+        if self.object_path(sha) is not None:
+            return sha
+        target = f"{self.root}/objects/{sha[:2]}/{sha}.{self.codec}"
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target))
+        try:
+            compressor = CODECS[self.codec]()
+            with os.fdopen(fd, "wb") as out_file, open(path, "rb") as in_file:
+                while chunk := in_file.read(CHUNK_SIZE):
+                    out_file.write(compressor.compress(chunk))
+                out_file.write(compressor.flush())
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return sha
+
+    def add(self, problem: str, tests: str) -> Dict[str, str]:
+        """Adds the test set (directory with in/, out/ and optionally checker/) as the problem, returns its manifest."""
+        manifest = {}
+        for d in ["in", "out", "checker"]:
+            if d == "checker" and not os.path.isdir(f"{tests}/{d}"):
+                continue
+            for file_name in sorted(os.listdir(f"{tests}/{d}")):
+                if os.path.isfile(f"{tests}/{d}/{file_name}"):
+                    manifest[f"{d}/{file_name}"] = self.put_object(f"{tests}/{d}/{file_name}")
+        os.makedirs(f"{self.root}/problems", exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=f"{self.root}/problems")
+        with os.fdopen(fd, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+        os.replace(tmp, f"{self.root}/problems/{problem}.json")
+        return manifest
+
+    def manifest(self, problem: str) -> Dict[str, str]:
+        with open(f"{self.root}/problems/{problem}.json", "r") as manifest_file:
+            return json.load(manifest_file)
+
+    def stage_object(self, sha: str) -> str:
+        """Decompresses the object into the staging directory, once for all test sets that use it."""
+        path = f"{self.stage_root}/objects/{sha}"
+        if os.path.exists(path):
+            return path
+        src = self.object_path(sha)
+        if src is None:
+            raise FileNotFoundError(f"object {sha} is not in the store")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            decompressor = DECODERS[src.rsplit(".", 1)[1]]()
+            with os.fdopen(fd, "wb") as out_file, open(src, "rb") as in_file:
+                while chunk := in_file.read(CHUNK_SIZE):
+                    out_file.write(decompressor.decompress(chunk))
+                if hasattr(decompressor, "flush"):
+                    out_file.write(decompressor.flush())
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def stage(self, problem: str) -> str:
+        """Directory with in/ and out/ of the problem in the staging area, ready to be mounted.
+
+        The directory is kept until release, every stage needs its release.
+        """
+        manifest = self.manifest(problem)
+        key = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+        def fill(tmp: str):
+            for d in ["in", "out"] + (["checker"] if any(name.startswith("checker/") for name in manifest) else []):
+                os.makedirs(f"{tmp}/{d}", mode=0o755)
+            for name, sha in manifest.items():
+                #the same content in many tests or problems is kept in RAM once
+                os.link(self.stage_object(sha), f"{tmp}/{name}")
+
+        with self.lock:
+            path = atomic_dir(f"{self.stage_root}/sets/{key}", fill)
+            self.users[path] = self.users.get(path, 0) + 1
+            #the modification time orders the sets for eviction
+            os.utime(path)
+            self.evict()
+            return path
+
+    def release(self, path: str):
+        """The job no longer uses the staged set, it may be evicted."""
+        with self.lock:
+            self.users[path] -= 1
+            if self.users[path] == 0:
+                del self.users[path]
+            self.evict()
+
+    def collect(self) -> int:
+        """Removes the staged objects no set links to, returns the size of the others."""
+        size = 0
+        objects_dir = f"{self.stage_root}/objects"
+        for name in os.listdir(objects_dir) if os.path.isdir(objects_dir) else []:
+            st = os.stat(f"{objects_dir}/{name}")
+            #the temporary files are objects being decompressed
+            if st.st_nlink == 1 and not name.startswith("tmp"):
+                os.remove(f"{objects_dir}/{name}")
+            else:
+                size += st.st_size
+        return size
+
+    def evict(self):
+        """Removes the least recently used sets not in use until the staging directory fits in stage_size."""
+        size = self.collect()
+        if size <= self.stage_size:
+            return
+        sets_dir = f"{self.stage_root}/sets"
+        sets = [f"{sets_dir}/{key}" for key in os.listdir(sets_dir) if not key.startswith(".tmp-")]
+        for path in sorted(sets, key=lambda path: os.stat(path).st_mtime):
+            if size <= self.stage_size:
+                break
+            if path in self.users:
+                continue
+            shutil.rmtree(path)
+            size = self.collect()
+
+def main():
+    if STORE is None or sys.argv[1:2] not in [["add"], ["stage"]] or len(sys.argv) != (4 if sys.argv[1] == "add" else 3):
+        print("usage: STORE=dir store.py add PROBLEM TESTS_DIR | stage PROBLEM", file=sys.stderr)
+        sys.exit(1)
+    store = DataStore(STORE)
+    if sys.argv[1] == "add":
+        manifest = store.add(sys.argv[2], sys.argv[3])
+        print(f"{sys.argv[2]}: {len(manifest)} files, {len(set(manifest.values()))} unique")
+    else:
+        print(store.stage(sys.argv[2]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from backends import BACKENDS
+from manifest import MANIFEST_FILE, load_manifest, manifest_results, test_key
+from store import STORE, DataStore, atomic_dir
+from metrics import Metrics, Trace, record_tests
+from scheduler import Rejected, Scheduler
+from results_db import RESULTS_DB, ResultsDB
+
+logger = logging.getLogger("WORKER")
+
+SOCKET = os.getenv("SOCKET", "/tmp/stos-worker.sock")
+BACKEND = os.getenv("BACKEND", "docker")
+#0 is one per core, the scheduler decides how many of them really run
+WORKERS = int(os.getenv("WORKERS") or 0)
+CACHE = os.getenv("CACHE")
+METRICS = os.getenv("METRICS")
+TRACE = os.getenv("TRACE")
+#compiled checkers of the problems, by the hash of their sources
+CHECKERS = os.getenv("CHECKERS") or f"{tempfile.gettempdir()}/stos-checkers"
+
+def read_json(path: str, default: Optional[dict] = None) -> Optional[dict]:
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+def collect_results(exec_out: str) -> dict:
+    """Judge records of the manifest (also written in the fused mode), or the older per-test files."""
+    results = manifest_results(f"{exec_out}/{MANIFEST_FILE}")
+    if results is not None:
+        return results
+    results = read_json(f"{exec_out}/results.json")
+    if results is not None:
+        return results
+    tests = []
+    names = [file.split('.')[0] for file in os.listdir(exec_out) if file.endswith('.judge.json')]
+    for name in sorted(names, key=test_key):
+        tests.append({"name": name, **read_json(f"{exec_out}/{name}.judge.json", {"grade": 0, "info": "no judge result"})})
+    return {"points": sum(test["grade"] for test in tests), "tests": tests}
+
+def collect_exec(exec_out: str) -> dict:
+    records = load_manifest(f"{exec_out}/{MANIFEST_FILE}")["exec"]
+    if records:
+        return records
+    return {file.split('.')[0]: read_json(f"{exec_out}/{file}") for file in os.listdir(exec_out) if file.endswith('.exec.json')}
+
+class Worker:
+    """Takes jobs from the queue and runs compile, exec and judge on the backend.
+
+    A job is a dict with comp_in (sources), tests (directory with in/ and out/)
+    or problem (test set of the store) and optionally id, language, work_dir
+    and env (passed to exec and judge). Tests with a checker/ directory are
+    judged by that checker, compiled once per problem. A batch job has submissions (list of
+    dicts with id, comp_in and language) instead of comp_in, all of them are
+    run against the tests in one exec stage. The order and the cores of the
+    jobs are decided by the scheduler from priority, owner, cores and
+    memory_limit of the job.
+    """
+
+    def __init__(self, backend, workers: int = 0, store: Optional[DataStore] = None, metrics_path: Optional[str] = METRICS, trace_dir: Optional[str] = TRACE, scheduler: Optional[Scheduler] = None, checkers_dir: str = CHECKERS, results_db: Optional[ResultsDB] = None):
+        self.backend = backend
+        self.results_db = results_db
+        self.checkers_dir = checkers_dir
+        self.store = store
+        self.metrics = Metrics()
+        self.metrics_path = metrics_path
+        self.trace_dir = trace_dir
+        self.scheduler = scheduler or Scheduler()
+        self.threads = [threading.Thread(target=self.loop, daemon=True) for _ in range(max(1, workers or len(self.scheduler.cpus)))]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, job: dict, events: "queue.Queue"):
+        """Queues the job, the events are put into events and None at the end."""
+        job.setdefault("id", uuid.uuid4().hex)
+        job["submit_time"] = time.time()
+        try:
+            self.scheduler.submit(job, events)
+        except Rejected as e:
+            self.metrics.inc("stos_submissions_total", result="rejected")
+            events.put({"id": job["id"], "stage": "error", "info": str(e)})
+            events.put(None)
+
+    def loop(self):
+        while True:
+            job, events, cpus = self.scheduler.acquire()
+            try:
+                self.run(job, events.put, cpus)
+            except Exception as e:
+                logger.exception(f"job {job['id']} failed")
+                events.put({"id": job["id"], "stage": "error", "info": str(e)})
+            finally:
+                self.scheduler.release(job)
+                events.put(None)
+
+    def stage_span(self, trace: Trace, stage: str, start_time: float) -> float:
+        duration = time.time() - start_time
+        self.metrics.observe("stos_stage_seconds", duration, stage=stage)
+        trace.span(stage, start_time, duration)
+        return round(duration, 4)
+
+    def export(self, trace: Trace):
+        if self.metrics_path:
+            self.metrics.write(self.metrics_path)
+        if self.trace_dir:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            trace.write(f"{self.trace_dir}/{os.path.basename(str(trace.job_id))}.json")
+
+    def record(self, job: dict, submission_id: str, exec_out: str, result: str, language: Optional[str] = None):
+        """Adds the finished submission to the results history, in one transaction."""
+        if self.results_db is None:
+            return
+        try:
+            self.results_db.ingest(submission_id, f"{exec_out}/{MANIFEST_FILE}", job.get("problem") or job.get("tests"), job.get("owner"), language, result, job["submit_time"])
+        except Exception:
+            logger.exception(f"submission {submission_id} was not added to the results history")
+
+    def prepare_checker(self, job: dict) -> Tuple[Optional[str], Dict[str, str]]:
+        """The compiled checker of the tests (sources in their checker/ directory) and the env of the stages.
+
+        The checker is compiled once and kept by the hash of its sources, all
+        later jobs of the problem reuse the binary.
+        """
+        env = dict(job.get("env") or {})
+        if env.get("COMPARE", "lines") != "lines":
+            #the fused mode compares lines only, the other modes need the judge stage
+            env.pop("FUSED", None)
+        src = f"{job['tests']}/checker"
+        if not os.path.isdir(src):
+            return None, env
+        #the fused mode compares with the answer in exec, a checker needs the judge stage
+        env.pop("FUSED", None)
+        language = "python" if os.path.exists(f"{src}/main.py") else "cpp"
+        sha = hashlib.sha256(language.encode())
+        for name in sorted(os.listdir(src)):
+            if os.path.isfile(f"{src}/{name}"):
+                with open(f"{src}/{name}", "rb") as source_file:
+                    content = source_file.read()
+                sha.update(f"{name}\0{len(content)}\0".encode())
+                sha.update(content)
+
+        def fill(tmp: str):
+            os.chmod(tmp, 0o777)
+            self.backend.compile(src, tmp, language)
+            comp = read_json(f"{tmp}/comp.json", {"return_code": -1})
+            if comp["return_code"] != 0:
+                raise RuntimeError(f"checker compilation failed with return code {comp['return_code']}")
+
+        return atomic_dir(f"{self.checkers_dir}/{sha.hexdigest()}", fill), env
+
+    def run(self, job: dict, emit: Callable[[dict], None], cpus: Optional[List[int]] = None):
+        if "submissions" in job:
+            return self.run_batch(job, emit, cpus)
+        job_id = job["id"]
+        keep = "work_dir" in job
+        work_dir = job.get("work_dir") or tempfile.mkdtemp(prefix="stos-")
+        comp_out = f"{work_dir}/comp-out"
+        exec_out = f"{work_dir}/exec-out"
+        for d in [comp_out, exec_out]:
+            os.makedirs(d, exist_ok=True)
+            #the containers run as other users
+            os.chmod(d, 0o777)
+        trace = Trace(job_id)
+        started = time.time()
+        self.metrics.observe("stos_queue_wait_seconds", started - job["submit_time"])
+        trace.span("queue", job["submit_time"], started - job["submit_time"])
+        emit({"id": job_id, "stage": "start", "queue_time": round(started - job["submit_time"], 4), "cpus": cpus})
+
+        result = "error"
+        staged = None
+        try:
+            if "tests" not in job:
+                #decompressed into RAM on the first job of the problem only
+                job["tests"] = staged = self.store.stage(job["problem"])
+            checker, env = self.prepare_checker(job)
+
+            #compiling
+
+            start_time = time.time()
+            self.backend.compile(job["comp_in"], comp_out, job.get("language", "cpp"), cpus)
+            comp = read_json(f"{comp_out}/comp.json", {"return_code": -1})
+            emit({"id": job_id, "stage": "comp", "time": self.stage_span(trace, "compile", start_time), "result": comp})
+            if comp["return_code"] != 0:
+                result = "compile_error"
+                emit({"id": job_id, "stage": "done", "points": 0, "info": f"compilation failed with return code {comp['return_code']}"})
+                return
+
+            #running
+
+            start_time = time.time()
+            self.backend.execute(job["tests"], comp_out, exec_out, env, cpus)
+            emit({"id": job_id, "stage": "exec", "time": self.stage_span(trace, "exec", start_time), "result": collect_exec(exec_out)})
+
+            #judging
+
+            start_time = time.time()
+            if env.get("FUSED") != "on":
+                self.backend.judge(job["tests"], exec_out, env, cpus, checker)
+            results = collect_results(exec_out)
+            emit({"id": job_id, "stage": "judge", "time": self.stage_span(trace, "judge", start_time), "result": results})
+            emit({"id": job_id, "stage": "done", "points": results["points"]})
+            result = "ok"
+        finally:
+            self.metrics.inc("stos_submissions_total", result=result)
+            record_tests(self.metrics, trace, load_manifest(f"{exec_out}/{MANIFEST_FILE}"))
+            self.record(job, job_id, exec_out, result, job.get("language", "cpp"))
+            trace.span("submission", started, time.time() - started, result=result)
+            self.export(trace)
+            if staged:
+                self.store.release(staged)
+            if not keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    def run_batch(self, job: dict, emit: Callable[[dict], None], cpus: Optional[List[int]] = None):
+        """Compiles the submissions one by one, runs all of them in one exec stage and judges each."""
+        keep = "work_dir" in job
+        work_dir = job.get("work_dir") or tempfile.mkdtemp(prefix="stos-")
+        trace = Trace(job["id"])
+        started = time.time()
+        self.metrics.observe("stos_queue_wait_seconds", started - job["submit_time"])
+        trace.span("queue", job["submit_time"], started - job["submit_time"])
+        emit({"id": job["id"], "stage": "start", "queue_time": round(started - job["submit_time"], 4), "submissions": len(job["submissions"]), "cpus": cpus})
+
+        staged = None
+        try:
+            if "tests" not in job:
+                job["tests"] = staged = self.store.stage(job["problem"])
+            checker, env = self.prepare_checker(job)
+
+            #compiling, the directories are named by the position, the ids can be anything
+
+            compiled = []
+            for i, submission in enumerate(job["submissions"]):
+                submission.setdefault("id", uuid.uuid4().hex)
+                comp_out = f"{work_dir}/s{i}/comp-out"
+                exec_out = f"{work_dir}/s{i}/exec-out"
+                for d in [comp_out, exec_out]:
+                    os.makedirs(d, exist_ok=True)
+                    os.chmod(d, 0o777)
+                start_time = time.time()
+                self.backend.compile(submission["comp_in"], comp_out, submission.get("language", "cpp"), cpus)
+                comp = read_json(f"{comp_out}/comp.json", {"return_code": -1})
+                emit({"id": submission["id"], "stage": "comp", "time": self.stage_span(trace, "compile", start_time), "result": comp})
+                if comp["return_code"] != 0:
+                    self.metrics.inc("stos_submissions_total", result="compile_error")
+                    self.record(job, submission["id"], exec_out, "compile_error", submission.get("language", "cpp"))
+                    emit({"id": submission["id"], "stage": "done", "points": 0, "info": f"compilation failed with return code {comp['return_code']}"})
+                    continue
+                compiled.append((f"s{i}", comp_out, exec_out, submission["id"], submission.get("language", "cpp")))
+
+            #running, one container for the whole batch
+
+            if compiled:
+                start_time = time.time()
+                self.backend.execute_batch(job["tests"], [(key, comp_out, exec_out) for key, comp_out, exec_out, _, _ in compiled], env, cpus)
+                exec_time = self.stage_span(trace, "exec", start_time)
+
+            #judging
+
+            for _, _, exec_out, submission_id, language in compiled:
+                emit({"id": submission_id, "stage": "exec", "time": exec_time, "result": collect_exec(exec_out)})
+                start_time = time.time()
+                if env.get("FUSED") != "on":
+                    self.backend.judge(job["tests"], exec_out, env, cpus, checker)
+                results = collect_results(exec_out)
+                emit({"id": submission_id, "stage": "judge", "time": self.stage_span(trace, "judge", start_time), "result": results})
+                emit({"id": submission_id, "stage": "done", "points": results["points"]})
+                self.metrics.inc("stos_submissions_total", result="ok")
+                record_tests(self.metrics, trace, load_manifest(f"{exec_out}/{MANIFEST_FILE}"))
+                self.record(job, submission_id, exec_out, "ok", language)
+            emit({"id": job["id"], "stage": "batch_done", "submissions": len(job["submissions"]), "time": round(time.time() - started, 4)})
+        finally:
+            trace.span("batch", started, time.time() - started, submissions=len(job["submissions"]))
+            self.export(trace)
+            if staged:
+                self.store.release(staged)
+            if not keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+class Handler(socketserver.StreamRequestHandler):
+    """One job per connection: a json line in, json lines with the events out."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        events: "queue.Queue" = queue.Queue()
+        self.server.worker.submit(json.loads(line), events)
+        while (event := events.get()) is not None:
+            self.wfile.write((json.dumps(event) + "\n").encode())
+            self.wfile.flush()
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, worker: Worker):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, Handler)
+        self.worker = worker
+
+def submit(job: dict, socket_path: str = SOCKET) -> Iterator[dict]:
+    """Sends the job to the worker and yields the events as they come."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(job) + "\n").encode())
+        with client.makefile("r") as events:
+            for line in events:
+                yield json.loads(line)
+
+def main():
+    #logging
+    logging.basicConfig(
+        level=logging.DEBUG if os.environ.get("LOGS")=="on" else logging.ERROR,
+        format="[%(name)s] %(levelname)s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    worker = Worker(BACKENDS[BACKEND](logs=os.environ.get("LOGS")=="on", cache=CACHE), WORKERS, DataStore(STORE) if STORE else None, results_db=ResultsDB(RESULTS_DB) if RESULTS_DB else None)
+    worker.start()
+    with Server(SOCKET, worker) as server:
+        logger.info(f"listening on {SOCKET}, backend: {BACKEND}, workers: {len(worker.threads)}, cpus: {worker.scheduler.cpus}")
+        server.serve_forever()
+
+if __name__ == "__main__":
+    main()
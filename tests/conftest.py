@@ -0,0 +1,8 @@
+import os
+import sys
+
+#Moduły wspólne z src/common: na ścieżce importu testów i w PYTHONPATH
+#etapów uruchamianych przez testy jako procesy (python main.py).
+COMMON_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/common"))
+sys.path.insert(0, COMMON_DIR)
+os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [COMMON_DIR, os.environ.get("PYTHONPATH")]))
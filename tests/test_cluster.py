@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import threading
+import subprocess
+import pytest
+
+WORKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/worker"))
+sys.path.insert(0, WORKER_DIR)
+import cluster
+from backends import LocalBackend
+
+EXAMPLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/example/comp-in"))
+
+
+def test_task_queue_stealing():
+    # zadania trafiają do najkrótszych kolejek, bezczynny węzeł kradnie z końca cudzej
+    tasks = cluster.TaskQueue()
+    tasks.join("a")
+    tasks.join("b")
+    tasks.put([{"id": i} for i in range(4)])
+    assert [tasks.take("a")["id"] for _ in range(3)] == [0, 2, 3]
+    assert tasks.stolen == 1
+    tasks.join("c")
+    tasks.leave("b")
+    # zadania węzła, który odszedł, przejmują pozostałe
+    assert tasks.take("c")["id"] == 1
+    assert tasks.next("a", timeout=0.05) is None
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    coordinator = cluster.Coordinator(LocalBackend(), task_tests=2, objects_dir=str(tmp_path / "objects"))
+    server = cluster.Server(("127.0.0.1", 0), coordinator, "sekret")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield coordinator, f"127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="brak g++")
+def test_cluster(tmp_path, coordinator):
+    # trzy procesy węzłów na localhost, wyniki testów wracają do jednego results.jsonl
+    coordinator, address = coordinator
+    nodes = []
+    for i in range(3):
+        env = dict(os.environ, CLUSTER_TOKEN="sekret", COORDINATOR=address, BACKEND="local", NODE_NAME=f"n{i}", NODE_CACHE=str(tmp_path / f"n{i}"), WORKERS="1")
+        nodes.append(subprocess.Popen([sys.executable, "cluster.py", "node"], cwd=WORKER_DIR, env=env))
+    try:
+        comp_in = tmp_path / "comp-in"
+        comp_in.mkdir()
+        for fname in ["main.cpp", "add.cpp", "add.h"]:
+            shutil.copy(os.path.join(EXAMPLE_DIR, fname), comp_in / fname)
+        tests = tmp_path / "tests"
+        (tests / "in").mkdir(parents=True)
+        (tests / "out").mkdir()
+        for i in range(12):
+            (tests / "in" / f"{i}.in").write_text(f"{i}\n" + "1\n" * i)
+            (tests / "out" / f"{i}.out").write_text(f"{i}\n" if i != 5 else "0\n")
+        (tests / "in" / "config.json").write_text(json.dumps({"groups": {"a": {"tests": ["0", "1", "2", "3", "4", "5"], "points": 50}, "b": {"tests": ["6", "7", "8", "9", "10", "11"], "points": 50}}}))
+        # wszystkie węzły połączone, zanim przyjdzie zgłoszenie
+        deadline = time.time() + 30
+        while len(coordinator.tasks.connections) < 3:
+            assert time.time() < deadline
+            time.sleep(0.05)
+        job = {"id": "job1", "comp_in": str(comp_in), "tests": str(tests), "work_dir": str(tmp_path / "work")}
+        events = list(cluster.submit(job, address, "sekret"))
+        assert [event["stage"] for event in events if event["stage"] != "test"] == ["start", "comp", "judge", "done"]
+        assert events[-1]["points"] == 50
+        judge = events[-2]["result"]
+        assert [test["grade"] for test in judge["tests"]] == [1] * 5 + [0] + [1] * 6
+        records = [event["record"] for event in events if event["stage"] == "test"]
+        assert sorted(record["test"] for record in records if record["stage"] == "exec") == sorted(str(i) for i in range(12))
+        assert len({record["node"] for record in records}) >= 2
+        manifest = [json.loads(line) for line in (tmp_path / "work" / "exec-out" / "results.jsonl").read_text().splitlines()]
+        assert manifest[-1]["stage"] == "judge_end" and [group["points"] for group in manifest[-1]["groups"]] == [0, 50]
+        # dane testów w pamięci podręcznej węzłów, według skrótu
+        cached = {name for i in range(3) if (tmp_path / f"n{i}" / "objects").exists() for d in (tmp_path / f"n{i}" / "objects").iterdir() for name in os.listdir(d)}
+        assert cluster.digest(str(tests / "in" / "7.in")) in cached
+        # po zakończeniu oceny koordynator nie trzyma już plików zgłoszenia
+        assert coordinator.objects == {} and os.listdir(tmp_path / "objects") == []
+    finally:
+        for node in nodes:
+            node.kill()
+            node.wait()
+
+
+def request(address, *messages):
+    host, port = cluster.address(address)
+    connection = socket.create_connection((host, port))
+    for message in messages:
+        connection.sendall((json.dumps(message) + "\n").encode())
+    with connection.makefile("rb") as response:
+        line = response.readline()
+    connection.close()
+    return json.loads(line) if line else None
+
+
+def test_cluster_access(tmp_path, coordinator):
+    coordinator, address = coordinator
+    with pytest.raises(ValueError):
+        cluster.Server(("127.0.0.1", 0), coordinator, None)
+    answer = tmp_path / "0.out"
+    answer.write_text("42\n")
+    coordinator.add_object(cluster.digest(str(answer)), str(answer))
+    # bez tokenu lub z błędnym połączenie jest zamykane
+    assert request(address, {"op": "submit", "comp_in": "/", "tests": "/"}) is None
+    assert request(address, {"op": "hello", "token": "zły", "node": "x"}, {"op": "next"}) is None
+    # węzeł bez zadania nie pobierze odpowiedzi
+    assert request(address, {"op": "hello", "token": "sekret", "node": "x"}, {"op": "get", "sha": cluster.digest(str(answer))}) == {"size": -1}
+
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="brak g++")
+def test_cluster_no_nodes(tmp_path):
+    # bez węzłów zgłoszenie kończy się błędem po JOB_TIMEOUT, a zadania znikają z kolejki
+    coordinator = cluster.Coordinator(LocalBackend(), task_tests=2, objects_dir=str(tmp_path / "objects"), job_timeout=0.5)
+    comp_in = tmp_path / "comp-in"
+    comp_in.mkdir()
+    for fname in ["main.cpp", "add.cpp", "add.h"]:
+        shutil.copy(os.path.join(EXAMPLE_DIR, fname), comp_in / fname)
+    tests = tmp_path / "tests"
+    (tests / "in").mkdir(parents=True)
+    (tests / "out").mkdir()
+    for i in range(3):
+        (tests / "in" / f"{i}.in").write_text(f"{i}\n")
+        (tests / "out" / f"{i}.out").write_text(f"{i}\n")
+    events = []
+    coordinator.run({"id": "job1", "comp_in": str(comp_in), "tests": str(tests)}, events.append)
+    assert [event["stage"] for event in events] == ["start", "comp", "error"]
+    assert "0.5s" in events[-1]["info"]
+    assert not coordinator.tasks.shared and coordinator.jobs == {} and coordinator.objects == {}
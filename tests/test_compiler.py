@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import shutil
+import subprocess
+import pytest
+
+COMPILER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/compilers/cpp-compiler"))
+EXAMPLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/example/comp-in"))
+
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None, reason="brak g++")
+
+
+def run_local_compiler(tmp_path, in_dir, cache_dir):
+    """Uruchamia kompilator lokalnie, bez dockera, z nowym katalogiem wyjściowym."""
+    out_dir = tmp_path / f"out{len(list(tmp_path.glob('out*')))}"
+    work_dir = tmp_path / f"work{len(list(tmp_path.glob('work*')))}"
+    for d in [out_dir, work_dir / "bin", work_dir / "out"]:
+        d.mkdir(parents=True)
+    env = dict(os.environ, SRC=str(in_dir), OUT=str(out_dir), BIN=str(out_dir), CACHE=str(cache_dir),
+               SRC_TMP=str(work_dir / "src"), BIN_TMP=str(work_dir / "bin"), OUT_TMP=str(work_dir / "out"))
+    subprocess.run([sys.executable, "main.py"], cwd=COMPILER_DIR, env=env, check=True)
+    with open(out_dir / "comp.json") as f:
+        return json.load(f), out_dir
+
+
+@pytest.fixture
+def in_dir(tmp_path):
+    in_dir = tmp_path / "in"
+    in_dir.mkdir()
+    for fname in ["main.cpp", "add.cpp", "add.h"]:
+        shutil.copy(os.path.join(EXAMPLE_DIR, fname), in_dir / fname)
+    return in_dir
+
+
+def test_compiler_cache_hit(tmp_path, in_dir):
+    cache_dir = tmp_path / "cache"
+    meta, out_dir = run_local_compiler(tmp_path, in_dir, cache_dir)
+    assert meta == {"return_code": 0}
+    meta, cached_out_dir = run_local_compiler(tmp_path, in_dir, cache_dir)
+    assert meta == {"return_code": 0, "cached": True}
+    # ten sam plik binarny i te same ostrzeżenia
+    assert (out_dir / "program").read_bytes() == (cached_out_dir / "program").read_bytes()
+    assert os.access(cached_out_dir / "program", os.X_OK)
+    assert (out_dir / "comp.txt").read_text() == (cached_out_dir / "comp.txt").read_text()
+    assert "neverUsed" in (cached_out_dir / "comp.txt").read_text()
+
+
+def test_compiler_object_cache(tmp_path, in_dir):
+    cache_dir = tmp_path / "cache"
+    run_local_compiler(tmp_path, in_dir, cache_dir)
+    objects = set(os.listdir(cache_dir / "obj"))
+    # zmiana jednego pliku .cpp kompiluje tylko ten plik
+    with open(in_dir / "add.cpp", "a") as f:
+        f.write("\nint unused_global;\n")
+    meta, out_dir = run_local_compiler(tmp_path, in_dir, cache_dir)
+    assert meta == {"return_code": 0}
+    assert len(set(os.listdir(cache_dir / "obj")) - objects) == 2  # .o i .txt dla add.cpp
+    assert subprocess.run([str(out_dir / "program")], input=b"2\n1\n2\n", capture_output=True).stdout == b"3\n"
+
+
+def test_compiler_cached_error(tmp_path, in_dir):
+    cache_dir = tmp_path / "cache"
+    with open(in_dir / "main.cpp", "a") as f:
+        f.write("\nthis_is_not_valid_cpp_code\n")
+    meta, _ = run_local_compiler(tmp_path, in_dir, cache_dir)
+    assert meta["return_code"] != 0
+    meta, out_dir = run_local_compiler(tmp_path, in_dir, cache_dir)
+    assert meta["return_code"] != 0 and meta["cached"]
+    assert "this_is_not_valid_cpp_code" in (out_dir / "comp.txt").read_text()
+    assert not (out_dir / "program").exists()
@@ -116,7 +116,7 @@ def run_pipeline(comp_in, comp_out, exec_in, exec_out, answer_out, build=False):
         "--network", "none",
         "--security-opt", "no-new-privileges",
         "-e", "LOGS=on",
-        "-v", f"{exec_out}:/data/in:ro",
+        "-v", f"{exec_out}:/data/in",
         "-v", f"{exec_out}:/data/out",
         "-v", f"{exec_in}/out:/data/answer:ro",
         "judge"
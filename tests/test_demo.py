@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import shutil
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/example")))
+import demo
+from manifest import MANIFEST_FILE, load_manifest
+
+EXAMPLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/example/comp-in"))
+
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None, reason="brak g++")
+
+
+def submission(tmp_path, name, code=None):
+    comp_in = tmp_path / name / "comp-in"
+    comp_in.mkdir(parents=True)
+    for fname in ["main.cpp", "add.cpp", "add.h"]:
+        shutil.copy(os.path.join(EXAMPLE_DIR, fname), comp_in / fname)
+    if code is not None:
+        (comp_in / "main.cpp").write_text(code)
+    return {
+        "name": name,
+        "comp_in": str(comp_in),
+        "comp_out": str(tmp_path / name / "comp-out"),
+        "cache": str(tmp_path / "cache"),
+        "exec_in": str(tmp_path / "tests"),
+        "exec_out": str(tmp_path / name / "exec-out"),
+    }
+
+
+@pytest.fixture
+def tests_dir(tmp_path):
+    (tmp_path / "tests" / "in").mkdir(parents=True)
+    (tmp_path / "tests" / "out").mkdir()
+    for i in range(4):
+        (tmp_path / "tests" / "in" / f"{i}.in").write_text(f"{i}\n" + "1\n" * i)
+        (tmp_path / "tests" / "out" / f"{i}.out").write_text(f"{i}\n" if i != 2 else "7\n")
+
+
+def test_pipeline(tmp_path, tests_dir):
+    # błąd kompilacji zatrzymuje tylko swoje zgłoszenie, bez uruchamiania exec i judge
+    submissions = [submission(tmp_path, "a"), submission(tmp_path, "b", "int main() { return }\n"), submission(tmp_path, "c")]
+    results = asyncio.run(demo.run_pipeline(submissions, logs=False, local=True))
+    assert results[1] == {"points": 0, "tests": [], "info": "compilation failed with return code 1"}
+    assert not os.path.exists(tmp_path / "b" / "exec-out")
+    for result in [results[0], results[2]]:
+        assert result["points"] == 3
+        assert [test["grade"] for test in result["tests"]] == [1, 1, 0, 1]
+    stages = [json.loads(line)["stage"] for line in (tmp_path / "a" / "exec-out" / MANIFEST_FILE).read_text().splitlines()]
+    assert stages.count("judge") == 4 and stages[-1] == "judge_end"
+
+
+def test_pipeline_stale_manifest(tmp_path, tests_dir):
+    # wyniki poprzedniego uruchomienia nie są oceniane ponownie
+    sub = submission(tmp_path, "a")
+    os.makedirs(sub["exec_out"])
+    (tmp_path / "a" / "exec-out" / MANIFEST_FILE).write_text(json.dumps({"stage": "exec", "test": "9", "verdict": "OK", "return_code": 0}) + "\n")
+    result = asyncio.run(demo.run_pipeline([sub], logs=False, local=True))[0]
+    assert [test["name"] for test in result["tests"]] == ["0", "1", "2", "3"]
+    assert set(load_manifest(f"{sub['exec_out']}/{MANIFEST_FILE}")["judge"]) == {"0", "1", "2", "3"}
@@ -0,0 +1,446 @@
+import os
+import sys
+import json
+import shutil
+import subprocess
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/exec-python")))
+import exec
+import stream
+import timing
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/judge")))
+import comparator
+
+EXEC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/exec-python"))
+PYTHON_COMPILER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/compilers/python-compiler"))
+
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None, reason="brak g++")
+
+
+@pytest.fixture
+def exec_env(tmp_path, monkeypatch):
+    """Przygotowuje katalogi /data/* lokalnie, bez dockera."""
+    for d in ["in", "bin", "out"]:
+        (tmp_path / d).mkdir()
+    monkeypatch.setenv("IN", str(tmp_path / "in"))
+    monkeypatch.setenv("BIN", str(tmp_path / "bin"))
+    monkeypatch.setenv("OUT", str(tmp_path / "out"))
+    monkeypatch.setenv("STD", str(tmp_path / "out"))
+    return tmp_path
+
+
+def build(tmp_path, code, stdin="1\n"):
+    with open(tmp_path / "main.cpp", "w") as f:
+        f.write(code)
+    subprocess.run(["g++", "-O2", "-o", str(tmp_path / "bin" / "program"), str(tmp_path / "main.cpp")], check=True)
+    with open(tmp_path / "in" / "0.in", "w") as f:
+        f.write(stdin)
+
+
+def run(tmp_path, limits):
+    meta = exec.run("0", limits)
+    with open(tmp_path / "out" / "0.exec.json") as f:
+        assert json.load(f) == meta
+    return meta
+
+
+def test_exec_ok(exec_env):
+    build(exec_env, "#include <iostream>\nint main() { int n; std::cin >> n; std::cout << n; }\n", "7\n")
+    meta = run(exec_env, exec.load_limits())
+    assert meta["verdict"] == "OK", meta
+    assert (exec_env / "out" / "0.stdout.out").read_text() == "7"
+
+
+def test_exec_wall_time_limit(exec_env):
+    # program śpi, więc limit czasu CPU nie zadziała
+    build(exec_env, "#include <unistd.h>\nint main() { sleep(30); }\n")
+    limits = dict(exec.load_limits(), wall_time_limit=0.5)
+    meta = run(exec_env, limits)
+    assert meta["verdict"] == "TLE", meta
+    assert meta["return_code"] != 0
+
+
+def test_exec_cpu_time_limit(exec_env):
+    build(exec_env, "int main() { volatile int x = 0; while(1) { x++; } }\n")
+    meta = run(exec_env, dict(exec.load_limits(), time_limit=1))
+    assert meta["verdict"] == "TLE", meta
+
+
+def test_exec_output_limit(exec_env):
+    build(exec_env, "#include <cstdio>\nint main() { while(1) { puts(\"spam\"); } }\n")
+    meta = run(exec_env, dict(exec.load_limits(), output_limit=64))
+    assert meta["verdict"] == "OLE", meta
+    assert os.path.getsize(exec_env / "out" / "0.stdout.out") <= 64 * 1024
+
+
+def test_exec_memory_limit(exec_env):
+    code = "#include <vector>\n#include <cstring>\nint main() { std::vector<char*> v; while(1) { char* p = new char[1 << 20]; memset(p, 1, 1 << 20); v.push_back(p); } }\n"
+    build(exec_env, code)
+    meta = run(exec_env, dict(exec.load_limits(), memory_limit=64 * 1024))
+    assert meta["verdict"] == "MLE", meta
+
+
+def test_exec_memory_limit_single_allocation(exec_env):
+    # alokacja ponad limit przestrzeni adresowej kończy się od razu, przy małym rss
+    build(exec_env, "#include <vector>\n#include <cstdio>\nint main() { std::vector<int> v(150 << 20); printf(\"%d\", v[5]); }\n")
+    meta = run(exec_env, exec.load_limits())
+    assert meta["return_code"] == -6 and meta["memory"] < exec.LIMITS["memory_limit"]
+    assert meta["verdict"] == "MLE", meta
+    # zwykłe abort() zostaje błędem wykonania
+    build(exec_env, "#include <cstdlib>\nint main() { abort(); }\n")
+    assert run(exec_env, exec.load_limits())["verdict"] == "RE"
+
+
+def test_exec_runtime_error(exec_env):
+    build(exec_env, "int main() { return 3; }\n")
+    meta = run(exec_env, exec.load_limits())
+    assert meta["verdict"] == "RE", meta
+    assert meta["return_code"] == 3
+
+
+def test_exec_config(exec_env):
+    with open(exec_env / "in" / "config.json", "w") as f:
+        json.dump({"time_limit": 1, "tests": {"0": {"memory_limit": 1024}}}, f)
+    limits = exec.load_limits()
+    assert limits["time_limit"] == 1
+    assert exec.test_limits(limits, "0")["memory_limit"] == 1024
+    assert exec.test_limits(limits, "1")["memory_limit"] == exec.LIMITS["memory_limit"]
+
+
+def fused_env(exec_env, monkeypatch, answer):
+    (exec_env / "ans").mkdir()
+    monkeypatch.setenv("ANS", str(exec_env / "ans"))
+    with open(exec_env / "ans" / "0.out", "w") as f:
+        f.write(answer)
+
+
+def test_exec_fused_ok(exec_env, monkeypatch):
+    fused_env(exec_env, monkeypatch, "1\n2\n3\n")
+    build(exec_env, "#include <cstdio>\nint main() { printf(\"1\\n2\\n3\"); }\n")
+    meta = exec.run("0", exec.load_limits(), fused=True)
+    assert meta["verdict"] == "OK", meta
+    with open(exec_env / "out" / "0.judge.json") as f:
+        assert json.load(f) == {"grade": 1, "info": "ok"}
+    assert not (exec_env / "out" / "0.stdout.out").exists()
+
+
+def test_exec_fused_wrong_answer_early_abort(exec_env, monkeypatch):
+    # program wypisuje błędną linię i dalej śmieci, powinien zostać przerwany od razu
+    fused_env(exec_env, monkeypatch, "1\n")
+    build(exec_env, "#include <cstdio>\n#include <unistd.h>\nint main() { puts(\"2\"); fflush(stdout); sleep(30); }\n")
+    meta = exec.run("0", dict(exec.load_limits(), wall_time_limit=10), fused=True)
+    assert meta["verdict"] == "WA", meta
+    assert meta["user_time"] < 1
+    with open(exec_env / "out" / "0.judge.json") as f:
+        judge = json.load(f)
+    assert judge == {"grade": 0, "info": "line 1 column 1 is not correct: expected 1 but got 2"}
+
+
+def test_exec_fused_output_limit(exec_env, monkeypatch):
+    fused_env(exec_env, monkeypatch, "1\n")
+    build(exec_env, "#include <cstdio>\nint main() { puts(\"1\"); while(1) { fputs(\"spam\", stdout); } }\n")
+    meta = exec.run("0", dict(exec.load_limits(), output_limit=64), fused=True)
+    assert meta["verdict"] == "OLE", meta
+    with open(exec_env / "out" / "0.judge.json") as f:
+        assert json.load(f) == {"grade": 0, "info": "output limit exceeded"}
+
+
+def test_exec_fused_missing_lines(exec_env, monkeypatch):
+    fused_env(exec_env, monkeypatch, "1\n2\n")
+    build(exec_env, "#include <cstdio>\nint main() { puts(\"1\"); }\n")
+    exec.run("0", exec.load_limits(), fused=True)
+    with open(exec_env / "out" / "0.judge.json") as f:
+        assert json.load(f) == {"grade": 0, "info": "line 2 column 1 is not correct: expected 2 but got EOF"}
+
+
+@pytest.mark.parametrize("answer, output", [
+    (b"1\n2\n", b"1\n2"),
+    (b"1\n2\n", b" 1 \n2\n\n\n"),
+    (b"1\n22\n", b"1\n23\n"),
+    (b"1\n", b"1\n2\n"),
+    (b"1\n", b"1\n\n2\n"),
+    (b"1\n2\n", b"1\n"),
+    (b"1\n\n\n", b"1"),
+    (b"1\n\n2\n", b"1\n"),
+])
+def test_stream_judge_matches_comparator(tmp_path, answer, output):
+    # tryb FUSED musi dawać ten sam wynik co kontener judge
+    (tmp_path / "answer.out").write_bytes(answer)
+    (tmp_path / "output.out").write_bytes(output)
+    stream_judge = stream.StreamJudge(str(tmp_path / "answer.out"))
+    for i in range(len(output)):
+        if not stream_judge.feed(output[i:i + 1]):
+            break
+    result = stream_judge.finish()
+    stream_judge.close()
+    assert result == comparator.compare(str(tmp_path / "answer.out"), str(tmp_path / "output.out"), "lines")
+
+
+def test_exec_fused_other_compare(exec_env):
+    # StreamJudge porównuje linie, z innym COMPARE werdykt różniłby się od judge
+    build(exec_env, "int main() { return 0; }\n")
+    env = dict(os.environ, JSON_FILES="off", FUSED="on", ANS=str(exec_env), COMPARE="tokens")
+    process = subprocess.run([sys.executable, "main.py"], cwd=EXEC_DIR, env=env, capture_output=True, text=True)
+    assert process.returncode == 1
+    assert "COMPARE=tokens" in process.stderr
+    assert not (exec_env / "out" / "results.jsonl").exists()
+
+
+def test_exec_memfd(exec_env, monkeypatch):
+    # wejście i wyjście w pamięci, na dysk trafia tylko wyjście potrzebne do oceny
+    monkeypatch.setattr(exec, "IO", "memfd")
+    build(exec_env, "#include <iostream>\nint main() { int n; std::cin >> n; std::cout << n * 2; return n == 5; }\n", "21\n")
+    meta = run(exec_env, exec.load_limits())
+    assert meta["verdict"] == "OK", meta
+    assert (exec_env / "out" / "0.stdout.out").read_text() == "42"
+    (exec_env / "out" / "0.stdout.out").unlink()
+    (exec_env / "in" / "0.in").write_text("5\n")
+    assert run(exec_env, exec.load_limits())["verdict"] == "RE"
+    assert not (exec_env / "out" / "0.stdout.out").exists()
+    monkeypatch.setattr(exec, "DEBUG", True)
+    run(exec_env, exec.load_limits())
+    assert (exec_env / "out" / "0.stdout.out").read_text() == "10"
+
+
+def test_exec_memfd_limits(exec_env, monkeypatch):
+    monkeypatch.setattr(exec, "IO", "memfd")
+    build(exec_env, "#include <cstdio>\nint main() { while(1) { puts(\"spam\"); } }\n")
+    assert run(exec_env, dict(exec.load_limits(), output_limit=64))["verdict"] == "OLE"
+
+
+def test_exec_memfd_fused(exec_env, monkeypatch):
+    # w trybie FUSED wyjście jest zapisywane tylko przy błędnej odpowiedzi
+    monkeypatch.setattr(exec, "IO", "memfd")
+    fused_env(exec_env, monkeypatch, "1\n2\n")
+    build(exec_env, "#include <cstdio>\nint main() { printf(\"1\\n2\\n\"); }\n")
+    assert exec.run("0", exec.load_limits(), fused=True)["verdict"] == "OK"
+    assert not (exec_env / "out" / "0.stdout.out").exists()
+    (exec_env / "ans" / "0.out").write_text("1\n3\n")
+    assert exec.run("0", exec.load_limits(), fused=True)["verdict"] == "WA"
+    assert (exec_env / "out" / "0.stdout.out").read_text() == "1\n2\n"
+
+
+def test_exec_artifacts(exec_env, monkeypatch):
+    # zaliczony test: bez pełnego stderr, tylko początek i koniec, skompresowane i bez powtórzeń
+    import artifacts
+    from manifest import Manifest
+    monkeypatch.setattr(exec, "IO", "memfd")
+    fused_env(exec_env, monkeypatch, "1\n")
+    build(exec_env, "#include <cstdio>\nint main() { puts(\"1\"); for (int i = 0; i < 100000; i++) fputs(\"spam\\n\", stderr); }\n")
+    manifest = Manifest(str(exec_env / "out" / "results.jsonl"))
+    for _ in range(2):
+        assert exec.run("0", exec.load_limits(), fused=True, manifest=manifest)["verdict"] == "OK"
+    manifest.close()
+    assert not (exec_env / "out" / "0.stderr.out").exists()
+    records = [json.loads(line) for line in (exec_env / "out" / "results.jsonl").read_text().splitlines()]
+    refs = [record["artifacts"] for record in records if record["stage"] == "judge"]
+    assert refs[0] == refs[1]
+    # czas porównania w trakcie działania programu, jak w rekordach etapu judge
+    assert all(record["time"] >= 0 and record["output_bytes"] == 2 for record in records if record["stage"] == "judge")
+    assert refs[0]["stderr"]["bytes"] == 500000 and refs[0]["stderr"]["truncated"]
+    assert len(os.listdir(exec_env / "out" / "artifacts")) == 2
+    stderr = artifacts.read_artifact(str(exec_env / "out"), refs[0]["stderr"]["sha"])
+    assert len(stderr) < artifacts.HEAD + artifacts.TAIL + 64 and stderr.startswith(b"spam\n") and stderr.endswith(b"spam\n")
+    assert artifacts.read_artifact(str(exec_env / "out"), refs[0]["stdout"]["sha"]) == b"1\n"
+    # błędna odpowiedź: pełne stderr zostaje
+    (exec_env / "ans" / "0.out").write_text("2\n")
+    assert exec.run("0", exec.load_limits(), fused=True)["verdict"] == "WA"
+    assert os.path.getsize(exec_env / "out" / "0.stderr.out") == 500000
+
+
+def test_exec_stderr_bounded(exec_env):
+    # bez FUSED stderr też trafia najpierw do pamięci, pełny plik tylko po błędzie w exec
+    import artifacts
+    build(exec_env, "#include <cstdio>\nint main() { int n; scanf(\"%d\", &n); for (int i = 0; i < 100000; i++) fputs(\"spam\\n\", stderr); return n; }\n", "0\n")
+    meta = run(exec_env, exec.load_limits())
+    assert meta["verdict"] == "OK"
+    assert not (exec_env / "out" / "0.stderr.out").exists()
+    assert meta["artifacts"]["stderr"]["bytes"] == 500000 and meta["artifacts"]["stderr"]["truncated"]
+    assert "stdout" not in meta["artifacts"]
+    assert artifacts.read_artifact(str(exec_env / "out"), meta["artifacts"]["stderr"]["sha"]).startswith(b"spam\n")
+    (exec_env / "in" / "0.in").write_text("3\n")
+    assert run(exec_env, exec.load_limits())["verdict"] == "RE"
+    assert os.path.getsize(exec_env / "out" / "0.stderr.out") == 500000
+
+
+def test_exec_manifest(exec_env):
+    # bez plików {n}.exec.json, wszystkie wyniki w jednym results.jsonl
+    build(exec_env, "#include <iostream>\nint main() { int n; std::cin >> n; std::cout << n; return n; }\n", "0\n")
+    (exec_env / "in" / "1.in").write_text("1\n")
+    (exec_env / "out" / "results.jsonl").write_text("stary wpis\n")
+    env = dict(os.environ, JSON_FILES="off", WORKERS="2")
+    subprocess.run([sys.executable, "main.py"], cwd=EXEC_DIR, env=env, check=True)
+    records = [json.loads(line) for line in (exec_env / "out" / "results.jsonl").read_text().splitlines()]
+    assert records[-1]["stage"] == "exec_end" and records[-1]["tests"] == 2
+    verdicts = {record["test"]: record["verdict"] for record in records[:-1]}
+    assert verdicts == {"0": "OK", "1": "RE"}
+    assert not list((exec_env / "out").glob("*.exec.json"))
+
+
+def test_exec_batch(exec_env):
+    # dwa programy na tych samych testach w jednym uruchomieniu, wyniki osobno
+    build(exec_env, "#include <iostream>\nint main() { int n; std::cin >> n; std::cout << n; }\n", "3\n")
+    (exec_env / "in" / "1.in").write_text("4\n")
+    for submission, code in [("a", "int main() { return 0; }\n"), ("b", "int main() { return 2; }\n")]:
+        (exec_env / "bin" / submission).mkdir()
+        (exec_env / f"{submission}.cpp").write_text(code)
+        subprocess.run(["g++", "-o", str(exec_env / "bin" / submission / "program"), str(exec_env / f"{submission}.cpp")], check=True)
+    batch = {"submissions": [{"id": "main", "bin": str(exec_env / "bin")}, {"id": "a"}, {"id": "b"}]}
+    (exec_env / "batch.json").write_text(json.dumps(batch))
+    env = dict(os.environ, BATCH=str(exec_env / "batch.json"), JSON_FILES="off")
+    subprocess.run([sys.executable, "main.py"], cwd=EXEC_DIR, env=env, check=True)
+    for submission, verdict in [("main", "OK"), ("a", "OK"), ("b", "RE")]:
+        records = [json.loads(line) for line in (exec_env / "out" / submission / "results.jsonl").read_text().splitlines()]
+        assert {record["test"]: record["verdict"] for record in records if record["stage"] == "exec"} == {"0": verdict, "1": verdict}
+        assert records[-1]["stage"] == "exec_end"
+    assert (exec_env / "out" / "main" / "1.stdout.out").read_text() == "4"
+    assert (exec_env / "out" / "a" / "1.stdout.out").read_text() == ""
+
+
+def test_exec_fail_fast_groups(exec_env, monkeypatch):
+    # najmniejsze testy najpierw, po błędzie reszta grupy "all" jest pomijana
+    build(exec_env, "#include <iostream>\nint main() { int n; std::cin >> n; std::cout << n; return n; }\n", "0\n" + " " * 10)
+    (exec_env / "in" / "1.in").write_text("1\n" + " " * 100)
+    (exec_env / "in" / "2.in").write_text("0\n" + " " * 1000)
+    (exec_env / "in" / "3.in").write_text("0\n")
+    groups = {"a": {"tests": ["0", "3"], "points": 30}, "b": {"tests": ["1", "2"], "points": 70}}
+    (exec_env / "in" / "config.json").write_text(json.dumps({"groups": groups}))
+    env = dict(os.environ, JSON_FILES="off", WORKERS="1", FAIL_FAST="group")
+    subprocess.run([sys.executable, "main.py"], cwd=EXEC_DIR, env=env, check=True)
+    records = [json.loads(line) for line in (exec_env / "out" / "results.jsonl").read_text().splitlines()]
+    assert [(record["test"], record["verdict"]) for record in records[:-1]] == [("3", "OK"), ("0", "OK"), ("1", "RE"), ("2", "SKIP")]
+    assert records[1]["input_bytes"] < records[2]["input_bytes"]
+    assert records[-2]["reason"] == "group b failed"
+    assert records[-1]["skipped"] == 1 and [group["name"] for group in records[-1]["groups"]] == ["a", "b"]
+
+    # FUSED bez etapu judge, punkty za grupy w judge_end
+    for i, answer in enumerate(["0", "1", "0", "0"]):
+        (exec_env / f"{i}.out").write_text(answer)
+    env.update(FUSED="on", ANS=str(exec_env), FAIL_FAST="all")
+    subprocess.run([sys.executable, "main.py"], cwd=EXEC_DIR, env=env, check=True)
+    records = [json.loads(line) for line in (exec_env / "out" / "results.jsonl").read_text().splitlines()]
+    judge = {record["test"]: record for record in records if record["stage"] == "judge"}
+    assert judge["2"] == {"stage": "judge", "test": "2", "grade": 0, "info": "skipped", "skipped": True}
+    assert records[-1]["stage"] == "judge_end" and records[-1]["points"] == 30
+    assert records[-1]["groups"][1] == {"name": "b", "points": 0, "max_points": 70, "passed": 0, "tests": 2}
+
+
+def test_exec_precise_timing(exec_env, monkeypatch):
+    # test blisko limitu jest powtarzany, o werdykcie decyduje mediana
+    build(exec_env, "int main() { volatile long x = 0; for (long i = 0; i < 100000000; i++) { x += i; } }\n")
+    first = exec.run("0", exec.load_limits())["user_time"]
+    monkeypatch.setattr(exec, "TIMING", "precise")
+    monkeypatch.setattr(exec, "REPEATS", 3)
+    # szerokie okno, żeby szum maszyny nie wyprowadził testu poza nie
+    monkeypatch.setattr(timing, "BORDERLINE", 0.9)
+    meta = run(exec_env, dict(exec.load_limits(), time_limit=max(first, 0.05)))
+    assert len(meta["timing"]["runs"]) == 3 and meta["user_time"] == meta["timing"]["median"]
+    assert meta["timing"]["spread"] == round(max(meta["timing"]["runs"]) - min(meta["timing"]["runs"]), 6)
+    assert meta["verdict"] == ("TLE" if meta["user_time"] > max(first, 0.05) else "OK")
+    # daleko od limitu wystarcza jedno uruchomienie
+    assert "timing" not in run(exec_env, exec.load_limits())
+
+
+def test_exec_calibration(exec_env):
+    build(exec_env, "int main() { return 0; }\n")
+    env = dict(os.environ, JSON_FILES="off", TIMING="precise", CALIBRATION_BASE="1000")
+    subprocess.run([sys.executable, "main.py"], cwd=EXEC_DIR, env=env, check=True)
+    end = [json.loads(line) for line in (exec_env / "out" / "results.jsonl").read_text().splitlines()][-1]
+    assert end["calibration"]["reference_time"] > 0
+    assert end["calibration"]["scale"] == round(end["calibration"]["reference_time"] / 1000, 6)
+
+
+def build_python(exec_env, code, stdin="1\n", extra=None):
+    """Kompiluje program w Pythonie lokalnym kompilatorem do program.pyz."""
+    src = exec_env / "src"
+    src.mkdir()
+    (src / "main.py").write_text(code)
+    for name, content in (extra or {}).items():
+        (src / name).write_text(content)
+    (exec_env / "comp").mkdir()
+    env = dict(os.environ, SRC=str(src), OUT=str(exec_env / "comp"), BIN=str(exec_env / "bin"), BIN_TMP=str(exec_env / "comp"))
+    subprocess.run([sys.executable, "main.py"], cwd=PYTHON_COMPILER_DIR, env=env, check=True)
+    with open(exec_env / "in" / "0.in", "w") as f:
+        f.write(stdin)
+    with open(exec_env / "comp" / "comp.json") as f:
+        return json.load(f)
+
+
+def test_exec_python_fork_server(exec_env):
+    code = "from add import add\nn = int(input())\nprint(add(n, sum(int(input()) for _ in range(n))))\n"
+    assert build_python(exec_env, code, "3\n1\n1\n1\n", {"add.py": "def add(a, b):\n    return a + b\n"}) == {"return_code": 0}
+    assert (exec_env / "bin" / "program.pyz").exists()
+    meta = run(exec_env, exec.load_limits())
+    exec.close_fork_servers()
+    assert meta["verdict"] == "OK", meta
+    assert (exec_env / "out" / "0.stdout.out").read_text() == "6\n"
+    # start interpretera nie jest liczony do czasu programu
+    assert meta["user_time"] < 0.05
+
+
+def test_exec_python_limits_and_errors(exec_env):
+    build_python(exec_env, "import sys\nif input() == 'loop':\n    while True: pass\nsys.exit(3)\n", "loop\n")
+    meta = run(exec_env, dict(exec.load_limits(), time_limit=1))
+    assert meta["verdict"] == "TLE", meta
+    with open(exec_env / "in" / "0.in", "w") as f:
+        f.write("exit\n")
+    meta = run(exec_env, exec.load_limits())
+    exec.close_fork_servers()
+    assert meta["verdict"] == "RE" and meta["return_code"] == 3, meta
+    (exec_env / "bin" / "program.pyz").unlink()
+    (exec_env / "src" / "main.py").write_text("data = bytearray(600 << 20)\n")
+    env = dict(os.environ, SRC=str(exec_env / "src"), OUT=str(exec_env / "comp"), BIN=str(exec_env / "bin"), BIN_TMP=str(exec_env / "comp"))
+    subprocess.run([sys.executable, "main.py"], cwd=PYTHON_COMPILER_DIR, env=env, check=True)
+    meta = run(exec_env, exec.load_limits())
+    exec.close_fork_servers()
+    # MemoryError przy limicie przestrzeni adresowej to przekroczenie pamięci, a nie błąd wykonania
+    assert meta["verdict"] == "MLE" and meta["return_code"] == 1, meta
+
+
+def test_exec_python_own_modules(exec_env):
+    # moduły zgłoszenia o nazwach modułów etapu exec i biblioteki standardowej nie są przesłaniane
+    code = "import limits, json\nprint(limits.MAX_N + json.VALUE)\nprint(__file__)\nraise ValueError(limits.MAX_N)\n"
+    build_python(exec_env, code, extra={"limits.py": "MAX_N = 10\n", "json.py": "VALUE = 5\n"})
+    meta = run(exec_env, exec.load_limits())
+    exec.close_fork_servers()
+    assert meta["verdict"] == "RE", meta
+    program = exec_env / "bin" / "program.pyz"
+    assert (exec_env / "out" / "0.stdout.out").read_text() == f"15\n{program}/__main__.py\n"
+    stderr = (exec_env / "out" / "0.stderr.out").read_text()
+    assert f'File "{program}/__main__.py", line 4' in stderr and "raise ValueError(limits.MAX_N)" in stderr, stderr
+
+
+def test_exec_python_batch_fork_servers(exec_env):
+    # wątek zaczyna nowy fork server dopiero przy następnym zgłoszeniu, a nie przy każdym teście
+    for submission in ["a", "b"]:
+        src = exec_env / f"src-{submission}"
+        src.mkdir()
+        (src / "main.py").write_text(f"print(input() + '{submission}')\n")
+        (exec_env / "bin" / submission).mkdir()
+        (exec_env / f"comp-{submission}").mkdir()
+        env = dict(os.environ, SRC=str(src), OUT=str(exec_env / f"comp-{submission}"), BIN=str(exec_env / "bin" / submission), BIN_TMP=str(exec_env / f"comp-{submission}"))
+        subprocess.run([sys.executable, "main.py"], cwd=PYTHON_COMPILER_DIR, env=env, check=True)
+    for i in range(16):
+        (exec_env / "in" / f"{i}.in").write_text(f"{i}\n")
+    (exec_env / "batch.json").write_text(json.dumps({"submissions": [{"id": "a"}, {"id": "b"}]}))
+    env = dict(os.environ, BATCH=str(exec_env / "batch.json"), JSON_FILES="off", WORKERS="3", LOGS="on")
+    logs = subprocess.run([sys.executable, "main.py"], cwd=EXEC_DIR, env=env, check=True, capture_output=True, text=True).stdout
+    assert int(logs.split("fork servers: ")[-1].split()[0]) <= 6, logs
+    assert (exec_env / "out" / "b" / "15.stdout.out").read_text() == "15b\n"
+
+
+def test_exec_python_fused(exec_env, monkeypatch):
+    fused_env(exec_env, monkeypatch, "1\n")
+    build_python(exec_env, "print(2)\nimport time\ntime.sleep(30)\n")
+    meta = exec.run("0", dict(exec.load_limits(), wall_time_limit=10), fused=True)
+    exec.close_fork_servers()
+    assert meta["verdict"] == "WA", meta
+
+
+def test_python_compiler_syntax_error(exec_env):
+    meta = build_python(exec_env, "print(\n")
+    assert meta["return_code"] != 0
+    assert "SyntaxError" in (exec_env / "comp" / "comp.txt").read_text() or "never closed" in (exec_env / "comp" / "comp.txt").read_text()
+    assert not (exec_env / "bin" / "program.pyz").exists()
@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/conf")))
+import generator
+from generator import Generator, lines, repeat
+
+
+def make(rng, n):
+    values = [rng.randint(1, 100) for _ in range(n)]
+    return [f"{n}\n", *lines(values)], f"{sum(values)}\n"
+
+
+def read(path):
+    return {name: (path / name).read_bytes() for name in sorted(os.listdir(path))}
+
+
+def test_generator_deterministic_and_parallel(tmp_path):
+    # te same dane niezależnie od liczby procesów
+    tests = [{"n": n} for n in [0, 1, 5, 70000]]
+    Generator(make, tests, seed=3).generate(str(tmp_path / "a"), str(tmp_path / "cache-a"), workers=1)
+    Generator(make, tests, seed=3).generate(str(tmp_path / "b"), str(tmp_path / "cache-b"), workers=4)
+    assert read(tmp_path / "a" / "in") == read(tmp_path / "b" / "in")
+    assert read(tmp_path / "a" / "out") == read(tmp_path / "b" / "out")
+    data = (tmp_path / "a" / "in" / "3.in").read_text().split()
+    assert data[0] == "70000" and len(data) == 70001
+    assert sum(map(int, data[1:])) == int((tmp_path / "a" / "out" / "3.out").read_text())
+
+
+def test_generator_cache(tmp_path):
+    exec_in, cache = str(tmp_path / "exec-in"), str(tmp_path / "cache")
+    assert Generator(make, [{"n": 3}, {"n": 4}, {"n": 5}]).generate(exec_in, cache, workers=2) == {"0": True, "1": True, "2": True}
+    (tmp_path / "exec-in" / "in" / "config.json").write_text("{}")
+    # zmieniony tylko test 1, test 2 znika z zestawu
+    assert Generator(make, [{"n": 3}, {"n": 6}]).generate(exec_in, cache, workers=2) == {"0": False, "1": True}
+    assert sorted(os.listdir(tmp_path / "exec-in" / "in")) == ["0.in", "1.in", "config.json"]
+    assert (tmp_path / "exec-in" / "in" / "1.in").read_text().split()[0] == "6"
+
+
+def test_repeat_blocks(monkeypatch):
+    monkeypatch.setattr(generator, "BLOCK_LINES", 4)
+    assert b"".join(repeat("1\n", 10)) == b"1\n" * 10
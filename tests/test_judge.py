@@ -0,0 +1,332 @@
+import os
+import sys
+import json
+import subprocess
+import time
+import pytest
+
+JUDGE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/judge"))
+sys.path.insert(0, JUDGE_DIR)
+import comparator
+
+
+def compare(tmp_path, answer, output, mode="lines", eps=1e-6):
+    (tmp_path / "answer.out").write_bytes(answer)
+    (tmp_path / "output.out").write_bytes(output)
+    return comparator.compare(str(tmp_path / "answer.out"), str(tmp_path / "output.out"), mode, eps)
+
+
+@pytest.mark.parametrize("mode", comparator.MODES)
+def test_compare_identical(tmp_path, mode):
+    assert compare(tmp_path, b"1 2\n3\n", b"1 2\n3\n", mode) == (True, "ok")
+
+
+@pytest.mark.parametrize("mode", comparator.MODES)
+def test_compare_empty(tmp_path, mode):
+    assert compare(tmp_path, b"", b"", mode) == (True, "ok")
+    assert compare(tmp_path, b"1\n", b"", mode)[0] is False
+
+
+def test_compare_exact(tmp_path):
+    assert compare(tmp_path, b"1\n2\n", b"1\n2", "exact") == (False, "line 2 column 2 is not correct: expected \n but got EOF")
+    assert compare(tmp_path, b"1\n23\n", b"1\n24\n", "exact") == (False, "line 2 column 2 is not correct: expected 3 but got 4")
+
+
+def test_compare_lines(tmp_path):
+    assert compare(tmp_path, b"1\n2\n", b" 1 \r\n2") == (True, "ok")
+    assert compare(tmp_path, b"1\n2\n", b"1\n2\n\n\n") == (True, "ok")
+    assert compare(tmp_path, b"1\n22\n", b"1\n23\n") == (False, "line 2 column 2 is not correct: expected 22 but got 23")
+    assert compare(tmp_path, b"1 2\n", b"1\n2\n") == (False, "line 1 column 2 is not correct: expected 1 2 but got 1")
+
+
+def test_compare_lines_trailing_output(tmp_path):
+    # dodatkowe wyjście po odpowiedzi nie może być ignorowane
+    assert compare(tmp_path, b"1\n", b"1\n2\n") == (False, "line 2 column 1 is not correct: expected EOF but got 2")
+    assert compare(tmp_path, b"1\n2\n", b"1\n") == (False, "line 2 column 1 is not correct: expected 2 but got EOF")
+
+
+def test_compare_items_lazy_rest():
+    # po końcu odpowiedzi reszta wyjścia jest czytana tylko do pierwszego niepustego elementu
+    read = []
+
+    def output():
+        yield [b"1"]
+        for i in range(1000):
+            read.append(i)
+            yield [b"", b"2"] if i == 0 else [b"2"]
+
+    assert comparator.compare_items(iter([[b"1"]]), output()) == (1, None, b"")
+    assert read == [0]
+    assert comparator.compare_items(iter([[b"1"], [b"", b"3"]]), iter([[b"1"]])) == (1, b"", None)
+    assert comparator.compare_items(iter([[b"1"]]), iter([[b"1"]] + [[b""]] * 1000)) is None
+
+
+def test_compare_tokens(tmp_path):
+    assert compare(tmp_path, b"1 2\n3\n", b"1\n2 3", "tokens") == (True, "ok")
+    assert compare(tmp_path, b"1 2 3\n", b"1 2\n 4", "tokens") == (False, "line 2 column 2 is not correct: expected 3 but got 4")
+    assert compare(tmp_path, b"1 2\n", b"1 2 3", "tokens") == (False, "line 1 column 5 is not correct: expected EOF but got 3")
+
+
+def test_compare_float(tmp_path):
+    assert compare(tmp_path, b"0.3333333 100\n", b"0.33333331 100.0000001", "float") == (True, "ok")
+    assert compare(tmp_path, b"0.5\n", b"0.51\n", "float", 1e-3) == (False, "line 1 column 1 is not correct: expected 0.5 but got 0.51")
+    assert compare(tmp_path, b"abc\n", b"abd\n", "float")[0] is False
+
+
+def test_compare_chunk_boundaries(tmp_path, monkeypatch):
+    # małe porcje, żeby linie i tokeny przechodziły przez granice porcji
+    monkeypatch.setattr(comparator, "CHUNK_SIZE", 7)
+    answer = b"".join(f"{i} {i * i}\n".encode() for i in range(200))
+    assert compare(tmp_path, answer, answer.replace(b"\n", b" \n"), "lines") == (True, "ok")
+    assert compare(tmp_path, answer, answer.replace(b" ", b"\n"), "tokens") == (True, "ok")
+    wrong = answer.replace(b"150 22500", b"150 22501")
+    assert compare(tmp_path, answer, wrong, "lines") == (False, "line 151 column 9 is not correct: expected 150 22500 but got 150 22501")
+    assert compare(tmp_path, answer, wrong, "tokens") == (False, "line 151 column 5 is not correct: expected 22500 but got 22501")
+    assert compare(tmp_path, answer, wrong, "exact") == (False, "line 151 column 9 is not correct: expected 0 but got 1")
+
+
+@pytest.mark.parametrize("output", [
+    b"0 0\n1 1\n2 4\n",
+    b"0 0 \r\n1 1  \n  2 4\n\n",
+    b"0 0\t\n\t1 1\n2 4",
+    b"0\t0\n1 1\n2 4\n",
+    b"0 0\n1 1\n\n2 4\n",
+    b"0 0\n1 1\n",
+    b"0 0\n1 1\n2 4\n\n5\n",
+])
+def test_compare_normalized_chunks(tmp_path, monkeypatch, output):
+    # porównywanie znormalizowanych porcji daje ten sam wynik co porównywanie linii i tokenów po kolei
+    monkeypatch.setattr(comparator, "CHUNK_SIZE", 5)
+    monkeypatch.setattr(comparator, "FIRST_CHUNK_SIZE", 2)
+    answer = b"0 0\n1 1\n2 4\n"
+    for mode, split in [("lines", lambda data: [line.strip() for line in data.split(b"\n")]), ("tokens", bytes.split)]:
+        a, b = split(answer), split(output)
+        while a and not a[-1]:
+            a.pop()
+        while b and not b[-1]:
+            b.pop()
+        assert compare(tmp_path, answer, output, mode)[0] == (a == b), mode
+
+
+def test_compare_float_written_differently(tmp_path, monkeypatch):
+    # liczby zapisane inaczej rozjeżdżają bajty, dalej porównywane są tokeny
+    monkeypatch.setattr(comparator, "CHUNK_SIZE", 16)
+    answer = b"".join(f"{i}.0\n".encode() for i in range(100))
+    output = b"".join(f"{i}.00000001\n".encode() for i in range(100))
+    assert compare(tmp_path, answer, output, "float") == (True, "ok")
+    wrong = output.replace(b"\n70.00000001\n", b"\n70.1\n")
+    assert compare(tmp_path, answer, wrong, "float") == (False, "line 71 column 1 is not correct: expected 70.0 but got 70.1")
+
+
+def test_judge_results(tmp_path):
+    # uruchomienie etapu judge lokalnie, bez dockera, z pulą procesów
+    out_dir = tmp_path / "out"
+    ans_dir = tmp_path / "answer"
+    out_dir.mkdir()
+    ans_dir.mkdir()
+    for i in range(5):
+        (out_dir / f"{i}.stdout.out").write_text(f"{i}\n" * (i + 1))
+        (out_dir / f"{i}.exec.json").write_text(json.dumps({"return_code": 0, "user_time": 0.1, "memory": 1, "verdict": "OK"}))
+        (ans_dir / f"{i}.out").write_text(f"{i}\n" * (i + 1) if i != 3 else "x\n")
+    env = dict(os.environ, WORKERS="2", IN=str(out_dir), OUT=str(out_dir), ANS=str(ans_dir))
+    subprocess.run([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env, check=True)
+    with open(out_dir / "results.json") as f:
+        results = json.load(f)
+    assert results["points"] == 4
+    assert [test["name"] for test in results["tests"]] == ["0", "1", "2", "3", "4"]
+    for test in results["tests"]:
+        with open(out_dir / f"{test['name']}.judge.json") as f:
+            assert json.load(f) == {"grade": test["grade"], "info": test["info"]}
+
+
+def test_judge_manifest(tmp_path):
+    # wyniki exec tylko w results.jsonl, judge dopisuje swoje wpisy do tego samego pliku
+    out_dir = tmp_path / "out"
+    ans_dir = tmp_path / "answer"
+    out_dir.mkdir()
+    ans_dir.mkdir()
+    records = []
+    for i in range(3):
+        if i != 1:
+            # przy IO=memfd wyjście testu z TLE nie jest zapisywane
+            (out_dir / f"{i}.stdout.out").write_text(f"{i}\n")
+        (ans_dir / f"{i}.out").write_text(f"{i}\n")
+        records.append({"stage": "exec", "test": str(i), "return_code": 0, "user_time": 2.5, "memory": 1, "verdict": "TLE" if i == 1 else "OK"})
+    (out_dir / "results.jsonl").write_text("".join(json.dumps(record) + "\n" for record in records))
+    env = dict(os.environ, WORKERS="2", JSON_FILES="off", IN=str(out_dir), OUT=str(out_dir), ANS=str(ans_dir))
+    subprocess.run([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env, check=True)
+    lines = [json.loads(line) for line in (out_dir / "results.jsonl").read_text().splitlines()]
+    assert lines[:3] == records
+    judge = {record["test"]: record for record in lines[3:-1]}
+    for record in judge.values():
+        assert record.pop("time") >= 0 and record.pop("start") > 0
+        assert record.pop("output_bytes") == (0 if record["test"] == "1" else 2)
+        assert record.pop("worker") > 0
+    assert judge["1"] == {"stage": "judge", "test": "1", "grade": 0, "info": "time limit exceeded: 2.5s"}
+    assert judge["0"]["grade"] == judge["2"]["grade"] == 1
+    assert {key: lines[-1][key] for key in ["stage", "points", "tests"]} == {"stage": "judge_end", "points": 2, "tests": 3}
+    assert not list(out_dir.glob("*.judge.json"))
+
+
+def test_judge_groups(tmp_path):
+    # grupy z rekordu exec_end, pominięty test oznaczony w wynikach
+    out_dir = tmp_path / "out"
+    ans_dir = tmp_path / "answer"
+    out_dir.mkdir()
+    ans_dir.mkdir()
+    records = []
+    for i in range(4):
+        (ans_dir / f"{i}.out").write_text(f"{i}\n")
+        if i == 3:
+            records.append({"stage": "exec", "test": "3", "verdict": "SKIP", "reason": "group b failed"})
+            continue
+        (out_dir / f"{i}.stdout.out").write_text(f"{i}\n" if i != 2 else "x\n")
+        records.append({"stage": "exec", "test": str(i), "return_code": 0, "user_time": 0.1, "memory": 1, "verdict": "OK"})
+    groups = [{"name": "a", "tests": ["0", "1"], "points": 40, "scoring": "sum"}, {"name": "b", "tests": ["2", "3"], "points": 60, "scoring": "all"}]
+    records.append({"stage": "exec_end", "tests": 4, "skipped": 1, "groups": groups})
+    (out_dir / "results.jsonl").write_text("".join(json.dumps(record) + "\n" for record in records))
+    env = dict(os.environ, WORKERS="1", IN=str(out_dir), OUT=str(out_dir), ANS=str(ans_dir))
+    subprocess.run([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env, check=True)
+    with open(out_dir / "results.json") as f:
+        results = json.load(f)
+    assert results["points"] == 40
+    assert results["tests"][3] == {"name": "3", "grade": 0, "info": "skipped", "skipped": True}
+    assert [group["points"] for group in results["groups"]] == [40, 0]
+
+
+def test_judge_checker(tmp_path):
+    # checker akceptuje każdą odpowiedź o dobrej sumie, jeden proces na cały etap
+    out_dir, ans_dir, in_dir, checker_dir = tmp_path / "out", tmp_path / "answer", tmp_path / "in", tmp_path / "checker"
+    for d in [out_dir, ans_dir, in_dir, checker_dir]:
+        d.mkdir()
+    program = checker_dir / "program"
+    program.write_text(f"""#!{sys.executable}
+import os, sys
+for test in sys.stdin:
+    test, answer, output = test[:-1], sys.stdin.readline()[:-1], sys.stdin.readline()[:-1]
+    expected = sum(map(int, open(test).read().split()))
+    got = open(output).read().split()
+    print(f"OK {{os.getpid()}}" if got == [str(expected)] else f"WA {{os.getpid()}}", flush=True)
+""")
+    program.chmod(0o755)
+    for i in range(4):
+        (in_dir / f"{i}.in").write_text(f"{i} {i}\n")
+        (ans_dir / f"{i}.out").write_text(f"{2 * i}\n")
+        (out_dir / f"{i}.stdout.out").write_text(f" {2 * i} \n" if i != 3 else "5\n")
+        (out_dir / f"{i}.exec.json").write_text(json.dumps({"return_code": 0, "user_time": 0.1, "memory": 1, "verdict": "OK"}))
+    env = dict(os.environ, WORKERS="1", IN=str(out_dir), OUT=str(out_dir), ANS=str(ans_dir), TESTS=str(in_dir), CHECKER=str(checker_dir))
+    subprocess.run([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env, check=True)
+    with open(out_dir / "results.json") as f:
+        results = json.load(f)
+    assert [test["grade"] for test in results["tests"]] == [1, 1, 1, 0]
+    assert len({test["info"] for test in results["tests"]}) == 1
+
+
+def test_judge_checker_pool(tmp_path):
+    # checkery procesów puli są zamykane przed końcem judge, ścieżki ze spacjami przechodzą
+    out_dir, ans_dir, in_dir, checker_dir = tmp_path / "o u t", tmp_path / "answer", tmp_path / "in", tmp_path / "checker"
+    for d in [out_dir, ans_dir, in_dir, checker_dir]:
+        d.mkdir()
+    program = checker_dir / "program"
+    program.write_text(f"""#!{sys.executable}
+import os, sys, time
+for test in sys.stdin:
+    test, answer, output = test[:-1], sys.stdin.readline()[:-1], sys.stdin.readline()[:-1]
+    print("OK" if open(output).read() == open(answer).read() else "WA", flush=True)
+time.sleep(0.3)
+open(f"{tmp_path}/closed.{{os.getpid()}}", "w").close()
+""")
+    program.chmod(0o755)
+    for i in range(6):
+        (in_dir / f"{i}.in").write_text("1\n")
+        (ans_dir / f"{i}.out").write_text("1\n")
+        (out_dir / f"{i}.stdout.out").write_text("1\n")
+        (out_dir / f"{i}.exec.json").write_text(json.dumps({"return_code": 0, "user_time": 0.1, "memory": 1, "verdict": "OK"}))
+    env = dict(os.environ, WORKERS="2", IN=str(out_dir), OUT=str(out_dir), ANS=str(ans_dir), TESTS=str(in_dir), CHECKER=str(checker_dir))
+    subprocess.run([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env, check=True)
+    with open(out_dir / "results.json") as f:
+        assert [test["grade"] for test in json.load(f)["tests"]] == [1] * 6
+    assert list(tmp_path.glob("closed.*"))
+
+
+def test_judge_follow(tmp_path):
+    # judge uruchomiony przed exec ocenia testy w miarę dopisywania rekordów, aż do exec_end
+    out_dir = tmp_path / "out"
+    ans_dir = tmp_path / "answer"
+    out_dir.mkdir()
+    ans_dir.mkdir()
+    env = dict(os.environ, WORKERS="2", FOLLOW="on", IN=str(out_dir), OUT=str(out_dir), ANS=str(ans_dir))
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env)
+    manifest = out_dir / "results.jsonl"
+    for i in range(3):
+        (ans_dir / f"{i}.out").write_text(f"{i}\n")
+        (out_dir / f"{i}.stdout.out").write_text(f"{i}\n" if i != 1 else "x\n")
+        with open(manifest, "a") as f:
+            f.write(json.dumps({"stage": "exec", "test": str(i), "return_code": 0, "user_time": 0.1, "memory": 1, "verdict": "OK"}) + "\n")
+        # ocena testu zanim exec dopisze następny
+        deadline = time.time() + 10
+        while f'"stage": "judge", "test": "{i}"' not in manifest.read_text():
+            assert time.time() < deadline and process.poll() is None
+            time.sleep(0.01)
+    with open(manifest, "a") as f:
+        f.write(json.dumps({"stage": "exec_end", "tests": 3}) + "\n")
+    assert process.wait(10) == 0
+    lines = [json.loads(line) for line in manifest.read_text().splitlines()]
+    assert {key: lines[-1][key] for key in ["stage", "points", "tests"]} == {"stage": "judge_end", "points": 2, "tests": 3}
+
+
+def test_judge_follow_timeout(tmp_path):
+    # bez exec_end w czasie FOLLOW_TIMEOUT wynik jest niepełny, judge kończy się błędem bez judge_end
+    out_dir = tmp_path / "out"
+    ans_dir = tmp_path / "answer"
+    out_dir.mkdir()
+    ans_dir.mkdir()
+    for i in range(2):
+        (ans_dir / f"{i}.out").write_text("1\n")
+        (out_dir / f"{i}.stdout.out").write_text("1\n")
+    (out_dir / "results.jsonl").write_text(json.dumps({"stage": "exec", "test": "0", "return_code": 0, "user_time": 0.1, "memory": 1, "verdict": "OK"}) + "\n")
+    env = dict(os.environ, WORKERS="2", FOLLOW="on", FOLLOW_TIMEOUT="1", IN=str(out_dir), OUT=str(out_dir), ANS=str(ans_dir))
+    assert subprocess.run([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env).returncode != 0
+    stages = [json.loads(line)["stage"] for line in (out_dir / "results.jsonl").read_text().splitlines()]
+    assert "judge_end" not in stages
+    assert not (out_dir / "results.json").exists()
+
+
+def test_judge_artifacts(tmp_path):
+    # pełne wyjście zostaje tylko dla niezaliczonych testów, identyczne wyjścia zapisane raz
+    out_dir = tmp_path / "out"
+    ans_dir = tmp_path / "answer"
+    out_dir.mkdir()
+    ans_dir.mkdir()
+    for i in range(3):
+        (ans_dir / f"{i}.out").write_text("1\n")
+        (out_dir / f"{i}.stdout.out").write_text("1\n" if i != 2 else "2\n")
+        (out_dir / f"{i}.stderr.out").write_text("debug\n")
+        (out_dir / f"{i}.exec.json").write_text(json.dumps({"return_code": 0, "user_time": 0.1, "memory": 1, "verdict": "OK"}))
+    env = dict(os.environ, WORKERS="1", IN=str(out_dir), OUT=str(out_dir), ANS=str(ans_dir))
+    subprocess.run([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env, check=True)
+    assert sorted(path.name for path in out_dir.glob("*.out")) == ["2.stderr.out", "2.stdout.out"]
+    assert len(list((out_dir / "artifacts").iterdir())) == 3
+    judge = {record["test"]: record for record in map(json.loads, (out_dir / "results.jsonl").read_text().splitlines()) if record["stage"] == "judge"}
+    assert judge["0"]["artifacts"] == judge["1"]["artifacts"]
+    assert judge["0"]["output_bytes"] == 2
+
+
+def test_judge_rerun_after_prune(tmp_path):
+    # wyjścia czytane z IN, artefakty w OUT, ponowna ocena zachowuje wynik testów bez pełnego wyjścia
+    in_dir, out_dir, ans_dir = tmp_path / "in", tmp_path / "out", tmp_path / "answer"
+    for d in [in_dir, out_dir, ans_dir]:
+        d.mkdir()
+    for i in range(2):
+        (ans_dir / f"{i}.out").write_text("1\n")
+        (in_dir / f"{i}.stdout.out").write_text("1\n" if i == 0 else "2\n")
+        (out_dir / f"{i}.exec.json").write_text(json.dumps({"return_code": 0, "user_time": 0.1, "memory": 1, "verdict": "OK"}))
+    env = dict(os.environ, WORKERS="1", IN=str(in_dir), OUT=str(out_dir), ANS=str(ans_dir))
+    for _ in range(2):
+        subprocess.run([sys.executable, "main.py"], cwd=JUDGE_DIR, env=env, check=True)
+        assert sorted(path.name for path in in_dir.iterdir()) == ["1.stdout.out"]
+        assert len(list((out_dir / "artifacts").iterdir())) == 2
+        with open(out_dir / "results.json") as f:
+            assert [(test["name"], test["grade"]) for test in json.load(f)["tests"]] == [("0", 1), ("1", 0)]
+    judge = [record for record in map(json.loads, (out_dir / "results.jsonl").read_text().splitlines()) if record["stage"] == "judge"]
+    assert [(record["test"], record.get("pruned", False)) for record in judge] == [("0", True), ("1", False), ("1", False)]
@@ -0,0 +1,40 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/worker")))
+from results_db import ResultsDB, percentile
+
+
+def manifest(tmp_path, name, times, wrong=()):
+    path = tmp_path / f"{name}.jsonl"
+    records = []
+    for i, user_time in enumerate(times):
+        records.append({"stage": "exec", "test": str(i), "return_code": 0, "user_time": user_time, "memory": 100, "wall_time": user_time, "verdict": "OK", "start": 1000.0 + i})
+        records.append({"stage": "judge", "test": str(i), "grade": 0 if i in wrong else 1, "info": "wrong" if i in wrong else "ok"})
+    records.append({"stage": "judge_end", "points": len(times) - len(wrong), "tests": len(times)})
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return str(path)
+
+
+def test_results_db(tmp_path):
+    db = ResultsDB(str(tmp_path / "results.db"))
+    for i in range(100):
+        db.ingest(f"s{i}", manifest(tmp_path, f"s{i}", [0.1, i / 100], wrong=[1] if i % 10 else []), "sum", f"user{i % 3}", "cpp", submitted=float(i))
+    db.ingest("ce", None, "sum", "user0", "cpp", "compile_error", 200.0)
+    stats = db.test_stats("sum", "1")
+    assert stats["runs"] == 100 and stats["p95"] == 0.94 and stats["max"] == 0.99
+    # tylko ostatnie zgłoszenia
+    assert db.test_stats("sum", "1", last=10)["p50"] == percentile([i / 100 for i in range(90, 100)], 0.5)
+    assert db.verdicts("sum") == {"OK": 200}
+    assert [row["test"] for row in db.history("sum", "0", last=3)] == ["0"] * 3
+    board = db.leaderboard("sum")
+    assert [(row["owner"], row["id"], row["points"]) for row in board] == [("user0", "s0", 2), ("user1", "s10", 2), ("user2", "s20", 2)]
+    assert db.submission("ce") == {"id": "ce", "problem": "sum", "owner": "user0", "language": "cpp", "result": "compile_error", "points": 0, "tests": [], "time": 200.0}
+    # ponowna ocena zastępuje stare wiersze
+    db.ingest("s1", manifest(tmp_path, "s1", [0.5, 0.5, 0.5]), "sum", "user1", "cpp", submitted=1.0)
+    assert [test["user_time"] for test in db.submission("s1")["tests"]] == [0.5, 0.5, 0.5]
+    assert db.leaderboard("sum", 1) == [{"owner": "user1", "id": "s1", "points": 3, "time": 1.0}]
+    plan = " ".join(row[3] for row in db.query("EXPLAIN QUERY PLAN SELECT user_time FROM tests WHERE problem = ? AND test = ? ORDER BY time DESC LIMIT 10", ("sum", "1")))
+    assert "tests_problem_test_time" in plan
+    db.close()
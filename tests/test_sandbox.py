@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import shutil
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/worker")))
+import sandbox
+from backends import SandboxBackend
+from artifacts import read_artifact
+from manifest import MANIFEST_FILE, load_manifest
+
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None or not sandbox.supported(), reason="brak g++ lub przestrzeni nazw")
+
+
+def pipeline(tmp_path, code, stdin="1\n", answer="1\n"):
+    """Kompilacja, exec i judge w piaskownicy, jak test_containers.py bez dockera."""
+    comp_in, comp_out, exec_out = tmp_path / "comp-in", tmp_path / "comp-out", tmp_path / "exec-out"
+    for d in [comp_in, comp_out, exec_out, tmp_path / "tests" / "in", tmp_path / "tests" / "out"]:
+        d.mkdir(parents=True)
+    (comp_in / "main.cpp").write_text(code)
+    (tmp_path / "tests" / "in" / "0.in").write_text(stdin)
+    (tmp_path / "tests" / "out" / "0.out").write_text(answer)
+    (tmp_path / "tests" / "in" / "config.json").write_text(json.dumps({"time_limit": 1, "wall_time_limit": 2}))
+    backend = SandboxBackend()
+    assert backend.compile(str(comp_in), str(comp_out)).returncode == 0
+    assert json.loads((comp_out / "comp.json").read_text())["return_code"] == 0
+    backend.execute(str(tmp_path / "tests"), str(comp_out), str(exec_out))
+    backend.judge(str(tmp_path / "tests"), str(exec_out))
+    records = load_manifest(str(exec_out / MANIFEST_FILE))
+    # pełny stderr zostaje tylko po błędzie w exec, zawsze jest w artefaktach
+    refs = records["judge"]["0"].get("artifacts", {})
+    return records["exec"]["0"], records["judge"]["0"], read_artifact(str(exec_out), refs["stderr"]["sha"]).decode() if "stderr" in refs else ""
+
+
+def test_sandbox_ok(tmp_path):
+    exec, judge, _ = pipeline(tmp_path, "#include <iostream>\nint main() { int n; std::cin >> n; std::cout << n * 2 << std::endl; }\n", "21\n", "42\n")
+    assert exec["verdict"] == "OK" and judge["grade"] == 1
+
+
+def test_sandbox_infinite_loop(tmp_path):
+    exec, judge, _ = pipeline(tmp_path, "int main() { while(1) {} return 0; }\n")
+    assert exec["verdict"] == "TLE" and exec["return_code"] != 0 and judge["grade"] == 0
+
+
+@pytest.mark.parametrize("path, error", [("/etc/passwd", "Read-only file system"), ("/var/log/hacked.log", "No such file or directory"), ("/data/in/0.in", "Read-only file system")])
+def test_sandbox_system_access(tmp_path, path, error):
+    code = f'#include <cstdio>\nint main() {{ FILE* f = fopen("{path}", "w"); if (!f) {{ perror("{path}"); return 1; }} fputs("hacked", f); return 0; }}\n'
+    exec, _, stderr = pipeline(tmp_path, code)
+    assert exec["verdict"] == "RE" and error in stderr
+    assert (tmp_path / "tests" / "in" / "0.in").read_text() == "1\n"
+    assert not os.path.exists("/var/log/hacked.log")
+
+
+def test_sandbox_seccomp_and_network(tmp_path):
+    # wywołania z profilu seccomp kończą się EPERM, sieci nie ma
+    code = """#include <cstdio>
+#include <sched.h>
+#include <sys/ptrace.h>
+#include <sys/socket.h>
+#include <netinet/in.h>
+#include <arpa/inet.h>
+int main() {
+    if (unshare(CLONE_NEWUSER) != 0) perror("unshare");
+    if (ptrace(PTRACE_TRACEME, 0, 0, 0) != 0) perror("ptrace");
+    int s = socket(AF_INET, SOCK_STREAM, 0);
+    sockaddr_in addr{};
+    addr.sin_family = AF_INET;
+    addr.sin_port = htons(80);
+    inet_pton(AF_INET, "1.1.1.1", &addr.sin_addr);
+    if (connect(s, (sockaddr*)&addr, sizeof(addr)) != 0) perror("connect");
+    return 0;
+}
+"""
+    exec, _, stderr = pipeline(tmp_path, code)
+    assert exec["verdict"] == "OK"
+    assert "unshare: Operation not permitted" in stderr and "ptrace: Operation not permitted" in stderr
+    assert "connect: Network is unreachable" in stderr
+
+
+def test_sandbox_seccomp_allow_list(tmp_path):
+    # dozwolone są tylko wywołania z listy, clone bez flag CLONE_NEW*, a clone3 zwraca ENOSYS (glibc wraca wtedy do clone)
+    code = """#include <cstdio>
+#include <cerrno>
+#include <csignal>
+#include <sched.h>
+#include <unistd.h>
+#include <sys/syscall.h>
+#include <sys/wait.h>
+int main() {
+    if (syscall(SYS_clone, CLONE_NEWUSER | SIGCHLD, 0, 0, 0, 0) == -1) perror("clone");
+    if (syscall(SYS_clone3, 0, 0) == -1) perror("clone3");
+    if (sethostname("x", 1) != 0) perror("sethostname");
+    pid_t pid = fork();
+    if (pid == 0) _exit(7);
+    int status = 0;
+    waitpid(pid, &status, 0);
+    fprintf(stderr, "fork %d\\n", WEXITSTATUS(status));
+    return 0;
+}
+"""
+    exec, _, stderr = pipeline(tmp_path, code)
+    assert exec["verdict"] == "OK"
+    assert "clone: Operation not permitted" in stderr and "clone3: Function not implemented" in stderr
+    assert "sethostname: Operation not permitted" in stderr and "fork 7" in stderr
+
+
+def test_seccomp_filter_rejects_unknown_syscalls(tmp_path):
+    profile = tmp_path / "seccomp.json"
+    profile.write_text(json.dumps({"defaultAction": "SCMP_ACT_ALLOW", "syscalls": [{"names": ["no_such_call"], "action": "SCMP_ACT_ERRNO"}]}))
+    with pytest.raises(ValueError):
+        sandbox.seccomp_filter(str(profile))
+    profile.write_text(json.dumps({"defaultAction": "SCMP_ACT_ALLOW", "syscalls": [{"names": ["clone"], "action": "SCMP_ACT_ERRNO", "args": [{"index": 0, "value": 1, "op": "SCMP_CMP_GT"}]}]}))
+    with pytest.raises(ValueError):
+        sandbox.seccomp_filter(str(profile))
@@ -0,0 +1,73 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/worker")))
+from scheduler import Rejected, Scheduler
+
+
+def take(scheduler):
+    job, payload, cpus = scheduler.acquire(timeout=0.05)
+    return payload
+
+
+def test_scheduler_priority_and_fair_share():
+    scheduler = Scheduler(cpus=[0], memory=10**6)
+    scheduler.submit({"priority": "rejudge", "memory_limit": 1}, "rejudge")
+    scheduler.submit({"owner": "a", "memory_limit": 1}, "a1")
+    scheduler.submit({"owner": "a", "memory_limit": 1}, "a2")
+    scheduler.submit({"owner": "b", "memory_limit": 1}, "b1")
+    scheduler.submit({"priority": "live", "memory_limit": 1}, "live")
+    # najpierw live, rejudge na końcu
+    job, payload, cpus = scheduler.acquire(timeout=0.05)
+    assert payload == "live" and cpus == [0]
+    scheduler.release(job)
+    job, payload, _ = scheduler.acquire(timeout=0.05)
+    assert payload == "a1"
+    scheduler.release(job)
+    # a zużył już czas rdzenia, więc b wyprzedza drugie zgłoszenie a
+    job, payload, _ = scheduler.acquire(timeout=0.05)
+    assert payload == "b1"
+    scheduler.release(job)
+    assert take(scheduler) == "a2"
+
+
+def test_scheduler_admission(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "config.json").write_text('{"memory_limit": 600}')
+    scheduler = Scheduler(cpus=[0, 1, 2, 3], memory=1000)
+    assert scheduler.demand({"tests": str(tmp_path)}) == (1, 600)
+    scheduler.submit({"tests": str(tmp_path)}, "big1")
+    scheduler.submit({"tests": str(tmp_path)}, "big2")
+    scheduler.submit({"memory_limit": 200, "cores": 2}, "small")
+    first, _, first_cpus = scheduler.acquire(timeout=0.05)
+    # big2 się nie mieści w pamięci, więc small go wyprzedza na innych rdzeniach
+    second, payload, second_cpus = scheduler.acquire(timeout=0.05)
+    assert payload == "small" and len(second_cpus) == 2 and not set(first_cpus) & set(second_cpus)
+    assert scheduler.acquire(timeout=0.05) is None
+    scheduler.release(first)
+    assert take(scheduler) == "big2"
+    assert scheduler.stats() == {"pending": 0, "free_cpus": 1, "free_memory": 0}
+
+
+def test_scheduler_no_backfill_after_wait():
+    scheduler = Scheduler(cpus=[0, 1], memory=10**6, backfill_wait=0)
+    scheduler.submit({"memory_limit": 1}, "running")
+    running, _, _ = scheduler.acquire(timeout=0.05)
+    scheduler.submit({"memory_limit": 1, "cores": 2}, "wide")
+    scheduler.submit({"memory_limit": 1}, "small")
+    # wide czeka dłużej niż backfill_wait, wolny rdzeń czeka na niego
+    assert scheduler.acquire(timeout=0.05) is None
+    scheduler.release(running)
+    assert take(scheduler) == "wide"
+
+
+def test_scheduler_rejects():
+    scheduler = Scheduler(cpus=[0, 1], memory=1000)
+    with pytest.raises(Rejected):
+        scheduler.submit({"cores": 3, "memory_limit": 1})
+    with pytest.raises(Rejected):
+        scheduler.submit({"memory_limit": 1001})
+    with pytest.raises(Rejected):
+        scheduler.submit({"memory_limit": 1, "priority": "urgent"})
+    assert scheduler.stats()["pending"] == 0
@@ -0,0 +1,69 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/worker")))
+import store
+from store import DataStore
+
+
+def make_tests(path, files):
+    for d in ["in", "out"]:
+        (path / d).mkdir(parents=True)
+    for name, content in files.items():
+        (path / name).write_bytes(content)
+    return str(path)
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_store_dedup_and_stage(tmp_path, codec):
+    big = b"1\n" * 100000
+    tests = make_tests(tmp_path / "a", {"in/0.in": big, "in/1.in": b"5\n", "out/0.out": b"100000\n", "out/1.out": b"5\n"})
+    other = make_tests(tmp_path / "b", {"in/0.in": big, "out/0.out": b"100000\n"})
+    test_store = DataStore(str(tmp_path / "store"), str(tmp_path / "stage"), codec)
+    test_store.add("a", tests)
+    test_store.add("b", other)
+    # ta sama zawartość (także 1.in i 1.out) jest zapisana raz i skompresowana
+    objects = [os.path.join(root, f) for root, _, files in os.walk(tmp_path / "store" / "objects") for f in files]
+    assert len(objects) == 3
+    assert sum(os.path.getsize(f) for f in objects) < len(big) // 10
+
+    staged = test_store.stage("a")
+    assert (tmp_path / "a" / "in" / "0.in").read_bytes() == open(f"{staged}/in/0.in", "rb").read()
+    assert sorted(os.listdir(f"{staged}/out")) == ["0.out", "1.out"]
+    # drugie zadanie korzysta z tego samego rozpakowanego pliku
+    assert os.stat(f"{test_store.stage('b')}/in/0.in").st_ino == os.stat(f"{staged}/in/0.in").st_ino
+
+
+def test_store_stage_reused(tmp_path, monkeypatch):
+    tests = make_tests(tmp_path / "a", {"in/0.in": b"1\n", "out/0.out": b"1\n"})
+    test_store = DataStore(str(tmp_path / "store"), str(tmp_path / "stage"))
+    test_store.add("a", tests)
+    staged = test_store.stage("a")
+    # kolejne uruchomienie nie rozpakowuje danych ponownie
+    monkeypatch.setattr(store, "DECODERS", {})
+    assert test_store.stage("a") == staged
+
+
+def test_store_stage_evicted(tmp_path):
+    shared = b"7\n" * 1000
+    test_store = DataStore(str(tmp_path / "store"), str(tmp_path / "stage"), stage_size=5000)
+    for problem, content in [("a", b"1\n" * 1000), ("b", b"2\n" * 1000), ("c", b"3\n" * 1000)]:
+        test_store.add(problem, make_tests(tmp_path / problem, {"in/0.in": content, "out/0.out": shared}))
+    objects = tmp_path / "stage" / "objects"
+
+    a = test_store.stage("a")
+    b = test_store.stage("b")
+    # oba zestawy są używane, więc żaden nie jest usuwany mimo przekroczenia limitu
+    assert os.path.isdir(a) and os.path.isdir(b)
+    test_store.release(a)
+    # po zwolnieniu najdawniej użyty zestaw jest usuwany, wspólna odpowiedź zostaje
+    assert not os.path.exists(a) and os.path.isdir(b)
+    assert len(os.listdir(objects)) == 2
+    test_store.release(b)
+    c = test_store.stage("c")
+    assert not os.path.exists(b) and open(f"{c}/out/0.out", "rb").read() == shared
+    assert sum(os.path.getsize(objects / name) for name in os.listdir(objects)) <= 5000
+    test_store.release(c)
+    # zestaw mieszczący się w limicie zostaje do kolejnych uruchomień
+    assert test_store.stage("c") == c
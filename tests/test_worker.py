@@ -0,0 +1,187 @@
+import os
+import sys
+import shutil
+import threading
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/worker")))
+import worker
+from backends import DockerBackend, LocalBackend
+from manifest import read_manifest
+
+EXAMPLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/example/comp-in"))
+
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None, reason="brak g++")
+
+
+@pytest.fixture
+def local_worker(tmp_path):
+    """Worker z lokalnym backendem nasłuchujący na gnieździe w tmp_path."""
+    socket_path = str(tmp_path / "worker.sock")
+    local = worker.Worker(LocalBackend(), workers=2)
+    local.start()
+    server = worker.Server(socket_path, local)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sum_problem(tmp_path):
+    comp_in = tmp_path / "comp-in"
+    comp_in.mkdir()
+    for fname in ["main.cpp", "add.cpp", "add.h"]:
+        shutil.copy(os.path.join(EXAMPLE_DIR, fname), comp_in / fname)
+    tests = tmp_path / "tests"
+    (tests / "in").mkdir(parents=True)
+    (tests / "out").mkdir()
+    for i in range(4):
+        (tests / "in" / f"{i}.in").write_text(f"{i}\n" + "1\n" * i)
+        (tests / "out" / f"{i}.out").write_text(f"{i}\n" if i != 2 else "7\n")
+    return str(comp_in), str(tests)
+
+
+def test_worker_pipeline(local_worker, sum_problem):
+    comp_in, tests = sum_problem
+    events = list(worker.submit({"id": "job1", "comp_in": comp_in, "tests": tests}, local_worker))
+    assert [event["stage"] for event in events] == ["start", "comp", "exec", "judge", "done"]
+    assert all(event["id"] == "job1" for event in events)
+    # testy działają tylko na rdzeniach przydzielonych przez scheduler
+    assert set(events[0]["cpus"]) <= os.sched_getaffinity(0)
+    assert {record["cpu"] for record in events[2]["result"].values()} <= set(events[0]["cpus"])
+    assert events[1]["result"]["return_code"] == 0
+    assert sorted(events[2]["result"]) == ["0", "1", "2", "3"]
+    assert events[-1]["points"] == 3
+    assert [test["grade"] for test in events[3]["result"]["tests"]] == [1, 1, 0, 1]
+
+
+def test_worker_fused(local_worker, sum_problem):
+    comp_in, tests = sum_problem
+    events = list(worker.submit({"comp_in": comp_in, "tests": tests, "env": {"FUSED": "on"}}, local_worker))
+    assert events[-1] == {"id": events[0]["id"], "stage": "done", "points": 3}
+
+
+def test_worker_fused_other_compare(local_worker, sum_problem):
+    # FUSED porównuje tylko linie, przy innym COMPARE ocenia etap judge
+    comp_in, tests = sum_problem
+    events = list(worker.submit({"comp_in": comp_in, "tests": tests, "env": {"FUSED": "on", "COMPARE": "tokens"}}, local_worker))
+    assert [event["stage"] for event in events] == ["start", "comp", "exec", "judge", "done"]
+    assert events[-1]["points"] == 3
+
+
+def test_worker_compilation_error(local_worker, sum_problem, tmp_path):
+    comp_in, tests = sum_problem
+    with open(os.path.join(comp_in, "main.cpp"), "a") as f:
+        f.write("\nthis_is_not_valid_cpp_code\n")
+    events = list(worker.submit({"comp_in": comp_in, "tests": tests}, local_worker))
+    assert [event["stage"] for event in events] == ["start", "comp", "done"]
+    assert events[-1]["points"] == 0
+
+
+def test_worker_unknown_language(local_worker, sum_problem, tmp_path):
+    # nieznany język to błąd zgłoszenia, a nie cicha kompilacja jako C++
+    comp_in, tests = sum_problem
+    events = list(worker.submit({"comp_in": comp_in, "tests": tests, "language": "rust"}, local_worker))
+    assert events[-1]["stage"] == "error" and events[-1]["info"] == "unknown language: rust"
+    with pytest.raises(ValueError):
+        DockerBackend().compile(comp_in, str(tmp_path), "rust")
+    images = DockerBackend(images={"comp": "maciejrac/stos_pg:cppCompiler-latest"}).images
+    assert images["comp-cpp"] == "maciejrac/stos_pg:cppCompiler-latest" and images["comp-python"] == "comp-python"
+
+
+def test_read_manifest_follow(tmp_path):
+    # czytanie w trakcie zapisu: niedokończona linia czeka na resztę
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"stage": "exec", "test": "0"}\n{"stage": "ju')
+    assert [record["test"] for record in read_manifest(str(path))] == ["0"]
+    timer = threading.Timer(0.2, lambda: path.open("a").write('dge", "test": "0", "grade": 1}\n{"stage": "judge_end"}\n'))
+    timer.start()
+    records = list(read_manifest(str(path), until="judge_end", timeout=5))
+    timer.join()
+    assert [record["stage"] for record in records] == ["exec", "judge", "judge_end"]
+
+
+def test_worker_store_problem(tmp_path, sum_problem):
+    # testy z magazynu, rozpakowane do katalogu w RAM
+    from store import DataStore
+    comp_in, tests = sum_problem
+    data_store = DataStore(str(tmp_path / "store"), str(tmp_path / "stage"))
+    data_store.add("sum", tests)
+    events = []
+    worker.Worker(LocalBackend(), store=data_store).run({"id": "job", "submit_time": 0, "comp_in": comp_in, "problem": "sum"}, events.append)
+    assert events[-1]["points"] == 3
+    # po zakończeniu zgłoszenia zestaw w RAM może zostać usunięty
+    assert data_store.users == {}
+
+
+def test_worker_metrics_and_trace(tmp_path, sum_problem):
+    # metryki w formacie Prometheus i ślad zgłoszenia w formacie Chrome trace
+    import json
+    comp_in, tests = sum_problem
+    local = worker.Worker(LocalBackend(), metrics_path=str(tmp_path / "metrics.prom"), trace_dir=str(tmp_path / "trace"))
+    events = []
+    local.run({"id": "job", "submit_time": 0, "comp_in": comp_in, "tests": tests}, events.append)
+    metrics = (tmp_path / "metrics.prom").read_text()
+    assert 'stos_submissions_total{result="ok"} 1' in metrics
+    assert 'stos_tests_total{verdict="OK"} 4' in metrics
+    assert 'stos_stage_seconds_count{stage="exec"} 1' in metrics
+    assert "stos_test_spawn_seconds_count 4" in metrics
+    assert "stos_judge_compare_seconds_count 4" in metrics
+    with open(tmp_path / "trace" / "job.json") as f:
+        names = [event["name"] for event in json.load(f)["traceEvents"]]
+    for name in ["queue", "compile", "exec", "judge", "exec main", "judge main", "exec 0", "judge 3", "submission"]:
+        assert name in names
+
+
+def test_worker_batch(tmp_path, sum_problem):
+    # wiele zgłoszeń na tych samych testach, jeden etap exec
+    comp_in, tests = sum_problem
+    broken = tmp_path / "broken"
+    broken.mkdir()
+    (broken / "main.cpp").write_text("int main() {\n")
+    job = {"id": "batch", "submit_time": 0, "tests": tests, "submissions": [
+        {"id": "ok", "comp_in": comp_in},
+        {"id": "broken", "comp_in": str(broken)},
+        {"id": "again", "comp_in": comp_in},
+    ]}
+    events = []
+    worker.Worker(LocalBackend()).run(job, events.append)
+    done = {event["id"]: event for event in events if event["stage"] == "done"}
+    assert {key: event["points"] for key, event in done.items()} == {"ok": 3, "broken": 0, "again": 3}
+    assert sorted(next(event for event in events if event["id"] == "again" and event["stage"] == "exec")["result"]) == ["0", "1", "2", "3"]
+    assert events[-1]["stage"] == "batch_done"
+
+
+def test_worker_checker(tmp_path, sum_problem):
+    # checker z katalogu testów kompilowany raz, potem używany przez kolejne zgłoszenia
+    comp_in, tests = sum_problem
+    checker = tmp_path / "tests" / "checker"
+    checker.mkdir()
+    (checker / "main.py").write_text("""import sys
+for test in sys.stdin:
+    test, answer, output = test[:-1], sys.stdin.readline()[:-1], sys.stdin.readline()[:-1]
+    numbers = list(map(int, open(test).read().split()))
+    ok = open(output).read().split() == [str(sum(numbers[1:]))]
+    print("OK" if ok else "WA sum is not correct", flush=True)
+""")
+    local = worker.Worker(LocalBackend(), workers=1, checkers_dir=str(tmp_path / "checkers"))
+    for job_id in ["job1", "job2"]:
+        events = []
+        local.run({"id": job_id, "comp_in": comp_in, "tests": tests, "submit_time": 0, "env": {"FUSED": "on"}}, events.append)
+        assert events[-1]["points"] == 4
+    assert len(os.listdir(tmp_path / "checkers")) == 1
+
+
+def test_worker_results_db(tmp_path, sum_problem):
+    # wyniki zgłoszeń trafiają do historii w SQLite
+    from results_db import ResultsDB
+    comp_in, tests = sum_problem
+    db = ResultsDB(str(tmp_path / "results.db"))
+    local = worker.Worker(LocalBackend(), workers=1, results_db=db)
+    local.run({"id": "job1", "comp_in": comp_in, "tests": tests, "submit_time": 1.0, "owner": "ala"}, lambda event: None)
+    submission = db.submission("job1")
+    assert (submission["problem"], submission["owner"], submission["result"], submission["points"]) == (tests, "ala", "ok", 3)
+    assert [test["grade"] for test in submission["tests"]] == [1, 1, 0, 1]
+    assert db.verdicts(tests) == {"OK": 4}